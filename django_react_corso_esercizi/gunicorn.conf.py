@@ -0,0 +1,33 @@
+"""
+Configurazione di gunicorn, letta da sola se si avvia dalla directory del
+progetto (``gunicorn myproject_exercise.wsgi``).
+
+Con ``preload_app`` il master importa ``wsgi.py`` e, in ``when_ready``,
+esegue ``prefork.preload`` una volta sola prima di creare i worker: i worker
+nascono con Django già inizializzato e ne condividono la memoria.
+"""
+import multiprocessing
+import os
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+
+def on_starting(server):
+    # Con preload_app l'applicazione è già caricata: le impostazioni ci sono.
+    from pizzeria_app.metrics import clear_metrics_dir
+
+    clear_metrics_dir()
+
+
+def when_ready(server):
+    # Nel master, dopo il caricamento dell'applicazione e prima del fork. Senza
+    # preload_app ogni worker carica l'applicazione da sé: non c'è nulla da
+    # condividere.
+    if not server.cfg.preload_app:
+        return
+    from myproject_exercise.prefork import preload
+
+    timings = preload()
+    server.log.info('preload: %s', ', '.join(
+        f'{name} {seconds * 1000:.0f} ms' for name, seconds in timings.items()))
@@ -0,0 +1,100 @@
+"""
+Inizializzazione completa del progetto prima del fork dei worker.
+
+``get_wsgi_application()`` importa app, modelli e middleware, ma molto
+resta pigro fino alla prima richiesta di ogni worker: l'URLconf con le
+viste e i serializer, le tabelle di ``reverse()``, le cache di ``_meta``
+dei modelli, le classi lette da ``api_settings``, i cataloghi delle
+traduzioni e i template compilati. ``preload`` fa tutto questo una volta
+sola nel master: dopo il fork i worker condividono quelle pagine di
+memoria (copy-on-write) e la prima richiesta non paga l'avviamento.
+
+``gc.freeze()`` sposta gli oggetti già creati nella generazione
+permanente: le raccolte dei worker non li visitano più e quindi non
+scrivono nei loro header, che altrimenti verrebbero copiati pagina per
+pagina. Nessuna connessione al database resta aperta nel master.
+
+Lo chiama ``gunicorn.conf.py`` (``when_ready``, con ``preload_app = True``)
+nel master; ``runserver``, il client di test e chi importa ``wsgi.py`` o
+``asgi.py`` non lo pagano. ``manage.py benchmark_startup`` riporta i tempi
+delle fasi e degli import.
+"""
+import gc
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from django.utils import translation
+
+# Impostazioni di DRF che contengono percorsi di classi da importare.
+API_SETTINGS = (
+    'DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+    'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES',
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS', 'DEFAULT_METADATA_CLASS', 'DEFAULT_PAGINATION_CLASS',
+    'DEFAULT_FILTER_BACKENDS', 'EXCEPTION_HANDLER',
+)
+
+
+@contextmanager
+def phase(name, timings):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+def load_urls():
+    resolver = get_resolver()
+    # reverse_dict popola anche i resolver inclusi e i loro namespace.
+    resolver.reverse_dict
+    for namespace in resolver.namespace_dict:
+        resolver.namespace_dict[namespace][1].reverse_dict
+
+
+def load_models():
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.concrete_fields
+
+
+def load_serializers():
+    from rest_framework.settings import api_settings
+
+    from pizzeria_app import serializers
+    from pizzeria_app.fast_serializers import ValuesSerializer
+
+    for name in API_SETTINGS:
+        getattr(api_settings, name)
+    for serializer_class in (serializers.AutoreSerializer, serializers.LibroSerializer,
+                             serializers.UserSerializer):
+        serializer_class().fields
+    for serializer_class in (serializers.AutoreSerializer, serializers.LibroSerializer):
+        ValuesSerializer.for_serializer(serializer_class)
+
+
+def load_translations():
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('')
+
+
+def load_templates():
+    from pizzeria_app.warmup import warm_templates
+
+    warm_templates()
+
+
+def preload():
+    """Esegue le fasi e congela gli oggetti creati; ``{fase: secondi}``."""
+    timings = {}
+    for name, load in (('url', load_urls), ('modelli', load_models),
+                       ('serializer', load_serializers), ('traduzioni', load_translations),
+                       ('template', load_templates)):
+        with phase(name, timings):
+            load()
+    connections.close_all()
+    with phase('gc.freeze', timings):
+        gc.collect()
+        gc.freeze()
+    return timings
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,10 +38,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
+    'rest_framework.authtoken',
     'pizzeria_app',
 ]
 
 MIDDLEWARE = [
+    'pizzeria_app.profiling.QueryProfilerMiddleware',
+    'pizzeria_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,6 +72,9 @@ TEMPLATES = [
     },
 ]
 
+# In produzione (settings_production) il loader cached è esplicito e i
+# template del catalogo si compilano nel master di gunicorn (prefork.py).
+
 WSGI_APPLICATION = 'myproject_exercise.wsgi.application'
 
 
@@ -81,6 +89,68 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache is per process: with several gunicorn workers use a shared
+# backend with atomic incr (Redis, as in settings_production, or Memcached)
+# so invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # Una voce per ogni frammento di libro (fragments.py): il default di
+        # 300 voci non basta per una pagina di lista.
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    }
+}
+
+CATALOGO_CACHE_TIMEOUT = 60 * 60
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'pizzeria_app.authentication.CachedTokenAuthentication',
+        'pizzeria_app.signed_tokens.SignedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticatedOrReadOnly',
+    ],
+    # Usati da pizzeria_app.throttling: 'auth' per indirizzo su registrazione
+    # e login, 'scritture' per utente sulle scritture di LibroViewSet.
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '20/min',
+        'scritture': '300/min',
+    },
+}
+
+# Cache dei contatori di throttling. In sviluppo è la LocMemCache del
+# processo, quindi il limite vale per worker; settings_production usa Redis,
+# condiviso e con incr atomico (vedi pizzeria_app.throttling).
+THROTTLE_CACHE = 'default'
+
+# Token già verificati (pizzeria_app.authentication): voci dell'LRU di ogni
+# processo e durata, in secondi, sia nell'LRU sia nella cache condivisa.
+AUTH_TOKEN_CACHE_SIZE = 10_000
+AUTH_TOKEN_CACHE_TIMEOUT = 5 * 60
+
+# Token firmati (pizzeria_app.signed_tokens): durata in secondi dell'access
+# token e del refresh token.
+SIGNED_TOKEN_ACCESS_TTL = 5 * 60
+SIGNED_TOKEN_REFRESH_TTL = 24 * 60 * 60
+
+# Profilazione per richiesta (pizzeria_app.profiling): header Server-Timing e,
+# in sviluppo e nei test, errore per le GET oltre il budget di QUERY_BUDGETS.
+PROFILER_SERVER_TIMING = DEBUG
+PROFILER_ENFORCE_BUDGETS = DEBUG
+
+# Metriche (pizzeria_app.metrics): con più worker gunicorn una directory
+# condivisa, svuotata all'avvio, dove ogni worker scrive il proprio file.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# Chiavi massime per ciascun indice in memoria dei suggerimenti (per worker).
+SUGGEST_MAX_ENTRIES = 100_000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -100,6 +170,27 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Il primo hasher cifra le password nuove; al login quelle salvate con un
+# altro hasher o con parametri diversi vengono ricalcolate
+# (pizzeria_app.hashing.PooledModelBackend).
+PASSWORD_HASHERS = [
+    'pizzeria_app.hashing.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+AUTH_PBKDF2_ITERATIONS = 1_000_000
+
+AUTHENTICATION_BACKENDS = ['pizzeria_app.hashing.PooledModelBackend']
+
+# Pool di hashing per processo: thread, lavori in attesa oltre i quali si
+# risponde 503 e richieste contemporanee per indirizzo oltre le quali 429.
+AUTH_HASH_WORKERS = 2
+AUTH_HASH_BACKLOG = 16
+AUTH_HASH_PER_IP = 2
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -0,0 +1,63 @@
+"""
+Impostazioni di produzione: quelle di sviluppo con le differenze per il deploy.
+
+Si attivano con ``DJANGO_SETTINGS_MODULE=myproject_exercise.settings_production``
+(ad esempio nel ``Procfile``, prima di ``gunicorn myproject_exercise.wsgi``).
+"""
+import copy
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import TEMPLATES as DEVELOPMENT_TEMPLATES
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)  # noqa: F405
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+# Dietro il reverse proxy REMOTE_ADDR è il proxy: throttle e limite di
+# hashing per client leggono l'X-Forwarded-For, fidandosi di questi proxy.
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'NUM_PROXIES': int(os.environ.get('DJANGO_NUM_PROXIES', 1)),
+}
+
+PROFILER_SERVER_TIMING = False
+PROFILER_ENFORCE_BUDGETS = False
+
+# Redis condiviso da tutti i worker gunicorn (richiede il pacchetto redis).
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')
+
+CACHES = {
+    # Generazioni del catalogo (pizzeria_app.cache), frammenti e token: con
+    # una cache per processo l'incremento di un worker non raggiunge gli
+    # altri, che continuerebbero a servire liste e dettagli vecchi.
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+    },
+    # Contatori di pizzeria_app.throttling: con una cache per processo ogni
+    # worker conterebbe per conto suo e il limite reale sarebbe N volte quello
+    # configurato; l'incr di Redis è atomico.
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/2',
+    },
+}
+THROTTLE_CACHE = 'throttle'
+
+# Loader espliciti: con APP_DIRS Django sceglie da sé i loader, qui il
+# loader cached tiene i template compilati per tutta la vita del processo
+# (in produzione i template cambiano solo con un deploy, cioè un riavvio).
+TEMPLATES = copy.deepcopy(DEVELOPMENT_TEMPLATES)
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# I template del catalogo si compilano nel master di gunicorn, prima del fork
+# (myproject_exercise.prefork, chiamato da when_ready in gunicorn.conf.py).
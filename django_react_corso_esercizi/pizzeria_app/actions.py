@@ -0,0 +1,90 @@
+"""
+Azioni aggiuntive dei ViewSet del catalogo: ricerca, suggerimenti,
+statistiche per autore ed export colonnare.
+
+Stanno qui e non accanto ai dati che servono (``search.py``,
+``suggest.py``, ``stats.py``, ``columnar.py``) perché quei moduli li
+caricano anche i segnali e i comandi di gestione: così restano senza DRF,
+che costa decine di millisecondi di import e serve solo a chi risponde
+alle richieste.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .columnar import CONTENT_TYPE, DEFAULT_CHUNK_SIZE, UnsupportedValue, export_catalogue
+from .models import StatisticheAutore
+from .search import search
+from .stats import as_dict
+from .suggest import indici
+
+
+class LibroSearchMixin:
+    """Azione ``search`` (``GET /api/libri/search/?q=...&limit=...``)."""
+    search_max_limit = 100
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def search(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.search_max_limit)
+        except ValueError:
+            limit = 20
+        ranking = search(request.query_params.get('q', ''), max(limit, 1))
+        libri = self.get_queryset().in_bulk([pk for pk, _ in ranking])
+        serializer = self.get_serializer()
+        results = []
+        for pk, punteggio in ranking:
+            if pk in libri:
+                data = serializer.to_representation(libri[pk])
+                data['punteggio'] = punteggio
+                results.append(data)
+        return Response({'results': results})
+
+
+class SuggestMixin:
+    """Azione ``suggest`` (``GET .../suggest/?q=...&limit=...``) sull'indice ``suggest_index``."""
+    suggest_index = None
+    suggest_max_limit = 50
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def suggest(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.suggest_max_limit)
+        except ValueError:
+            limit = 10
+        suggestions = indici[self.suggest_index].suggest(
+            request.query_params.get('q', ''), max(limit, 1))
+        return Response({'results': [{'id': pk, 'label': label} for pk, label in suggestions]})
+
+
+class AutoreStatsMixin:
+    """Azione ``stats`` (``GET /api/autori/<pk>/stats/``): una lettura per chiave primaria."""
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        stats = StatisticheAutore.objects.filter(pk=lookup).first()
+        if stats is None:
+            # Un autore senza libri non ha ancora una riga.
+            self.get_object()
+            stats = StatisticheAutore()
+        return Response(as_dict(stats))
+
+
+class CatalogueExportMixin:
+    """
+    Azione ``export`` (``GET /api/libri/export/``): tutto il catalogo nel
+    formato colonnare, in streaming.
+    """
+    export_chunk_size = DEFAULT_CHUNK_SIZE
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def export(self, request, *args, **kwargs):
+        try:
+            blocks = export_catalogue(self.export_chunk_size)
+        except UnsupportedValue as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+        response = StreamingHttpResponse(blocks, content_type=CONTENT_TYPE)
+        response['Content-Disposition'] = 'attachment; filename="catalogo.pzcol"'
+        return response
@@ -1,3 +1,20 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Autore, Libro
+
+
+@admin.register(Autore)
+class AutoreAdmin(admin.ModelAdmin):
+    list_display = ('cognome', 'nome', 'data_nascita')
+    ordering = ('cognome', 'nome')
+
+
+@admin.register(Libro)
+class LibroAdmin(admin.ModelAdmin):
+    list_display = ('titolo', 'autore', 'data_pubblicazione', 'isbn')
+    ordering = ('titolo',)
+    # Evita un secondo COUNT(*) sull'intera tabella a ogni caricamento della lista.
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).per_admin()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PizzeriaAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pizzeria_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
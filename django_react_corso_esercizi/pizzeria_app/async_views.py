@@ -0,0 +1,104 @@
+"""
+Percorso di lettura asincrono (ASGI) per le API del catalogo.
+
+Sotto uvicorn/daphne le viste sincrone occupano un thread per tutta la
+richiesta (``sync_to_async``). Queste viste ``async def`` restano nel loop
+degli eventi e usano l'ORM asincrono (``aiterator``, ``aget``, ``acount``,
+``aaggregate``): il thread serve solo per il tempo delle singole query.
+
+Le risposte sono identiche a quelle dei viewset (``ValuesSerializer`` sugli
+stessi serializer e ``KeysetPagination``), ma senza cache e GET
+condizionali, che sono sincroni.
+
+Nota: in Django 5.2 le query dell'ORM asincrono passano comunque da un
+thread ``thread_sensitive``, quindi le ``asyncio.gather`` di una stessa
+richiesta si eseguono una dopo l'altra sulla stessa connessione; il
+vantaggio è non tenere un thread (e una connessione) fermo durante l'I/O
+di rete e la serializzazione.
+"""
+import asyncio
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .fast_serializers import ValuesSerializer
+from .models import Autore, Libro, StatisticheAnno, StatisticheAutore
+from .pagination import KeysetPagination
+from .serializers import AutoreSerializer, LibroSerializer
+from .stats import as_dict, totals
+
+NOT_FOUND = {'detail': 'Not found.'}
+STATS_AUTORI = 20
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, encoder=DjangoJSONEncoder, status=status, safe=False)
+
+
+async def alist(queryset):
+    return [row async for row in queryset.aiterator()]
+
+
+async def keyset_list(request, queryset, serializer_class):
+    compiled = ValuesSerializer.for_serializer(serializer_class)
+    paginator = KeysetPagination()
+    paginator.row_fields = compiled.sources
+    try:
+        page = await paginator.apaginate_queryset(compiled.rows(queryset), Request(request))
+    except APIException as exc:
+        # Cursore non valido (``NotFound``): la stessa risposta dei viewset.
+        return json_response({'detail': exc.detail}, status=exc.status_code)
+    return json_response(paginator.get_paginated_data(
+        [compiled.to_representation(row) for row in page]))
+
+
+async def retrieve(queryset, serializer_class, pk):
+    compiled = ValuesSerializer.for_serializer(serializer_class)
+    try:
+        row = await compiled.rows(queryset).aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        return json_response(NOT_FOUND, status=404)
+    return json_response(compiled.to_representation(row))
+
+
+async def libro_list(request):
+    return await keyset_list(request, Libro.objects.order_by('titolo'), LibroSerializer)
+
+
+async def libro_detail(request, pk):
+    return await retrieve(Libro.objects.all(), LibroSerializer, pk)
+
+
+async def autore_list(request):
+    return await keyset_list(request, Autore.objects.order_by('cognome', 'nome'),
+                             AutoreSerializer)
+
+
+async def autore_detail(request, pk):
+    return await retrieve(Autore.objects.all(), AutoreSerializer, pk)
+
+
+async def catalogo_stats(request):
+    """
+    Totali, medie, libri per anno e autori con più libri, letti dalle tabelle
+    materializzate di ``stats.py`` invece che da un ``GROUP BY`` su ``Libro``.
+    """
+    per_anno = StatisticheAnno.objects.filter(libri__gt=0).order_by('anno')
+    per_autore = (
+        StatisticheAutore.objects.filter(libri__gt=0).select_related('autore')
+        .order_by('-libri', 'autore_id')[:STATS_AUTORI]
+    )
+    anni, autori, totale_autori = await asyncio.gather(
+        alist(per_anno), alist(per_autore), Autore.objects.acount())
+    return json_response({
+        **as_dict(totals(anni)),
+        'autori': totale_autori,
+        'per_anno': [{'anno': row.anno, **as_dict(row)} for row in anni],
+        'per_autore': [
+            {'id': row.autore_id, 'nome': row.autore.nome, 'cognome': row.autore.cognome,
+             **as_dict(row)}
+            for row in autori
+        ],
+    })
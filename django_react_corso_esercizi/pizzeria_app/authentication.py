@@ -0,0 +1,156 @@
+"""
+Autenticazione a token senza query per le richieste ripetute.
+
+``TokenAuthentication`` di DRF legge ``Token`` e ``User`` con una join a ogni
+richiesta autenticata. ``CachedTokenAuthentication`` tiene una fotografia
+dei due oggetti (i valori delle colonne, senza la password) in due livelli:
+
+- un LRU per processo, limitato a ``AUTH_TOKEN_CACHE_SIZE`` voci, con
+  scadenza ``AUTH_TOKEN_CACHE_TIMEOUT``;
+- la cache di Django, condivisa tra i worker se lo è il backend.
+
+In entrambi i livelli il token compare solo come impronta SHA-256
+(``token_digest``): chi può elencare le chiavi della cache non ne ricava
+credenziali valide.
+
+Le fotografie sono legate alla generazione di ``Token`` del singolo token
+(vedi ``cache.py``, ``scope``), che i segnali incrementano al commit quando
+il token viene eliminato o il suo utente modificato, disattivato o
+eliminato: le fotografie vecchie non vengono più usate e quelle degli altri
+utenti restano valide. La generazione dipende solo dalla chiave, quindi si
+legge dalla cache prima della fotografia: una richiesta già vista costa
+due letture di cache, una mai vista una query. I salvataggi del solo
+``last_login`` non invalidano: quel valore può essere vecchio nell'utente
+restituito.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import get_generations
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TIMEOUT = 5 * 60
+# La password resta fuori dalla cache: se serve viene letta dal database.
+ESCLUSI = {'password'}
+
+
+def snapshot(token):
+    """Colonne di token e utente, da ricostruire con ``restore``."""
+    user = token.user
+    user_fields = [f.attname for f in user._meta.concrete_fields if f.attname not in ESCLUSI]
+    return (
+        token._state.db,
+        [(f.attname, getattr(token, f.attname)) for f in token._meta.concrete_fields],
+        [(name, getattr(user, name)) for name in user_fields],
+    )
+
+
+def token_digest(key):
+    """Impronta della chiave usata in cache al posto della chiave stessa."""
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def token_generation(digest):
+    return get_generations([Token], scope=digest)[0]
+
+
+def restore(data):
+    """Istanze nuove a ogni richiesta: il chiamante può modificarle liberamente."""
+    db, token_fields, user_fields = data
+    token = Token.from_db(db, *map(list, zip(*token_fields)))
+    user_model = Token._meta.get_field('user').related_model
+    token.user = user_model.from_db(db, *map(list, zip(*user_fields)))
+    return token
+
+
+class SnapshotLRU:
+    """``chiave -> (scadenza, generazione, fotografia)``, le meno usate escono per prime."""
+
+    def __init__(self, max_entries=None, timeout=None):
+        self._max_entries = max_entries
+        self._timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', DEFAULT_MAX_ENTRIES)
+
+    @property
+    def timeout(self):
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+    def get(self, key):
+        """``(generazione, fotografia)``, o ``None`` se assente o scaduta."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1:]
+
+    def set(self, key, generation, data):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, generation, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+snapshots = SnapshotLRU()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        digest = token_digest(key)
+        # Generazione letta prima della fotografia: un salvataggio concorrente
+        # la incrementa al commit, dopo, e la fotografia non viene più usata.
+        generation = token_generation(digest)
+        data = self.cached_snapshot(digest, generation)
+        if data is None:
+            data = self.load_snapshot(key, digest, generation)
+
+        token = restore(data)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+    def cached_snapshot(self, digest, generation):
+        """Fotografia dai due livelli, ``None`` se manca o è di un'altra generazione."""
+        entry = snapshots.get(digest)
+        if entry is None or entry[0] != generation:
+            entry = cache.get(f'auth:token:{digest}')
+            if entry is None or entry[0] != generation:
+                return None
+            snapshots.set(digest, *entry)
+        return entry[1]
+
+    def load_snapshot(self, key, digest, generation):
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        data = snapshot(token)
+        cache.set(f'auth:token:{digest}', (generation, data), snapshots.timeout)
+        snapshots.set(digest, generation, data)
+        return data
@@ -0,0 +1,219 @@
+"""
+Scritture massive di libri (``/api/libri/bulk/``).
+
+Invece di una richiesta, una validazione, una INSERT e una transazione per
+libro, le righe vengono validate in memoria (campi) e poi in blocco contro
+il database: una sola lettura per tutti gli ``autore`` referenziati e una
+sola per l'unicità degli ISBN. Le righe valide si scrivono con
+``bulk_create``/``bulk_update`` in transazioni a blocchi; quelle non valide
+sono restituite con il loro indice e gli errori.
+
+Ogni blocco invia ``libri_scritti_in_blocco`` nella propria transazione:
+cache, indice di ricerca e statistiche seguono esattamente i blocchi
+confermati. Se un blocco viola un vincolo (un ISBN inserito nel frattempo
+da un'altra richiesta) le scritture si fermano, i blocchi precedenti restano
+e la risposta è un 409 con gli indici delle righe già scritte.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .isbn import find_existing
+from .models import Autore, Libro
+from .serializers import IsbnField, LibroSerializer
+from .signals import eliminazione_in_blocco, libri_scritti_in_blocco
+from .stats import STATS_FIELDS, snapshot
+
+
+class LibroBulkSerializer(serializers.ModelSerializer):
+    """
+    ``LibroSerializer`` senza validazioni che interrogano il database:
+    l'esistenza dell'autore e l'unicità dell'ISBN sono verificate in blocco.
+    """
+    id = serializers.IntegerField(required=False)
+    autore = serializers.IntegerField(source='autore_id')
+    isbn = IsbnField()
+
+    class Meta:
+        model = Libro
+        fields = LibroSerializer.Meta.fields
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class LibroBulkWriter:
+    """Valida e scrive un lotto di righe; ``errors`` è una lista ``{'index', 'errors'}``."""
+    batch_size = 500
+
+    def __init__(self, batch_size=None):
+        if batch_size:
+            self.batch_size = batch_size
+        self.errors = []
+        # Indici delle righe scritte e, dopo un IntegrityError, il suo messaggio.
+        self.written = []
+        self.conflict = None
+
+    def add_error(self, index, errors):
+        self.errors.append({'index': index, 'errors': errors})
+
+    def validate(self, rows, partial=False, require_id=False):
+        """Restituisce ``[(indice, validated_data)]`` per le righe valide."""
+        valid = []
+        for index, row in enumerate(rows):
+            serializer = LibroBulkSerializer(data=row, partial=partial)
+            if not serializer.is_valid():
+                self.add_error(index, serializer.errors)
+            elif require_id and 'id' not in serializer.validated_data:
+                self.add_error(index, {'id': ['Campo obbligatorio per l\'aggiornamento.']})
+            else:
+                data = serializer.validated_data
+                if not require_id:
+                    data.pop('id', None)
+                valid.append((index, data))
+        return self.check_database(valid)
+
+    def check_database(self, valid):
+        autore_ids = {data['autore_id'] for _, data in valid if 'autore_id' in data}
+        autori = set(Autore.objects.in_bulk(autore_ids))
+        owners = find_existing(data['isbn'] for _, data in valid if 'isbn' in data)
+
+        checked, seen = [], set()
+        for index, data in valid:
+            errors = {}
+            if 'autore_id' in data and data['autore_id'] not in autori:
+                errors['autore'] = [f'Autore {data["autore_id"]} inesistente.']
+            isbn = data.get('isbn')
+            if isbn is not None:
+                if isbn in seen:
+                    errors['isbn'] = ['ISBN ripetuto nel lotto.']
+                elif owners.get(isbn, data.get('id')) != data.get('id'):
+                    errors['isbn'] = ['Esiste già un libro con questo ISBN.']
+                seen.add(isbn)
+            if errors:
+                self.add_error(index, errors)
+            else:
+                checked.append((index, data))
+        return checked
+
+    def write(self, items, write_chunk):
+        """
+        Chiama ``write_chunk(blocco)`` per ogni blocco di ``[(indice, ...)]``,
+        ciascuno in una transazione. Al primo ``IntegrityError`` si ferma e
+        segna come non scritte le righe del blocco e dei successivi.
+        """
+        for chunk in chunked(items, self.batch_size):
+            try:
+                with transaction.atomic():
+                    write_chunk(chunk)
+            except IntegrityError as exc:
+                self.conflict = str(exc)
+                unwritten = items[len(self.written):]
+                for index, _ in unwritten:
+                    self.add_error(index, {'non_field_errors': [f'Non scritta: {exc}']})
+                break
+            self.written.extend(index for index, _ in chunk)
+        self.errors.sort(key=lambda error: error['index'])
+        return len(self.written)
+
+    def create(self, rows):
+        def write_chunk(chunk):
+            libri = Libro.objects.bulk_create([Libro(**data) for _, data in chunk])
+            self.send([libro.pk for libro in libri], created=True)
+
+        return self.write(self.validate(rows), write_chunk)
+
+    def update(self, rows, partial=True):
+        valid = self.validate(rows, partial=partial, require_id=True)
+        existing = Libro.objects.in_bulk([data['id'] for _, data in valid])
+        items, fields = [], {'updated_at'}
+        now = timezone.now()
+        for index, data in valid:
+            libro = existing.get(data['id'])
+            if libro is None:
+                self.add_error(index, {'id': [f'Libro {data["id"]} inesistente.']})
+                continue
+            old = snapshot(libro)
+            for name, value in data.items():
+                setattr(libro, name, value)
+                fields.add(name)
+            # bulk_update non chiama save(): auto_now va impostato a mano.
+            libro.updated_at = now
+            items.append((index, (libro, (old, snapshot(libro)))))
+        fields.discard('id')
+        fields = sorted(fields)
+
+        def write_chunk(chunk):
+            libri = [libro for _, (libro, _) in chunk]
+            Libro.objects.bulk_update(libri, fields)
+            # Le righe lette da in_bulk danno i valori precedenti: le
+            # statistiche si aggiornano per differenza, senza ricalcolo.
+            self.send([libro.pk for libro in libri], update_fields=fields,
+                      changes=[change for _, (_, change) in chunk])
+
+        return self.write(items, write_chunk)
+
+    def delete(self, ids):
+        pks, changes = [], []
+        for chunk in chunked(list(ids), self.batch_size):
+            # I post_delete per riga sono sospesi: i valori letti qui bastano
+            # al segnale del lotto per cache, suggerimenti e statistiche.
+            with transaction.atomic(), eliminazione_in_blocco():
+                libri = Libro.objects.filter(pk__in=chunk)
+                rows = list(libri.values_list('pk', *STATS_FIELDS))
+                libri.delete()
+                self.send([pk for pk, *_ in rows], deleted=True,
+                          changes=[(tuple(values), None) for _, *values in rows])
+            pks.extend(pk for pk, *_ in rows)
+        return len(pks)
+
+    def send(self, pks, **kwargs):
+        # bulk_create/bulk_update non emettono post_save: cache e indice di
+        # ricerca si aggiornano una volta per blocco, nella sua transazione.
+        if pks:
+            libri_scritti_in_blocco.send(sender=Libro, pks=pks, **kwargs)
+
+
+class LibroBulkMixin:
+    """Azione ``bulk`` per ``LibroViewSet``: POST crea, PUT/PATCH aggiorna, DELETE elimina."""
+    bulk_max_rows = 10000
+
+    @action(detail=False, methods=['post', 'put', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        writer = LibroBulkWriter()
+        if request.method == 'DELETE':
+            ids = request.data.get('ids') if isinstance(request.data, dict) else request.data
+            # bool è una sottoclasse di int: ``true`` non è l'id 1.
+            if not isinstance(ids, list) or not all(
+                    isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+                return Response({'ids': ['Atteso un elenco di id interi.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > self.bulk_max_rows:
+                return Response({'ids': [f'Al massimo {self.bulk_max_rows} id per richiesta.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response({'deleted': writer.delete(ids)})
+
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({'non_field_errors': ['Atteso un elenco di libri.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.bulk_max_rows:
+            return Response(
+                {'non_field_errors': [f'Al massimo {self.bulk_max_rows} righe per richiesta.']},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'POST':
+            written, key, ok = writer.create(rows), 'created', status.HTTP_201_CREATED
+        else:
+            written = writer.update(rows, partial=request.method == 'PATCH')
+            key, ok = 'updated', status.HTTP_200_OK
+        if writer.conflict is not None:
+            # I blocchi precedenti sono confermati: il client deve sapere quali.
+            return Response({key: written, 'written': writer.written, 'errors': writer.errors},
+                            status=status.HTTP_409_CONFLICT)
+        code = status.HTTP_400_BAD_REQUEST if rows and not written else ok
+        return Response({key: written, 'errors': writer.errors}, status=code)
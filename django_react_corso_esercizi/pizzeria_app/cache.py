@@ -0,0 +1,116 @@
+"""
+Cache read-through versionata per le API del catalogo.
+
+Ogni modello ha un contatore di generazione nella cache di Django: le
+chiavi delle risposte includono le generazioni dei modelli da cui
+dipendono, quindi incrementare un contatore (nei segnali ``post_save`` e
+``post_delete``, al commit della transazione) invalida in O(1) tutte le
+risposte di quel modello senza dover scandire le chiavi. Le vecchie voci
+scadono da sole col timeout.
+
+Funziona con qualunque backend che supporti ``get_many``/``incr``. Con più
+worker serve un backend condiviso con ``incr`` atomico (Redis, come in
+``settings_production``, o Memcached): ``LocMemCache`` è per processo e
+vede solo le invalidazioni del proprio worker, mentre file e database
+incrementano con una lettura e una scrittura e possono perdere incrementi
+contemporanei.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def generation_key(model, scope=None):
+    """
+    Chiave del contatore di ``model``; con ``scope`` (es. l'id di un utente)
+    un contatore separato, per invalidare solo le voci di quel sottoinsieme.
+    """
+    key = f'catalogo:gen:{model._meta.label_lower}'
+    return key if scope is None else f'{key}:{scope}'
+
+
+def get_generations(models, scope=None):
+    """Generazioni correnti dei modelli, inizializzate se assenti."""
+    keys = [generation_key(model, scope) for model in models]
+    found = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in found:
+            # Un contatore perso (es. eviction) riparte da un valore mai usato
+            # prima, così non torna a coincidere con chiavi di risposte vecchie.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        generations.append(found[key])
+    return generations
+
+
+def bump_generation(model, scope=None):
+    """Invalida tutte le risposte in cache che dipendono da ``model`` (e ``scope``)."""
+    key = generation_key(model, scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def normalize_params(query_params):
+    """Parametri in forma canonica: ordine delle chiavi e dei valori irrilevante."""
+    return sorted((key, sorted(values)) for key, values in query_params.lists())
+
+
+class CachedReadMixin:
+    """
+    Cache read-through per le azioni ``list`` e ``retrieve`` di un ViewSet.
+
+    ``cache_models`` elenca i modelli da cui dipende la rappresentazione;
+    la chiave combina le loro generazioni, l'azione, l'eventuale ``pk`` e
+    i parametri della query normalizzati. Si salva ``response.data``, per
+    cui la negoziazione del formato avviene comunque a ogni richiesta.
+    """
+    cache_models = ()
+    _cache_generations = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response('list', super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response('retrieve', super().retrieve, request, *args, **kwargs)
+
+    def get_cache_timeout(self):
+        return getattr(settings, 'CATALOGO_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+    def get_response_cache_key(self, action, request, **kwargs):
+        models = self.cache_models or (self.get_queryset().model,)
+        material = json.dumps([
+            # I link di paginazione sono assoluti: l'host fa parte della risposta.
+            request.build_absolute_uri(request.path),
+            kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            normalize_params(request.query_params),
+        ], separators=(',', ':'), default=str)
+        digest = hashlib.sha1(material.encode()).hexdigest()
+        if self._cache_generations is None:
+            # Una lettura per richiesta: la chiave serve anche all'ETag di
+            # conditional.ConditionalGetMixin.
+            self._cache_generations = '.'.join(
+                str(generation) for generation in get_generations(models))
+        generations = self._cache_generations
+        return f'catalogo:{self.basename}:{action}:{generations}:{digest}'
+
+    def cached_response(self, action, view, request, *args, **kwargs):
+        # Import qui: signals.py usa le generazioni all'avvio di ogni processo,
+        # anche dei comandi che non caricano DRF.
+        from rest_framework.response import Response
+
+        key = self.get_response_cache_key(action, request, **kwargs)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.get_cache_timeout())
+        return response
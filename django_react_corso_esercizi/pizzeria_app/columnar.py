@@ -0,0 +1,322 @@
+"""
+Export del catalogo in un file colonnare compatto, leggibile con ``mmap``.
+
+Il file contiene due tabelle, ``autori`` e ``libri``, divise in blocchi di
+``chunk_size`` righe; ogni blocco tiene una colonna dopo l'altra::
+
+    MAGIC | blocco | blocco | ... | footer JSON | lunghezza footer (uint64) | MAGIC
+
+Il footer elenca colonne e tipi delle tabelle e, per ogni blocco, righe e
+posizione ``(offset, lunghezza)`` dei buffer di ciascuna colonna. I buffer
+sono little-endian e allineati a 8 byte, quindi un consumatore li legge
+senza copiarli (``memoryview(...).cast()``, ``numpy.frombuffer``). Tipi:
+
+- ``int64``, ``uint32``: interi a larghezza fissa;
+- ``date32``: giorni dal 1970-01-01; ``timestamp64``: microsecondi UTC
+  dal 1970-01-01; ``decimal32(2)``: centesimi (``prezzo``);
+- ``ascii(13)``: stringa a larghezza fissa, completata con ``\\0`` (``isbn``);
+- ``utf8``: due buffer, gli offset ``uint32`` (righe + 1) e i byte.
+
+I valori nulli sono il minimo del tipo (``NULL_INT32``, ``NULL_INT64``):
+un valore non nullo uguale alla sentinella o fuori dall'intervallo del
+tipo, come un ISBN non ASCII o più lungo della colonna, solleva
+``UnsupportedValue``.
+``libri.autore`` è la posizione dell'autore nella tabella ``autori``
+(codifica a dizionario): nome e cognome compaiono una volta sola.
+
+``export_catalogue`` produce il file a pezzi, un blocco alla volta, da
+cursori lato server: la memoria usata non dipende dalla dimensione del
+catalogo e la stessa funzione serve ``manage.py export_catalogue`` e
+l'azione ``export`` di ``LibroViewSet``. I valori non rappresentabili si
+cercano con una query prima del primo pezzo, quindi l'errore arriva prima
+che lo streaming cominci. Non è una transazione: un libro
+scritto durante l'export può esserci o no, ma il suo autore c'è sempre.
+"""
+import datetime
+import json
+import struct
+import sys
+from array import array
+from decimal import Decimal
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Autore, Libro
+
+MAGIC = b'PZCOL1\0\0'
+VERSION = 1
+ALIGNMENT = 8
+TRAILER = struct.Struct('<Q8s')
+NULL_INT32 = -2 ** 31
+NULL_INT64 = -2 ** 63
+INT32_MAX = 2 ** 31 - 1
+EPOCH_DATE = datetime.date(1970, 1, 1)
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+CONTENT_TYPE = 'application/vnd.pizzeria.catalogue'
+DEFAULT_CHUNK_SIZE = 10_000
+# Parametri per query dei pk__in (SQLite ne accetta 999).
+IN_BATCH = 500
+
+# Tipo -> codice di ``array`` dei buffer a larghezza fissa.
+TYPECODES = {'int64': 'q', 'uint32': 'I', 'int32': 'i', 'date32': 'i',
+             'timestamp64': 'q', 'decimal32(2)': 'i'}
+for _code in set(TYPECODES.values()):
+    assert array(_code).itemsize == {'q': 8, 'I': 4, 'i': 4}[_code]
+
+AUTORI = (
+    ('id', 'int64'),
+    ('nome', 'utf8'),
+    ('cognome', 'utf8'),
+    ('data_nascita', 'date32'),
+    ('updated_at', 'timestamp64'),
+)
+LIBRI = (
+    ('id', 'int64'),
+    ('titolo', 'utf8'),
+    ('autore', 'uint32'),
+    ('data_pubblicazione', 'date32'),
+    ('isbn', 'ascii(13)'),
+    ('numero_pagine', 'int32'),
+    ('prezzo', 'decimal32(2)'),
+    ('updated_at', 'timestamp64'),
+)
+
+
+class InvalidFile(Exception):
+    pass
+
+
+class UnsupportedValue(ValueError):
+    """Un valore del catalogo che il formato non può rappresentare."""
+
+
+def null_value(kind):
+    return NULL_INT64 if TYPECODES[kind] == 'q' else NULL_INT32
+
+
+def encode_value(kind, value):
+    """Valore Python -> intero della colonna (``None`` -> sentinella)."""
+    if value is None:
+        return null_value(kind)
+    if kind == 'date32':
+        encoded = (value - EPOCH_DATE).days
+    elif kind == 'timestamp64':
+        if timezone.is_naive(value):
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        encoded = (value - EPOCH) // MICROSECOND
+    elif kind == 'decimal32(2)':
+        encoded = int(value.scaleb(2).to_integral_value())
+    else:
+        encoded = value
+    if encoded == null_value(kind):
+        # Riletto sarebbe None.
+        raise UnsupportedValue(f'{value!r} coincide con il valore nullo di {kind}.')
+    return encoded
+
+
+def decode_value(kind, value):
+    if value == null_value(kind):
+        return None
+    if kind == 'date32':
+        return EPOCH_DATE + datetime.timedelta(days=value)
+    if kind == 'timestamp64':
+        return EPOCH + value * MICROSECOND
+    if kind == 'decimal32(2)':
+        return Decimal(value).scaleb(-2)
+    return value
+
+
+def width(kind):
+    """Larghezza di ``ascii(N)``."""
+    return int(kind[len('ascii('):-1])
+
+
+def little_endian(buffer):
+    if sys.byteorder == 'big':
+        buffer.byteswap()
+    return buffer.tobytes()
+
+
+def encode_column(kind, values):
+    """I buffer di una colonna: uno, o due per ``utf8``."""
+    if kind == 'utf8':
+        offsets, data, end = array('I', [0]), [], 0
+        for value in values:
+            encoded = value.encode('utf-8')
+            end += len(encoded)
+            offsets.append(end)
+            data.append(encoded)
+        return [little_endian(offsets), b''.join(data)]
+    if kind.startswith('ascii('):
+        return [b''.join(encode_ascii(width(kind), value) for value in values)]
+    try:
+        return [little_endian(array(TYPECODES[kind], (encode_value(kind, v) for v in values)))]
+    except OverflowError as exc:
+        raise UnsupportedValue(f'Valore fuori dall\'intervallo di {kind}: {exc}') from exc
+
+
+def encode_ascii(size, value):
+    """``value`` completato con ``\\0`` fino a ``size`` byte; mai troncato."""
+    try:
+        encoded = value.encode('ascii')
+    except UnicodeEncodeError as exc:
+        raise UnsupportedValue(f'{value!r} non è ASCII.') from exc
+    if len(encoded) > size or b'\0' in encoded:
+        # Un valore più lungo sposterebbe tutte le righe successive del blocco.
+        raise UnsupportedValue(f'{value!r} non sta in ascii({size}).')
+    return encoded.ljust(size, b'\0')
+
+
+class ColumnarWriter:
+    """
+    Produce il file come sequenza di ``bytes``: ``header()``, poi un
+    ``block()`` per ogni gruppo di righe, infine ``footer()``.
+    """
+
+    def __init__(self, tables):
+        self.tables = {
+            name: {'columns': [list(column) for column in columns], 'rows': 0, 'blocks': []}
+            for name, columns in tables.items()
+        }
+        self.offset = 0
+
+    def header(self):
+        self.offset = len(MAGIC)
+        return MAGIC
+
+    def block(self, table, rows):
+        """Un blocco di ``rows`` (tuple nell'ordine delle colonne) della tabella."""
+        meta = self.tables[table]
+        pieces, buffers = [], {}
+        for index, (name, kind) in enumerate(meta['columns']):
+            buffers[name] = []
+            for buffer in encode_column(kind, [row[index] for row in rows]):
+                buffers[name].append([self.offset, len(buffer)])
+                padding = -len(buffer) % ALIGNMENT
+                pieces.append(buffer + b'\0' * padding)
+                self.offset += len(buffer) + padding
+        meta['rows'] += len(rows)
+        meta['blocks'].append({'rows': len(rows), 'buffers': buffers})
+        return b''.join(pieces)
+
+    def footer(self):
+        footer = json.dumps({'version': VERSION, 'tables': self.tables},
+                            separators=(',', ':')).encode()
+        return footer + TRAILER.pack(len(footer), MAGIC)
+
+
+class ColumnarFile:
+    """
+    Lettura di un file di ``export_catalogue`` da qualunque buffer
+    (``bytes``, ``mmap``): ``chunks`` restituisce le colonne numeriche come
+    ``memoryview`` sul buffer, senza copie.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        if len(self.buffer) < len(MAGIC) + TRAILER.size or self.buffer[:len(MAGIC)] != MAGIC:
+            raise InvalidFile('Intestazione mancante.')
+        length, magic = TRAILER.unpack(self.buffer[-TRAILER.size:])
+        if magic != MAGIC:
+            raise InvalidFile('File troncato.')
+        start = len(self.buffer) - TRAILER.size - length
+        footer = json.loads(bytes(self.buffer[start:-TRAILER.size]))
+        if footer['version'] != VERSION:
+            raise InvalidFile(f'Versione {footer["version"]} non supportata.')
+        self.tables = footer['tables']
+
+    def columns(self, table):
+        return [name for name, _ in self.tables[table]['columns']]
+
+    def chunks(self, table, column):
+        """
+        La colonna blocco per blocco: ``memoryview`` degli interi grezzi per
+        i tipi numerici (sentinelle comprese), liste di ``str`` per le stringhe.
+        """
+        kind = dict(self.tables[table]['columns'])[column]
+        for block in self.tables[table]['blocks']:
+            views = [self.buffer[offset:offset + length]
+                     for offset, length in block['buffers'][column]]
+            if kind == 'utf8':
+                offsets, data = views[0].cast('I'), views[1]
+                yield [str(data[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(block['rows'])]
+            elif kind.startswith('ascii('):
+                size = width(kind)
+                data = bytes(views[0])
+                yield [data[i:i + size].rstrip(b'\0').decode('ascii')
+                       for i in range(0, len(data), size)]
+            else:
+                yield views[0].cast(TYPECODES[kind])
+
+    def rows(self, table):
+        """Le righe come dizionari di valori Python (date, ``Decimal``, ``None``)."""
+        columns = self.tables[table]['columns']
+        streams = [self.chunks(table, name) for name, _ in columns]
+        for chunks in zip(*streams):
+            for values in zip(*chunks):
+                yield {name: value if kind == 'utf8' or kind.startswith('ascii(')
+                       else decode_value(kind, value)
+                       for (name, kind), value in zip(columns, values)}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def check_catalogue():
+    """Solleva ``UnsupportedValue`` se qualche libro non è rappresentabile."""
+    isbn_size = width(dict(LIBRI)['isbn'])
+    invalid = list(Libro.objects.filter(
+        Q(numero_pagine__lte=NULL_INT32) | Q(numero_pagine__gt=INT32_MAX)
+        | ~Q(isbn__regex=rf'^[\x01-\x7f]{{0,{isbn_size}}}$')
+    ).order_by('pk').values_list('pk', flat=True)[:10])
+    if invalid:
+        raise UnsupportedValue(
+            f'Libri con numero_pagine fuori da int32 o ISBN non ASCII di al più '
+            f'{isbn_size} caratteri: {", ".join(map(str, invalid))}.')
+
+
+def export_catalogue(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Il file di export a pezzi (``bytes``), un blocco alla volta. Il controllo
+    dei valori avviene subito, non alla lettura del primo pezzo.
+    """
+    check_catalogue()
+    return catalogue_blocks(chunk_size)
+
+
+def catalogue_blocks(chunk_size):
+    writer = ColumnarWriter({'autori': AUTORI, 'libri': LIBRI})
+    yield writer.header()
+    # Posizione di ogni autore nella tabella ``autori``.
+    positions = {}
+
+    def autori_block(rows):
+        for row in rows:
+            positions[row[0]] = len(positions)
+        return writer.block('autori', rows)
+
+    autori = Autore.objects.order_by('pk').values_list(
+        'id', 'nome', 'cognome', 'data_nascita', 'updated_at')
+    for rows in batches(autori.iterator(chunk_size=chunk_size), chunk_size):
+        yield autori_block(rows)
+
+    libri = Libro.objects.order_by('pk').values_list(
+        'id', 'titolo', 'autore_id', 'data_pubblicazione', 'isbn', 'numero_pagine', 'prezzo',
+        'updated_at')
+    for rows in batches(libri.iterator(chunk_size=chunk_size), chunk_size):
+        # Autori creati dopo la lettura della loro tabella: un blocco in più.
+        missing = sorted({row[2] for row in rows} - positions.keys())
+        for pks in batches(missing, IN_BATCH):
+            yield autori_block(list(autori.filter(pk__in=pks)))
+        # Un autore non trovato è stato eliminato, e i suoi libri con lui.
+        yield writer.block('libri', [
+            (pk, titolo, positions[autore_id], *rest)
+            for pk, titolo, autore_id, *rest in rows if autore_id in positions
+        ])
+    yield writer.footer()
@@ -0,0 +1,132 @@
+"""
+GET condizionali (ETag / Last-Modified) per libri e autori.
+
+Le collezioni (liste delle API e ``lista_libri``) hanno solo l'ETag, ricavato
+senza query dalle generazioni di ``cache.py``: ogni scrittura sui modelli
+mostrati le cambia, eliminazioni comprese. Niente Last-Modified: il massimo
+di ``updated_at`` non si sposta quando una riga sparisce, e un client che
+manda solo ``If-Modified-Since`` riceverebbe un 304 con la lista vecchia.
+Per le API l'ETag è l'impronta della chiave di ``CachedReadMixin``, quindi
+una risposta in cache e il suo ETag cambiano insieme.
+
+Le singole risorse HTML (``dettaglio_libro``) usano invece ``updated_at``,
+con una query di aggregazione sulle righe che le compongono; le scritture
+che aggirano ``save()`` (``QuerySet.update``, ``bulk_update``) devono
+aggiornarlo esplicitamente.
+
+Se il client ha già la versione corrente si risponde 304 senza passare da
+serializer o template.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_generations
+
+
+def weak_etag(material):
+    return 'W/' + quote_etag(hashlib.sha1(material.encode()).hexdigest())
+
+
+def compute_validators(queryset, related=(), salt=''):
+    """
+    Restituisce ``(etag, last_modified)`` per le righe del queryset.
+
+    ``related`` elenca le relazioni mostrate nella risorsa (es. ``'autore'``)
+    il cui ``updated_at`` deve contribuire ai validatori. Con un queryset
+    vuoto restituisce ``(None, None)``.
+    """
+    aggregates = {
+        'righe': Count('pk'),
+        'somma_id': Sum('pk'),
+        'ultimo': Max('updated_at'),
+    }
+    for relation in related:
+        aggregates[f'ultimo_{relation}'] = Max(f'{relation}__updated_at')
+    result = queryset.order_by().aggregate(**aggregates)
+    if not result['righe']:
+        return None, None
+
+    timestamps = [result['ultimo']] + [result[f'ultimo_{relation}'] for relation in related]
+    last_modified = max(timestamp for timestamp in timestamps if timestamp is not None)
+    material = ':'.join(
+        [salt, str(result['righe']), str(result['somma_id'])]
+        + [timestamp.isoformat() if timestamp else '' for timestamp in timestamps]
+    )
+    return weak_etag(material), last_modified
+
+
+def conditional_response(request, etag, last_modified, build_response):
+    """
+    Risponde 304/412 se i validatori coincidono, altrimenti chiama
+    ``build_response()`` e aggiunge gli header ``ETag`` e ``Last-Modified``.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build_response()
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            if etag and not response.has_header('ETag'):
+                response['ETag'] = etag
+            if timestamp is not None and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def condition_from_queryset(get_queryset, related=()):
+    """
+    Decoratore per viste funzione: ``get_queryset(request, *args, **kwargs)``
+    restituisce le righe da cui dipende la pagina.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            etag, last_modified = compute_validators(
+                get_queryset(request, *args, **kwargs), related, salt=request.path)
+            return conditional_response(
+                request, etag, last_modified, lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def condition_from_generations(*models):
+    """
+    Decoratore per viste funzione che mostrano collezioni: ETag dalle
+    generazioni di ``models`` e dal percorso completo, senza Last-Modified.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generations = '.'.join(str(generation) for generation in get_generations(models))
+            etag = weak_etag(f'{request.get_full_path()}:{generations}')
+            return conditional_response(
+                request, etag, None, lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+class ConditionalGetMixin:
+    """
+    ETag per ``list`` e ``retrieve``, dalla chiave di ``CachedReadMixin``.
+
+    Va messo prima di ``CachedReadMixin``, così un 304 non legge né scrive
+    la cache; nessuna delle due azioni esegue query per i validatori.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional('list', super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional('retrieve', super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, action, view, request, *args, **kwargs):
+        etag = weak_etag(self.get_response_cache_key(action, request, **kwargs))
+        return conditional_response(
+            request, etag, None, lambda: view(request, *args, **kwargs))
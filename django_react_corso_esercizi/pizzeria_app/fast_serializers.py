@@ -0,0 +1,174 @@
+"""
+Percorso di serializzazione veloce basato su ``values_list()``.
+
+Per le liste in sola lettura non serve istanziare un modello e passare
+ogni campo attraverso gli oggetti ``Field`` di DRF: ``ValuesSerializer``
+legge dal ``ModelSerializer`` i ``fields`` dichiarati, estrae solo quelle
+colonne come tuple e le converte con funzioni precalcolate per colonna,
+producendo lo stesso output di ``serializer.data``.
+"""
+import decimal
+
+from rest_framework import fields, relations, serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .profiling import section
+
+# Campi il cui valore di database è già la rappresentazione JSON.
+IDENTITY_FIELDS = (
+    fields.CharField,
+    fields.IntegerField,
+    fields.BooleanField,
+    fields.ReadOnlyField,
+    relations.PrimaryKeyRelatedField,
+)
+
+
+class IncompatibleSerializer(Exception):
+    """Il serializer usa campi che il percorso veloce non sa riprodurre."""
+
+
+class ValuesSerializer:
+    """
+    Versione "compilata" di un ``ModelSerializer`` per la sola lettura.
+
+    Si ottiene con ``ValuesSerializer.for_serializer(LibroSerializer)``; il
+    risultato è memorizzato per classe, quindi il costo di analisi dei
+    campi si paga una sola volta per processo.
+    """
+    _compiled = {}
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        self.serializer_class = serializer_class
+        self.names = []
+        self.sources = []
+        self.converters = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if '.' in field.source or field.source == '*':
+                raise IncompatibleSerializer(f'{serializer_class.__name__}.{name}')
+            self.names.append(name)
+            self.sources.append(field.source)
+            converter = self.converter_for(field)
+            if converter is not None:
+                self.converters.append((len(self.names) - 1, converter))
+
+    @classmethod
+    def for_serializer(cls, serializer_class):
+        """Restituisce la versione compilata, o ``None`` se non è possibile."""
+        try:
+            return cls._compiled[serializer_class]
+        except KeyError:
+            pass
+        try:
+            compiled = cls(serializer_class)
+        except IncompatibleSerializer:
+            compiled = None
+        cls._compiled[serializer_class] = compiled
+        return compiled
+
+    @staticmethod
+    def converter_for(field):
+        """Funzione valore -> rappresentazione, o ``None`` se è l'identità."""
+        if isinstance(field, (serializers.BaseSerializer, relations.ManyRelatedField)):
+            raise IncompatibleSerializer(field.field_name)
+        if isinstance(field, (fields.SerializerMethodField, relations.RelatedField)):
+            if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+                return None
+            raise IncompatibleSerializer(field.field_name)
+        if isinstance(field, fields.DecimalField):
+            return decimal_converter(field)
+        if isinstance(field, fields.DateTimeField):
+            return field.to_representation
+        if isinstance(field, fields.DateField):
+            output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+            if output_format is None:
+                return None
+            if output_format.lower() == ISO_8601:
+                return date_isoformat
+            return field.to_representation
+        if isinstance(field, IDENTITY_FIELDS):
+            return None
+        # Qualunque altro campo resta corretto, solo non accelerato.
+        return field.to_representation
+
+    def rows(self, queryset):
+        """Queryset di tuple con esattamente le colonne del serializer."""
+        return queryset.values_list(*self.sources)
+
+    def to_representation(self, row):
+        values = list(row)
+        for index, converter in self.converters:
+            value = values[index]
+            if value is not None:
+                values[index] = converter(value)
+        return dict(zip(self.names, values))
+
+    def serialize(self, queryset):
+        """Equivalente di ``serializer_class(queryset, many=True).data``."""
+        to_representation = self.to_representation
+        return [to_representation(row) for row in self.rows(queryset)]
+
+
+def date_isoformat(value):
+    return value.isoformat()
+
+
+def decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.localize or field.normalize_output or not coerce_to_string:
+        return field.to_representation
+    if field.decimal_places is None:
+        return '{:f}'.format
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+
+    return convert
+
+
+class ValuesListMixin:
+    """
+    Usa ``ValuesSerializer`` per l'azione ``list`` di un ``ModelViewSet``.
+
+    Se il serializer non è compatibile, o il paginatore ordina su colonne
+    non esposte, si ricade sulla ``list()`` standard di DRF.
+    """
+
+    def list(self, request, *args, **kwargs):
+        compiled = ValuesSerializer.for_serializer(self.get_serializer_class())
+        queryset = self.filter_queryset(self.get_queryset())
+        if compiled is None or not self._fast_list_supported(compiled, queryset):
+            return super().list(request, *args, **kwargs)
+
+        rows = compiled.rows(queryset)
+        if self.paginator is not None:
+            # Il paginatore keyset legge i valori di confine dalle tuple.
+            self.paginator.row_fields = compiled.sources
+            page = self.paginate_queryset(rows)
+            with section('ser'):
+                data = [compiled.to_representation(row) for row in page]
+            return self.get_paginated_response(data)
+        rows = list(rows)
+        with section('ser'):
+            data = [compiled.to_representation(row) for row in rows]
+        return Response(data)
+
+    def _fast_list_supported(self, compiled, queryset):
+        if self.paginator is None:
+            return True
+        get_ordering = getattr(self.paginator, 'get_ordering', None)
+        if get_ordering is None:
+            return False
+        columns = set(compiled.sources)
+        return all(field.lstrip('-') in columns for field in get_ordering(queryset))
@@ -0,0 +1,55 @@
+from django import forms
+from django.urls import reverse
+
+from .isbn import InvalidISBN, normalize
+from .models import Autore, Libro
+from .suggest import indici
+
+
+class AutoreSuggestWidget(forms.Widget):
+    """
+    Campo di testo con suggerimenti da ``/api/autori/suggest/`` al posto di una
+    ``<select>`` con tutti gli autori; l'id scelto finisce in un input nascosto.
+    """
+    template_name = 'pizzeria_app/widgets/autore_suggest.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['suggest_url'] = reverse('pizzeria_app:autore-suggest')
+        if value not in (None, ''):
+            try:
+                pk = int(value)
+            except (TypeError, ValueError):
+                pk = None
+            label = indici['autore'].label(pk)
+            if label is None and pk is not None:
+                label = Autore.objects.filter(pk=pk).first()
+            context['widget']['label'] = label
+        return context
+
+
+class LibroForm(forms.ModelForm):
+    autore = forms.ModelChoiceField(
+        queryset=Autore.objects.all(), label='Autore', widget=AutoreSuggestWidget)
+    isbn = forms.CharField(
+        label='ISBN', max_length=17,
+        widget=forms.TextInput(attrs={'placeholder': 'Es. 978-3-16-148410-0'}),
+    )
+
+    class Meta:
+        model = Libro
+        fields = ['titolo', 'autore', 'data_pubblicazione', 'isbn', 'numero_pagine', 'prezzo']
+        labels = {
+            'data_pubblicazione': 'Data di Pubblicazione (YYYY-MM-DD)',
+            'numero_pagine': 'Numero di Pagine',
+        }
+        widgets = {
+            'data_pubblicazione': forms.DateInput(attrs={'type': 'date'}),
+        }
+
+    def clean_isbn(self):
+        # L'unicità la controlla validate_unique() del ModelForm, sul valore canonico.
+        try:
+            return normalize(self.cleaned_data['isbn'])
+        except InvalidISBN as exc:
+            raise forms.ValidationError(str(exc))
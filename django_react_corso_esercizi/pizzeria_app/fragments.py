@@ -0,0 +1,61 @@
+"""
+Frammenti HTML dei libri, resi una volta e poi letti dalla cache.
+
+Le pagine ``lista_libri`` e ``dettaglio_libro`` rendono ogni libro con un
+template di ``frammenti/``; ``render_fragments`` cerca tutti i frammenti
+della pagina con un solo ``get_many``, rende solo quelli mancanti e li
+salva con un ``set_many``. A cache calda la pagina non esegue template
+per i libri: unisce stringhe già pronte.
+
+La chiave contiene ``pk`` e ``updated_at`` del libro e del suo autore, la
+lingua attiva e un'impronta del sorgente del template: una modifica al
+libro, all'autore o al template cambia la chiave, e le voci vecchie
+scadono da sole col timeout. Come per ``conditional.py``, le scritture
+che aggirano ``save()`` devono aggiornare ``updated_at``.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from .cache import DEFAULT_TIMEOUT
+
+LISTA = 'pizzeria_app/frammenti/libro_lista.html'
+DETTAGLIO = 'pizzeria_app/frammenti/libro_dettaglio.html'
+
+
+def microseconds(timestamp):
+    return int(timestamp.timestamp() * 1_000_000)
+
+
+def fragment_key(version, libro):
+    return (f'frammento:{version}:{libro.pk}:{microseconds(libro.updated_at)}:'
+            f'{microseconds(libro.autore.updated_at)}')
+
+
+def render_fragments(template_name, libri):
+    """
+    Frammenti dei ``libri`` (con ``autore`` già caricato), nell'ordine dato.
+    """
+    template = get_template(template_name)
+    digest = hashlib.sha1(template.template.source.encode()).hexdigest()[:12]
+    version = f'{template_name}:{digest}:{get_language()}'
+    keys = [fragment_key(version, libro) for libro in libri]
+    found = cache.get_many(keys)
+    missing = {}
+    fragments = []
+    for key, libro in zip(keys, libri):
+        if key not in found:
+            found[key] = missing[key] = template.render({'libro': libro})
+        fragments.append(found[key])
+    if missing:
+        cache.set_many(missing, getattr(settings, 'CATALOGO_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return fragments
+
+
+def render_page_fragments(template_name, libri):
+    """I frammenti uniti, da inserire nella pagina così come sono."""
+    return mark_safe(''.join(render_fragments(template_name, libri)))
@@ -0,0 +1,204 @@
+"""
+Hashing delle password fuori dal thread della richiesta.
+
+PBKDF2 con un milione di iterazioni costa decine di millisecondi di CPU per
+ogni registrazione e login: senza limiti bastano poche richieste in
+parallelo per saturare i worker. Qui:
+
+- ``HashingPool`` esegue hashing e verifica in un pool di
+  ``AUTH_HASH_WORKERS`` thread (``hashlib`` rilascia il GIL, quindi lavorano
+  davvero in parallelo) con al massimo ``AUTH_HASH_BACKLOG`` lavori in
+  attesa; oltre, ``PoolBusy`` (503). ``arun`` attende senza bloccare il loop
+  degli eventi sotto ASGI;
+- ``ConcurrencyLimit`` limita a ``AUTH_HASH_PER_IP`` le richieste di hashing
+  contemporanee dello stesso client, per processo (429); il client è
+  identificato come nei throttle di DRF, quindi dietro un reverse proxy
+  dall'``X-Forwarded-For`` secondo ``NUM_PROXIES``;
+- ``PooledModelBackend`` verifica le password nel pool e, se l'hash salvato
+  non è dell'hasher preferito o ha parametri diversi, lo ricalcola al login;
+- ``ConfigurablePBKDF2PasswordHasher`` prende le iterazioni da
+  ``AUTH_PBKDF2_ITERATIONS``: cambiarle aggiorna le password al login
+  successivo di ciascun utente.
+
+Solo il calcolo va nel pool: le query restano nel thread della richiesta,
+con la sua connessione e la sua transazione.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher, check_password, get_hasher, identify_hasher, make_password,
+)
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_WORKERS = 2
+DEFAULT_BACKLOG = 16
+DEFAULT_PER_IP = 2
+
+
+class PoolBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Troppe richieste di autenticazione in corso, riprova tra poco.'
+    default_code = 'hashing_busy'
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """``pbkdf2_sha256`` con le iterazioni di ``AUTH_PBKDF2_ITERATIONS``."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'AUTH_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+class HashingPool:
+    def __init__(self, workers=None, backlog=None):
+        self.workers = workers or getattr(settings, 'AUTH_HASH_WORKERS', DEFAULT_WORKERS)
+        if backlog is None:
+            backlog = getattr(settings, 'AUTH_HASH_BACKLOG', DEFAULT_BACKLOG)
+        self.slots = threading.BoundedSemaphore(self.workers + backlog)
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='hashing')
+
+    def submit(self, function, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PoolBusy()
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def run(self, function, *args):
+        return self.submit(function, *args).result()
+
+    async def arun(self, function, *args):
+        return await asyncio.wrap_future(self.submit(function, *args))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Il pool del processo, creato al primo uso (dopo il fork dei worker)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool()
+    return _pool
+
+
+def hash_password(raw_password):
+    return get_pool().run(make_password, raw_password)
+
+
+def must_update(encoded):
+    """L'hash va ricalcolato con l'hasher preferito e i suoi parametri correnti?"""
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferred = get_hasher('default')
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+class PooledModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        pool = get_pool()
+        try:
+            user = get_user_model()._default_manager.get_by_natural_key(username)
+        except get_user_model().DoesNotExist:
+            # Stesso costo di un utente esistente, come ModelBackend (#20760).
+            pool.run(make_password, password)
+            return None
+        # Senza setter check_password non scrive: il salvataggio resta qui.
+        if not pool.run(check_password, password, user.password):
+            return None
+        if must_update(user.password):
+            user.password = pool.run(make_password, password)
+            user.save(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        pool = get_pool()
+        try:
+            user = await get_user_model()._default_manager.aget_by_natural_key(username)
+        except get_user_model().DoesNotExist:
+            await pool.arun(make_password, password)
+            return None
+        if not await pool.arun(check_password, password, user.password):
+            return None
+        if must_update(user.password):
+            user.password = await pool.arun(make_password, password)
+            await user.asave(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
+
+
+class ConcurrencyLimit:
+    """Richieste in corso per chiave (l'identità del client), per processo."""
+
+    def __init__(self, limit=None):
+        self._limit = limit
+        self.lock = threading.Lock()
+        self.active = {}
+
+    @property
+    def limit(self):
+        if self._limit is not None:
+            return self._limit
+        return getattr(settings, 'AUTH_HASH_PER_IP', DEFAULT_PER_IP)
+
+    def acquire(self, key):
+        with self.lock:
+            if self.active.get(key, 0) >= self.limit:
+                raise Throttled(detail='Troppe richieste di autenticazione contemporanee.')
+            self.active[key] = self.active.get(key, 0) + 1
+
+    def release(self, key):
+        with self.lock:
+            self.active[key] -= 1
+            if not self.active[key]:
+                del self.active[key]
+
+
+per_ip = ConcurrencyLimit()
+
+
+class HashingConcurrencyMixin:
+    """
+    Per le viste che calcolano hash: al più ``AUTH_HASH_PER_IP`` POST in corso
+    per client. ``initial`` e ``finalize_response`` racchiudono il metodo
+    della vista anche quando solleva un'eccezione.
+    """
+    hashing_slot = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method == 'POST':
+            # Non REMOTE_ADDR: dietro il proxy sarebbe lo stesso per tutti e il
+            # limite diventerebbe globale.
+            key = BaseThrottle().get_ident(request)
+            per_ip.acquire(key)
+            self.hashing_slot = (key,)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.hashing_slot is not None:
+            per_ip.release(*self.hashing_slot)
+            self.hashing_slot = None
+        return super().finalize_response(request, response, *args, **kwargs)
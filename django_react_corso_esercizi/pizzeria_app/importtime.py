@@ -0,0 +1,63 @@
+"""
+Tempi di import misurati con ``python -X importtime``.
+
+``run`` esegue un frammento di codice in un interprete nuovo (gli import
+già fatti dal processo corrente non contano) e restituisce lo stdout del
+frammento e le righe del report di CPython, una per modulo: tempo
+proprio, tempo cumulativo (figli compresi) e profondità di annidamento.
+"""
+import os
+import subprocess
+import sys
+from collections import Counter, namedtuple
+
+ImportEntry = namedtuple('ImportEntry', 'module self_us cumulative_us depth')
+
+PREFIX = 'import time:'
+
+
+def parse(report):
+    """Le righe di ``-X importtime`` come ``ImportEntry``, nell'ordine di completamento."""
+    entries = []
+    for line in report.splitlines():
+        if not line.startswith(PREFIX):
+            continue
+        self_us, cumulative_us, name = line[len(PREFIX):].split('|')
+        if not self_us.strip().isdigit():
+            # Intestazione: "self [us] | cumulative | imported package".
+            continue
+        module = name.strip()
+        depth = (len(name.rstrip()) - len(module) - 1) // 2
+        entries.append(ImportEntry(module, int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def run(code, settings_module=None, importtime=True):
+    """
+    ``(stdout, entries)`` di ``code`` eseguito con ``-X importtime``; senza
+    ``importtime`` (il report rallenta gli import) ``entries`` è vuoto.
+    """
+    env = dict(os.environ)
+    if settings_module:
+        env['DJANGO_SETTINGS_MODULE'] = settings_module
+    result = subprocess.run(
+        [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', code],
+        capture_output=True, text=True, env=env, check=False,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result.stdout, parse(result.stderr)
+
+
+def by_package(entries):
+    """Tempo proprio in microsecondi per pacchetto di primo livello."""
+    totals = Counter()
+    for entry in entries:
+        totals[entry.module.partition('.')[0]] += entry.self_us
+    return totals
+
+
+def slowest(entries, top):
+    """I ``top`` moduli con il tempo cumulativo più alto."""
+    return sorted(entries, key=lambda entry: entry.cumulative_us, reverse=True)[:top]
@@ -0,0 +1,224 @@
+"""
+Analisi dei piani di esecuzione delle query degli endpoint del catalogo.
+
+``capture()`` esegue delle GET con il client di test e raccoglie le query;
+``analyze()`` le raggruppa per impronta (``profiling.fingerprint``),
+esegue ``EXPLAIN`` e segnala scansioni sequenziali e ordinamenti senza
+indice. Per ogni tabella scandita propone un indice composto secondo la
+regola uguaglianze -> ordinamento -> intervalli. Solo con ``apply_trial``
+lo crea davvero in una transazione che viene annullata, ripete ``EXPLAIN``
+e riporta il beneficio stimato: il costo del piano su PostgreSQL, le righe
+lette e gli ordinamenti evitati su SQLite (che non espone costi). La prova
+costruisce l'indice sull'intera tabella e ne blocca le scritture fino al
+rollback: non va fatta su un database di produzione sotto carico.
+
+Usato da ``manage.py index_advisor``.
+"""
+import json
+import re
+
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .profiling import fingerprint
+
+COLUMN_RE = re.compile(r'"(\w+)"\."(\w+)"\s*(=|IN\b|>=|<=|>|<|LIKE\b|BETWEEN\b)?', re.IGNORECASE)
+ALIAS_RE = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)"?\b')
+SQLITE_PLAN_RE = re.compile(r'^(SCAN|SEARCH) (\w+)(?: AS (\w+))?(.*)$')
+CLAUSES_RE = re.compile(r'\b(WHERE|GROUP BY|HAVING|ORDER BY|LIMIT)\b')
+EQUALITY = {'=', 'IN'}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def capture(paths, follow_next=True):
+    """
+    ``[(path, sql)]`` delle SELECT eseguite dalle GET su ``paths``. Con
+    ``follow_next`` segue anche il link ``next`` delle liste paginate, per
+    includere le query con il filtro del cursore.
+    """
+    client = Client()
+    captured, queue, seen = [], list(paths), set()
+    while queue:
+        path = queue.pop(0)
+        if path in seen:
+            continue
+        seen.add(path)
+        # Il profiler legge l'impostazione quando il client crea il middleware:
+        # un endpoint oltre il budget va analizzato, non fatto fallire.
+        with override_settings(PROFILER_ENFORCE_BUDGETS=False), \
+                CaptureQueriesContext(connections['default']) as ctx:
+            response = client.get(path)
+        captured += [(path, query['sql']) for query in ctx.captured_queries
+                     if query['sql'].lstrip().upper().startswith('SELECT')]
+        if follow_next and response.get('Content-Type', '').startswith('application/json'):
+            data = json.loads(response.content)
+            if isinstance(data, dict) and data.get('next') and not data.get('previous'):
+                queue.append(data['next'])
+    return captured
+
+
+def clauses(sql):
+    """Testo delle clausole ``WHERE`` e ``ORDER BY`` della query esterna."""
+    parts, start, current = {}, None, None
+    for match in CLAUSES_RE.finditer(sql):
+        depth = sql.count('(', 0, match.start()) - sql.count(')', 0, match.start())
+        if depth:
+            continue
+        if current is not None:
+            parts[current] = sql[start:match.start()]
+        current, start = match.group(1).upper(), match.end()
+    if current is not None:
+        parts[current] = sql[start:]
+    return parts.get('WHERE', ''), parts.get('ORDER BY', '')
+
+
+def candidate_columns(sql, table):
+    """Colonne di ``table`` per un indice: uguaglianze, ordinamento, intervalli."""
+    aliases = {alias: name for name, alias in ALIAS_RE.findall(sql)}
+    where, order_by = clauses(sql)
+
+    def columns(text):
+        for name, column, operator in COLUMN_RE.findall(text):
+            if aliases.get(name, name) == table:
+                yield column, (operator or '').upper()
+
+    equality, ranges = [], []
+    for column, operator in columns(where):
+        (equality if operator in EQUALITY else ranges).append(column)
+    ordering = [column for column, _ in columns(order_by)]
+    result = []
+    for column in equality + ordering + ranges:
+        if column not in result:
+            result.append(column)
+    return result
+
+
+class PlanAnalyzer:
+    """``EXPLAIN`` e confronto dei piani per il backend di ``connection``."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.vendor = connection.vendor
+        self._row_counts = {}
+
+    def explain(self, sql):
+        """``{'cost', 'scans': {tabella}, 'sorts', 'detail'}`` per ``sql``."""
+        with self.connection.cursor() as cursor:
+            if self.vendor == 'postgresql':
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return self._postgresql_plan(plan[0]['Plan'])
+            if self.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return self._sqlite_plan(sql, [row[3] for row in cursor.fetchall()])
+        raise NotImplementedError(f'EXPLAIN non supportato per {self.vendor}')
+
+    def _postgresql_plan(self, root):
+        scans, sorts, detail, stack = set(), 0, [], [root]
+        while stack:
+            node = stack.pop()
+            detail.append(node['Node Type'] + (
+                f" on {node['Relation Name']}" if 'Relation Name' in node else ''))
+            if node['Node Type'] == 'Seq Scan':
+                scans.add(node['Relation Name'])
+            if node['Node Type'] in ('Sort', 'Incremental Sort'):
+                sorts += 1
+            stack.extend(node.get('Plans', ()))
+        return {'cost': root['Total Cost'], 'scans': scans, 'sorts': sorts, 'detail': detail}
+
+    def _sqlite_plan(self, sql, details):
+        aliases = {alias: name for name, alias in ALIAS_RE.findall(sql)}
+        scans, sorts = set(), 0
+        for line in details:
+            match = SQLITE_PLAN_RE.match(line)
+            if match and match.group(1) == 'SCAN' and 'USING' not in match.group(4):
+                name = match.group(2)
+                scans.add(aliases.get(name, name))
+            if line.startswith('USE TEMP B-TREE'):
+                sorts += 1
+        # SQLite non stima i costi: si usano le righe delle tabelle scandite.
+        cost = sum(self.row_count(table) for table in scans)
+        return {'cost': cost, 'scans': scans, 'sorts': sorts, 'detail': details}
+
+    def row_count(self, table):
+        if table not in self._row_counts:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {self.connection.ops.quote_name(table)}')
+                self._row_counts[table] = cursor.fetchone()[0]
+        return self._row_counts[table]
+
+    def existing_index(self, table, columns):
+        """Nome di un indice esistente che inizia con ``columns``, se c'è."""
+        with self.connection.cursor() as cursor:
+            constraints = self.connection.introspection.get_constraints(cursor, table)
+        for name, info in constraints.items():
+            if (info['index'] or info['unique'] or info['primary_key']) \
+                    and info['columns'][:len(columns)] == columns:
+                return name
+        return None
+
+    def index_ddl(self, table, columns):
+        quote = self.connection.ops.quote_name
+        return 'CREATE INDEX {} ON {} ({})'.format(
+            quote('index_advisor_prova'), quote(table), ', '.join(map(quote, columns)))
+
+    def try_index(self, sql, table, columns):
+        """
+        Piano di ``sql`` con un indice su ``columns`` creato e poi annullato:
+        la ``CREATE INDEX`` legge tutta la tabella e ne blocca le scritture.
+        """
+        ddl = self.index_ddl(table, columns)
+        try:
+            with transaction.atomic(using=self.connection.alias):
+                with self.connection.cursor() as cursor:
+                    cursor.execute(ddl)
+                plan = self.explain(sql)
+                raise _Rollback
+        except _Rollback:
+            pass
+        return plan, ddl
+
+
+def analyze(captured, connection=None, apply_trial=False):
+    """
+    Un rapporto per ogni query con scansioni o ordinamenti: ``{'sql',
+    'paths', 'calls', 'plan', 'suggestions'}``; ogni suggerimento è
+    ``{'table', 'columns', 'ddl', 'existing', 'before', 'after'}``.
+    ``after`` (il piano con l'indice) c'è solo con ``apply_trial``.
+    """
+    analyzer = PlanAnalyzer(connection or connections['default'])
+    grouped = {}
+    for path, sql in captured:
+        entry = grouped.setdefault(fingerprint(sql), {'sql': sql, 'paths': [], 'calls': 0})
+        entry['calls'] += 1
+        if path not in entry['paths']:
+            entry['paths'].append(path)
+
+    reports = []
+    for entry in grouped.values():
+        plan = analyzer.explain(entry['sql'])
+        if not plan['scans'] and not plan['sorts']:
+            continue
+        suggestions = []
+        for table in sorted(plan['scans']):
+            columns = candidate_columns(entry['sql'], table)
+            if not columns:
+                continue
+            existing = analyzer.existing_index(table, columns)
+            suggestion = {'table': table, 'columns': columns, 'existing': existing,
+                          'before': plan, 'after': None, 'ddl': None}
+            if existing is None and apply_trial:
+                suggestion['after'], suggestion['ddl'] = analyzer.try_index(
+                    entry['sql'], table, columns)
+            elif existing is None:
+                suggestion['ddl'] = analyzer.index_ddl(table, columns)
+            suggestions.append(suggestion)
+        reports.append({**entry, 'plan': plan, 'suggestions': suggestions})
+    reports.sort(key=lambda report: report['plan']['cost'] * report['calls'], reverse=True)
+    return reports
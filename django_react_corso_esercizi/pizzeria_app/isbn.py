@@ -0,0 +1,88 @@
+"""
+Normalizzazione e validazione degli ISBN.
+
+Tutti i punti di ingresso (``LibroForm``, ``LibroSerializer``, le scritture
+massive e il comando ``normalize_isbn``) salvano la stessa forma canonica:
+ISBN-13 di sole cifre. Gli ISBN-10 validi vengono convertiti aggiungendo il
+prefisso ``978`` e ricalcolando la cifra di controllo.
+
+Le funzioni ``*_many`` lavorano su lotti: ``normalize_many`` restituisce
+valori ed errori per indice, ``find_existing`` risolve l'unicità di N ISBN
+con una sola query ``isbn__in``.
+"""
+from django.db import connections
+
+from .models import Libro
+
+SEPARATORS = str.maketrans('', '', '- ')
+ISBN13_WEIGHTS = (1, 3) * 6
+
+
+class InvalidISBN(ValueError):
+    """Il valore non è un ISBN-10 o ISBN-13 valido."""
+
+
+def isbn13_check_digit(first12):
+    total = sum(int(digit) * weight for digit, weight in zip(first12, ISBN13_WEIGHTS))
+    return str(-total % 10)
+
+
+def isbn10_check_digit(first9):
+    total = sum(int(digit) * weight for digit, weight in zip(first9, range(10, 1, -1)))
+    check = -total % 11
+    return 'X' if check == 10 else str(check)
+
+
+def complete_isbn13(first12):
+    """Aggiunge la cifra di controllo a 12 cifre."""
+    return first12 + isbn13_check_digit(first12)
+
+
+def isbn10_to_isbn13(isbn10):
+    return complete_isbn13('978' + isbn10[:9])
+
+
+def normalize(value):
+    """Restituisce l'ISBN-13 canonico di ``value`` o solleva ``InvalidISBN``."""
+    digits = str(value).strip().translate(SEPARATORS).upper()
+    if len(digits) == 13 and digits.isdigit():
+        if digits[-1] != isbn13_check_digit(digits[:12]):
+            raise InvalidISBN('Cifra di controllo ISBN-13 non valida.')
+        return digits
+    if len(digits) == 10 and digits[:9].isdigit() and (digits[9].isdigit() or digits[9] == 'X'):
+        if digits[-1] != isbn10_check_digit(digits[:9]):
+            raise InvalidISBN('Cifra di controllo ISBN-10 non valida.')
+        return isbn10_to_isbn13(digits)
+    raise InvalidISBN("L'ISBN deve essere composto da 10 o 13 cifre.")
+
+
+def normalize_many(values):
+    """
+    Normalizza un lotto: restituisce ``(normalizzati, errori)``, entrambi
+    dizionari ``indice -> valore`` / ``indice -> messaggio``.
+    """
+    normalized, errors = {}, {}
+    for index, value in enumerate(values):
+        try:
+            normalized[index] = normalize(value)
+        except InvalidISBN as exc:
+            errors[index] = str(exc)
+    return normalized, errors
+
+
+def find_existing(isbns, queryset=None):
+    """
+    ``{isbn: pk}`` dei libri già presenti tra ``isbns`` (già normalizzati).
+
+    Una sola query ``isbn__in``, spezzata solo se il backend ha un limite
+    al numero di parametri (SQLite).
+    """
+    if queryset is None:
+        queryset = Libro.objects.all()
+    isbns = list(set(isbns))
+    limit = connections[queryset.db].features.max_query_params or len(isbns) or 1
+    existing = {}
+    for start in range(0, len(isbns), limit):
+        chunk = isbns[start:start + limit]
+        existing.update(queryset.filter(isbn__in=chunk).values_list('isbn', 'pk'))
+    return existing
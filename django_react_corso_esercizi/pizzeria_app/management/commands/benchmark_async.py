@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+
+class ConnectionCounter:
+    """Conta le connessioni aperte e i thread che le hanno aperte."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = 0
+        self.threads = set()
+
+    def __call__(self, sender, connection, **kwargs):
+        with self.lock:
+            self.created += 1
+            self.threads.add(threading.get_ident())
+
+    def __enter__(self):
+        connection_created.connect(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self)
+
+
+class Command(BaseCommand):
+    help = (
+        'Confronta le liste del catalogo servite dal percorso sincrono (un thread per '
+        'richiesta, come sotto WSGI) e da quello asincrono (ASGI): richieste al secondo, '
+        'connessioni aperte e thread usati per il database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--resource', choices=['libro', 'autore'], default='libro')
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+        resource = options['resource']
+        results = [
+            ('WSGI (thread)', self.run_sync(
+                reverse(f'pizzeria_app:{resource}-list'), total, concurrency)),
+            ('ASGI (async)', self.run_async(
+                reverse(f'pizzeria_app:async-{resource}-list'), total, concurrency)),
+        ]
+        self.stdout.write(f'{total} richieste, concorrenza {concurrency}')
+        for label, (elapsed, counter) in results:
+            self.stdout.write(
+                f'{label:<14} {total / elapsed:8.1f} req/s  '
+                f'connessioni aperte: {counter.created:4d}  '
+                f'thread con connessione: {len(counter.threads):3d}')
+
+    def run_sync(self, url, total, concurrency):
+        local = threading.local()
+
+        def get(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            assert local.client.get(url).status_code == 200
+
+        with ConnectionCounter() as counter, ThreadPoolExecutor(concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(get, range(total)))
+            elapsed = time.perf_counter() - start
+        return elapsed, counter
+
+    def run_async(self, url, total, concurrency):
+        async def main():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def get():
+                async with semaphore:
+                    response = await client.get(url)
+                    assert response.status_code == 200
+
+            await asyncio.gather(*(get() for _ in range(total)))
+
+        with ConnectionCounter() as counter:
+            start = time.perf_counter()
+            asyncio.run(main())
+            elapsed = time.perf_counter() - start
+        return elapsed, counter
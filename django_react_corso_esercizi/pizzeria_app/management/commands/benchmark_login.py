@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from pizzeria_app import hashing
+
+USERNAME = 'benchmark-login'
+PASSWORD = 'benchmark-login-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Misura i login al secondo su obtain_auth_token con l\'hasher configurato, '
+        'al variare dei thread del pool di hashing. Crea e poi elimina un utente di prova.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=40)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+        User.objects.filter(username=USERNAME).delete()
+        user = User.objects.create_user(USERNAME, password=PASSWORD)
+        url = reverse('pizzeria_app:api_user_login')
+        self.stdout.write(
+            f'{total} login, concorrenza {concurrency}, hasher {user.password.split("$")[0]} '
+            f'({user.password.split("$")[1]} iterazioni)')
+        try:
+            for workers in options['workers']:
+                # Tutte le richieste arrivano dallo stesso indirizzo: il limite
+                # per IP qui non deve intervenire.
+                with override_settings(AUTH_HASH_WORKERS=workers, AUTH_HASH_BACKLOG=total,
+                                       AUTH_HASH_PER_IP=concurrency):
+                    hashing._pool = hashing.HashingPool()
+                    elapsed = self.run(url, total, concurrency)
+                    hashing._pool.executor.shutdown()
+                self.stdout.write(f'pool da {workers:2d} thread: {total / elapsed:8.1f} login/s')
+        finally:
+            hashing._pool = None
+            user.delete()
+
+    def run(self, url, total, concurrency):
+        def login(_):
+            response = Client().post(url, {'username': USERNAME, 'password': PASSWORD})
+            assert response.status_code == 200, response.content
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(login, range(total)))
+            return time.perf_counter() - start
@@ -0,0 +1,53 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from pizzeria_app import importtime
+
+# Eseguito in un interprete nuovo: carica l'entry point e poi esegue
+# prefork.preload, come il master di gunicorn (vedi gunicorn.conf.py).
+SCRIPT = '''
+import json, resource, time
+start = time.perf_counter()
+import myproject_exercise.{entry}
+from myproject_exercise.prefork import preload
+fasi = preload()
+print(json.dumps({{
+    'totale': time.perf_counter() - start,
+    'fasi': fasi,
+    'rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Misura l\'avvio di un worker: carica myproject_exercise.wsgi (o asgi) in un '
+        'interprete nuovo con -X importtime e riporta il tempo totale, le fasi di '
+        'prefork.preload, la memoria e i tempi di import per pacchetto e per modulo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        stdout, entries = importtime.run(
+            SCRIPT.format(entry=options['entry']), os.environ.get('DJANGO_SETTINGS_MODULE'))
+        result = json.loads(stdout.strip().splitlines()[-1])
+        self.stdout.write(
+            f'myproject_exercise.{options["entry"]}: {result["totale"] * 1000:.0f} ms, '
+            f'RSS massimo {result["rss_kib"] / 1024:.1f} MiB')
+        self.stdout.write('Fasi di prefork.preload:')
+        for name, seconds in result['fasi'].items():
+            self.stdout.write(f'  {name:<12} {seconds * 1000:8.1f} ms')
+
+        self.stdout.write('Import per pacchetto (tempo proprio):')
+        for package, micro in importtime.by_package(entries).most_common(options['top']):
+            self.stdout.write(f'  {package:<30} {micro / 1000:8.1f} ms')
+        self.stdout.write(f'Moduli più lenti (cumulativo, su {len(entries)} importati):')
+        for entry in importtime.slowest(entries, options['top']):
+            self.stdout.write(
+                f'  {entry.module:<50} {entry.cumulative_us / 1000:8.1f} ms '
+                f'(proprio {entry.self_us / 1000:.1f})')
@@ -0,0 +1,237 @@
+import csv
+import datetime
+import json
+import os
+import time
+from collections import ChainMap
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from pizzeria_app.cache import bump_generation
+from pizzeria_app.isbn import InvalidISBN, find_existing, normalize
+from pizzeria_app.models import Autore, Libro
+from pizzeria_app.signals import libri_scritti_in_blocco
+from pizzeria_app.suggest import indici
+
+COLUMNS = ('titolo', 'nome', 'cognome', 'data_pubblicazione', 'isbn', 'numero_pagine', 'prezzo')
+MAX_PREZZO = Decimal('9999.99')
+
+
+def raw(record, name):
+    """Valore di ``name`` come testo; ``0`` di un NDJSON resta ``'0'``."""
+    value = record.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def text(record, name, field, errors):
+    value = raw(record, name)
+    max_length = field.max_length
+    if not value:
+        errors[name] = 'obbligatorio'
+    elif len(value) > max_length:
+        errors[name] = f'più di {max_length} caratteri'
+    return value
+
+
+def parse(record):
+    """
+    ``(valori, errori)`` di un record. Stessi vincoli di ``LibroSerializer``,
+    senza istanziare un serializer per riga.
+    """
+    errors = {}
+    values = {
+        'titolo': text(record, 'titolo', Libro._meta.get_field('titolo'), errors),
+        'nome': text(record, 'nome', Autore._meta.get_field('nome'), errors),
+        'cognome': text(record, 'cognome', Autore._meta.get_field('cognome'), errors),
+    }
+    try:
+        values['data_pubblicazione'] = datetime.date.fromisoformat(
+            raw(record, 'data_pubblicazione'))
+    except ValueError:
+        errors['data_pubblicazione'] = 'data non valida (AAAA-MM-GG)'
+    try:
+        values['isbn'] = normalize(raw(record, 'isbn'))
+    except InvalidISBN as exc:
+        errors['isbn'] = str(exc)
+    pagine = raw(record, 'numero_pagine')
+    try:
+        values['numero_pagine'] = int(pagine) if pagine else None
+    except ValueError:
+        errors['numero_pagine'] = 'numero non valido'
+    prezzo = raw(record, 'prezzo')
+    try:
+        values['prezzo'] = Decimal(prezzo) if prezzo else None
+        if values['prezzo'] is not None:
+            # NaN e Infinity passano il costruttore ma non i confronti.
+            if not values['prezzo'].is_finite():
+                raise InvalidOperation
+            values['prezzo'] = values['prezzo'].quantize(Decimal('0.01'))
+    except InvalidOperation:
+        errors['prezzo'] = 'prezzo non valido'
+    else:
+        if values['prezzo'] is not None and not 0 <= values['prezzo'] <= MAX_PREZZO:
+            errors['prezzo'] = f'fuori da 0-{MAX_PREZZO}'
+    return values, errors
+
+
+class Lines:
+    """Righe decodificate di un file binario, contando i byte consumati."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = file.tell()
+
+    def __iter__(self):
+        for line in self.file:
+            self.offset += len(line)
+            yield line.decode('utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa libri da un file CSV o NDJSON di qualunque dimensione (colonne: '
+        + ', '.join(COLUMNS) + '). Gli autori sono risolti per (nome, cognome) e creati se '
+        'mancano; i libri sono scritti con bulk_create, una transazione per lotto. Dopo '
+        'un errore si riparte con --resume dal punto salvato nel file di checkpoint.'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Predefinito: dall\'estensione del file.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--checkpoint',
+                            help='File di checkpoint (predefinito: <path>.checkpoint).')
+        parser.add_argument('--resume', action='store_true',
+                            help='Riprende dal checkpoint di un import interrotto.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        state = {'offset': None, 'record': 0, 'creati': 0, 'scartati': 0}
+        if os.path.exists(self.checkpoint_path):
+            if not options['resume']:
+                raise CommandError(
+                    f'Esiste {self.checkpoint_path} di un import interrotto: '
+                    'usa --resume o eliminalo.')
+            with open(self.checkpoint_path) as file:
+                state = json.load(file)
+            self.stdout.write(f'Ripresa dal record {state["record"]}.')
+
+        self.autori = {
+            (nome, cognome): pk for nome, cognome, pk in
+            Autore.objects.values_list('nome', 'cognome', 'id').iterator(chunk_size=10000)
+        }
+        start, imported = time.perf_counter(), 0
+        with open(path, 'rb') as file:
+            batch = []
+            for number, offset, record in self.records(file, fmt, state):
+                batch.append((number, record))
+                if len(batch) >= options['batch_size']:
+                    imported += self.write_batch(batch, offset, state)
+                    self.progress(state, imported, start)
+                    batch = []
+            if batch:
+                imported += self.write_batch(batch, offset, state)
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Creati: {state["creati"]}, scartati: {state["scartati"]}, '
+            f'{imported / elapsed if elapsed else 0:.0f} righe/s.'))
+
+    def records(self, file, fmt, state):
+        """``(numero, offset dopo il record, record)`` dal punto di ripresa."""
+        if fmt == 'csv':
+            fieldnames = next(csv.reader([file.readline().decode('utf-8-sig')]))
+            if state['offset'] is not None:
+                file.seek(state['offset'])
+            lines = Lines(file)
+            rows = (dict(zip(fieldnames, row)) for row in csv.reader(lines) if row)
+        else:
+            if state['offset'] is not None:
+                file.seek(state['offset'])
+            lines = Lines(file)
+            rows = (self.loads(line) for line in lines if line.strip())
+        number = state['record']
+        for record in rows:
+            number += 1
+            yield number, lines.offset, record
+
+    def loads(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return record if isinstance(record, dict) else None
+
+    def write_batch(self, batch, offset, state):
+        valid = []
+        for number, record in batch:
+            if record is None:
+                self.reject(number, {'record': 'JSON non valido'}, state)
+                continue
+            values, errors = parse(record)
+            if errors:
+                self.reject(number, errors, state)
+            else:
+                valid.append((number, values))
+
+        owners = find_existing(values['isbn'] for _, values in valid)
+        libri, seen = [], set()
+        for number, values in valid:
+            if values['isbn'] in owners or values['isbn'] in seen:
+                self.reject(number, {'isbn': f'{values["isbn"]} già presente'}, state)
+                continue
+            seen.add(values['isbn'])
+            libri.append(values)
+
+        with transaction.atomic():
+            new_autori = self.create_autori(libri)
+            autori = ChainMap(new_autori, self.autori)
+            created = Libro.objects.bulk_create(
+                Libro(autore_id=autori[values.pop('nome'), values.pop('cognome')], **values)
+                for values in libri)
+            pks = [libro.pk for libro in created]
+            if pks:
+                # Indice di ricerca e statistiche nella stessa transazione del lotto;
+                # cache e suggerimenti si invalidano al commit (transaction.on_commit
+                # nei receiver), così un lotto annullato non li tocca.
+                libri_scritti_in_blocco.send(sender=Libro, pks=pks, created=True)
+        # Solo dopo il commit: se il lotto fallisce non restano id inesistenti.
+        self.autori.update(new_autori)
+        if new_autori:
+            bump_generation(Autore)
+            indici['autore'].invalidate()
+
+        state.update(offset=offset, record=batch[-1][0], creati=state['creati'] + len(pks))
+        self.save_checkpoint(state)
+        return len(batch)
+
+    def create_autori(self, libri):
+        """``{(nome, cognome): id}`` degli autori mancanti, creati con un solo bulk_create."""
+        missing = {(values['nome'], values['cognome']) for values in libri} - self.autori.keys()
+        created = Autore.objects.bulk_create(
+            Autore(nome=nome, cognome=cognome) for nome, cognome in sorted(missing))
+        return {(autore.nome, autore.cognome): autore.pk for autore in created}
+
+    def reject(self, number, errors, state):
+        state['scartati'] += 1
+        details = '; '.join(f'{name}: {message}' for name, message in errors.items())
+        self.stderr.write(f'Record {number}: {details}')
+
+    def save_checkpoint(self, state):
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(state, file)
+        os.replace(temporary, self.checkpoint_path)
+
+    def progress(self, state, imported, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Record {state["record"]}: creati {state["creati"]}, scartati {state["scartati"]}, '
+            f'{imported / elapsed:.0f} righe/s')
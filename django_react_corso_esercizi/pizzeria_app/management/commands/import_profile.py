@@ -0,0 +1,80 @@
+import json
+import os
+import statistics
+
+from django.core.management.base import BaseCommand
+
+from pizzeria_app import importtime
+
+# Eseguito in un interprete nuovo: tutto ciò che manage.py fa prima di handle().
+SCRIPT = '''
+import json, time
+timings = {{}}
+start = last = time.perf_counter()
+
+def mark(name):
+    global last
+    now = time.perf_counter()
+    timings[name], last = now - last, now
+
+import django
+from django.conf import settings
+from django.core.management import get_commands, load_command_class
+mark('django.core.management')
+settings.INSTALLED_APPS
+mark('settings')
+django.setup()
+mark('django.setup')
+command = load_command_class(get_commands()[{name!r}], {name!r})
+mark('comando')
+if command.requires_system_checks == '__all__':
+    command.check()
+elif command.requires_system_checks:
+    command.check(tags=command.requires_system_checks)
+mark('controlli')
+timings['totale'] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Misura l\'avvio di un comando di gestione senza eseguirlo: import di Django e '
+        'delle impostazioni, django.setup(), caricamento del comando e controlli di '
+        'sistema, ciascuno in un interprete nuovo (mediana di --runs esecuzioni). Riporta '
+        'poi i tempi di import per pacchetto e per modulo (-X importtime).'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('commands', nargs='*', default=['rebuild_stats', 'collectstatic'])
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=10)
+
+    def handle(self, *args, **options):
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE')
+        for name in options['commands']:
+            script = SCRIPT.format(name=name)
+            runs = [
+                json.loads(importtime.run(script, settings_module, importtime=False)[0])
+                for _ in range(options['runs'])
+            ]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'manage.py {name}: {statistics.median(r["totale"] for r in runs) * 1000:.0f} ms '
+                f'(mediana di {len(runs)})'))
+            for phase in runs[0]:
+                if phase != 'totale':
+                    median = statistics.median(r[phase] for r in runs)
+                    self.stdout.write(f'  {phase:<24} {median * 1000:8.1f} ms')
+
+            _, entries = importtime.run(script, settings_module)
+            self.stdout.write(f'  Import per pacchetto (tempo proprio, {len(entries)} moduli):')
+            for package, micro in importtime.by_package(entries).most_common(options['top']):
+                self.stdout.write(f'    {package:<30} {micro / 1000:8.1f} ms')
+            self.stdout.write('  Moduli più lenti del progetto (cumulativo):')
+            ours = [entry for entry in entries
+                    if entry.module.partition('.')[0] in ('pizzeria_app', 'myproject_exercise')]
+            for entry in importtime.slowest(ours, options['top']):
+                self.stdout.write(
+                    f'    {entry.module:<50} {entry.cumulative_us / 1000:8.1f} ms '
+                    f'(proprio {entry.self_us / 1000:.1f})')
@@ -0,0 +1,96 @@
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+
+from pizzeria_app.index_advisor import analyze, capture
+from pizzeria_app.models import Autore, Libro
+from pizzeria_app.search import tokenize
+
+
+def default_paths():
+    """Gli endpoint di lettura del catalogo, con il primo libro e autore come esempio."""
+    paths = [
+        reverse('pizzeria_app:lista_libri'),
+        reverse('pizzeria_app:libro-list'),
+        reverse('pizzeria_app:autore-list'),
+        reverse('pizzeria_app:async-stats'),
+    ]
+    libro = Libro.objects.order_by('pk').only('pk', 'titolo').first()
+    if libro is not None:
+        paths += [
+            reverse('pizzeria_app:dettaglio_libro', args=[libro.pk]),
+            reverse('pizzeria_app:libro-detail', args=[libro.pk]),
+        ]
+        terms = tokenize(libro.titolo)
+        if terms:
+            paths.append(reverse('pizzeria_app:libro-search') + '?' + urlencode({'q': terms[0]}))
+    autore = Autore.objects.order_by('pk').only('pk').first()
+    if autore is not None:
+        paths += [
+            reverse('pizzeria_app:autore-detail', args=[autore.pk]),
+            reverse('pizzeria_app:autore-stats', args=[autore.pk]),
+        ]
+    return paths
+
+
+class Command(BaseCommand):
+    help = (
+        "Esegue le query degli endpoint del catalogo, ne analizza il piano con EXPLAIN "
+        "e propone indici per le scansioni sequenziali, con il beneficio stimato."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', default=[], dest='urls',
+                            help='Percorso aggiuntivo da analizzare (ripetibile).')
+        parser.add_argument('--solo-url', action='store_true',
+                            help='Analizza solo i percorsi passati con --url.')
+        parser.add_argument(
+            '--apply-trial', action='store_true',
+            help='Crea ogni indice suggerito in una transazione annullata per misurarne il '
+                 'beneficio. La CREATE INDEX legge l\'intera tabella e ne blocca le '
+                 'scritture: non usarlo su un database di produzione sotto carico.')
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, **options):
+        paths = ([] if options['solo_url'] else default_paths()) + options['urls']
+        connection = connections['default']
+        if options['apply_trial']:
+            self.stderr.write(self.style.WARNING(
+                f'--apply-trial: gli indici suggeriti vengono creati (e annullati) su '
+                f'{connection.settings_dict["NAME"]}; le tabelle restano bloccate in '
+                f'scrittura durante ogni prova.'))
+        reports = analyze(capture(paths), connection, apply_trial=options['apply_trial'])
+        if not reports:
+            self.stdout.write(self.style.SUCCESS(
+                f'Nessuna scansione sequenziale nelle query di {len(paths)} endpoint.'))
+            return
+
+        unit = 'costo' if connection.vendor == 'postgresql' else 'righe lette'
+        for report in reports:
+            plan = report['plan']
+            self.stdout.write(self.style.WARNING(
+                f"{', '.join(sorted(plan['scans'])) or 'ordinamento'}: "
+                f"{report['calls']} esecuzioni, {unit} {plan['cost']}, "
+                f"ordinamenti senza indice {plan['sorts']}"))
+            self.stdout.write(f"  endpoint: {', '.join(report['paths'])}")
+            self.stdout.write(f"  query: {report['sql'][:300]}")
+            self.stdout.write(f"  piano: {' | '.join(plan['detail'])}")
+            for suggestion in report['suggestions']:
+                columns = ', '.join(suggestion['columns'])
+                if suggestion['existing']:
+                    self.stdout.write(
+                        f"  indice {suggestion['existing']} su ({columns}) esistente ma non "
+                        f"usato: tabella piccola o statistiche da aggiornare (ANALYZE).")
+                    continue
+                after = suggestion['after']
+                self.stdout.write(self.style.SUCCESS(f"  suggerito: {suggestion['ddl']}"))
+                if after is None:
+                    self.stdout.write('    beneficio non misurato (--apply-trial per provarlo).')
+                    continue
+                self.stdout.write(
+                    f"    {unit}: {plan['cost']} -> {after['cost']}, "
+                    f"ordinamenti: {plan['sorts']} -> {after['sorts']}, "
+                    f"piano: {' | '.join(after['detail'])}")
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from pizzeria_app.isbn import find_existing, normalize_many
+from pizzeria_app.models import Libro
+from pizzeria_app.signals import libri_scritti_in_blocco
+
+
+class Command(BaseCommand):
+    help = 'Porta gli ISBN dei libri alla forma canonica ISBN-13 e segnala quelli non validi.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Mostra cosa cambierebbe senza scrivere nel database.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = Libro.objects.order_by('pk').values_list('pk', 'isbn')
+        batch, totals = [], {'aggiornati': 0, 'non_validi': 0, 'conflitti': 0}
+        # ISBN canonico -> libro che lo ha ricevuto in questa esecuzione: due
+        # forme dello stesso ISBN nello stesso lotto (o con --dry-run) non sono
+        # ancora nel database, e bulk_update fallirebbe sul vincolo di unicità.
+        updated, seen = [], {}
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                updated += self.process(batch, totals, seen, options['dry_run'])
+                batch = []
+        if batch:
+            updated += self.process(batch, totals, seen, options['dry_run'])
+
+        if updated and not options['dry_run']:
+            libri_scritti_in_blocco.send(sender=Libro, pks=updated,
+                                         update_fields=['isbn', 'updated_at'])
+        self.stdout.write(self.style.SUCCESS(
+            'Aggiornati: {aggiornati}, non validi: {non_validi}, conflitti: {conflitti}'.format(
+                **totals)))
+
+    def process(self, batch, totals, seen, dry_run):
+        normalized, errors = normalize_many(isbn for _, isbn in batch)
+        for index, message in errors.items():
+            pk, isbn = batch[index]
+            self.stderr.write(f'Libro {pk}: ISBN {isbn!r} non valido ({message})')
+        totals['non_validi'] += len(errors)
+
+        changed = {batch[index][0]: isbn for index, isbn in normalized.items()
+                   if isbn != batch[index][1]}
+        owners = find_existing(changed.values())
+        libri, now = [], timezone.now()
+        for pk, isbn in changed.items():
+            owner = owners.get(isbn, seen.get(isbn, pk))
+            if owner != pk:
+                self.stderr.write(f'Libro {pk}: {isbn} appartiene già al libro {owner}')
+                totals['conflitti'] += 1
+                continue
+            seen[isbn] = pk
+            libri.append(Libro(pk=pk, isbn=isbn, updated_at=now))
+        totals['aggiornati'] += len(libri)
+        if libri and not dry_run:
+            with transaction.atomic():
+                Libro.objects.bulk_update(libri, ['isbn', 'updated_at'])
+        return [libro.pk for libro in libri]
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from pizzeria_app.models import Libro, TermineRicerca
+from pizzeria_app.search import reindex_libri
+
+
+class Command(BaseCommand):
+    help = "Ricostruisce da zero l'indice di ricerca dei libri."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        TermineRicerca.objects.all().delete()
+        pks = Libro.objects.order_by('pk').values_list('pk', flat=True)
+        batch, total = [], 0
+        for pk in pks.iterator(chunk_size=batch_size):
+            batch.append(pk)
+            if len(batch) >= batch_size:
+                reindex_libri(batch, batch_size)
+                total += len(batch)
+                batch = []
+        if batch:
+            reindex_libri(batch, batch_size)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indicizzati {total} libri, {TermineRicerca.objects.count()} termini.'))
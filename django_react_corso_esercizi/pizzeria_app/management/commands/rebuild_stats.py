@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from pizzeria_app.models import StatisticheAnno, StatisticheAutore
+from pizzeria_app.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Ricalcola da zero le statistiche materializzate per autore e per anno.'
+    requires_system_checks = []
+
+    def handle(self, *args, **options):
+        rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Statistiche ricalcolate: {StatisticheAutore.objects.count()} autori, '
+            f'{StatisticheAnno.objects.count()} anni.'))
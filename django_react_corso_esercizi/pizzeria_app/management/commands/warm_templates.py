@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from pizzeria_app.warmup import TEMPLATES, warm_templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Compila i template delle pagine del catalogo nella cache del loader e riporta '
+        'il tempo di ciascuno, a freddo e a caldo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('templates', nargs='*', default=TEMPLATES)
+
+    def handle(self, *args, **options):
+        cold = warm_templates(options['templates'])
+        warm = warm_templates(options['templates'])
+        for name in options['templates']:
+            self.stdout.write(
+                f'{name:<45} {cold[name] * 1000:7.2f} ms  a caldo {warm[name] * 1000:6.3f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(cold)} template compilati in {sum(cold.values()) * 1000:.1f} ms.'))
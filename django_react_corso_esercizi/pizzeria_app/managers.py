@@ -0,0 +1,38 @@
+from django.db import models
+
+
+class LibroQuerySet(models.QuerySet):
+    """
+    Queryset dei libri con un metodo per ogni punto d'ingresso.
+
+    Ogni metodo dichiara le relazioni da caricare in JOIN e le colonne
+    necessarie a quel consumatore, così nessuna vista genera query N+1
+    accedendo a ``libro.autore``.
+    """
+
+    def per_lista(self):
+        """
+        Pagina ``lista_libri``: titolo, data e nome dell'autore, più gli
+        ``updated_at`` che compongono le chiavi dei frammenti in cache.
+        """
+        return self.select_related('autore').only(
+            'id', 'titolo', 'data_pubblicazione', 'updated_at',
+            'autore__id', 'autore__nome', 'autore__cognome', 'autore__updated_at',
+        )
+
+    def per_dettaglio(self):
+        """Pagina ``dettaglio_libro``: tutti i campi del libro e dell'autore."""
+        return self.select_related('autore')
+
+    def per_api(self):
+        """``LibroViewSet``: il serializer espone l'autore solo come chiave primaria."""
+        return self.only(
+            'id', 'titolo', 'autore_id', 'data_pubblicazione', 'isbn', 'numero_pagine', 'prezzo',
+        )
+
+    def per_admin(self):
+        """Changelist dell'admin: ``list_display`` mostra ``str(libro.autore)``."""
+        return self.select_related('autore')
+
+
+LibroManager = models.Manager.from_queryset(LibroQuerySet)
@@ -0,0 +1,362 @@
+"""
+Metriche in stile Prometheus senza agenti esterni.
+
+Contatori e istogrammi a bucket fissi, aggiornati da ``MetricsMiddleware``
+(richieste, latenza e query per vista) e dal suo ``execute_wrapper`` sulle
+connessioni (durata delle singole query), ed esposti da ``metrics_view`` su
+``/metrics`` nel formato testuale di Prometheus.
+
+I valori stanno in un file mappato in memoria per processo
+(``METRICS_DIR/<pid>.db``): ogni worker di gunicorn scrive solo nel proprio
+file, con un lock di thread tenuto per pochi byte, e ``/metrics`` somma i
+file di tutti i worker, quindi qualunque worker risponda il totale è lo
+stesso. I file dei worker terminati restano e continuano a contare; la
+directory va svuotata all'avvio del master (``clear_metrics_dir``). Senza
+``METRICS_DIR`` i valori restano in una mappa anonima del processo, che
+basta in sviluppo e nei test.
+"""
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+UNRESOLVED = '<non risolta>'
+
+# Formato del file: ``[usati: uint32][4 byte liberi]`` e poi le voci
+# ``[lunghezza: uint32][chiave utf-8][riempimento][valore: double]``, con il
+# valore allineato a 8 byte.
+HEADER = struct.Struct('<I4x')
+LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+
+
+def _value_offset(position, length):
+    end = position + LENGTH.size + length
+    return end + (-end % VALUE.size)
+
+
+def read_entries(buffer):
+    """``(chiave, offset, valore)`` delle voci complete di ``buffer``."""
+    if len(buffer) < HEADER.size:
+        return
+    used = min(HEADER.unpack_from(buffer)[0], len(buffer))
+    position = HEADER.size
+    while position + LENGTH.size <= used:
+        length = LENGTH.unpack_from(buffer, position)[0]
+        offset = _value_offset(position, length)
+        if offset + VALUE.size > used:
+            return
+        start = position + LENGTH.size
+        yield bytes(buffer[start:start + length]).decode(), offset, \
+            VALUE.unpack_from(buffer, offset)[0]
+        position = offset + VALUE.size
+
+
+class MmapStore:
+    """
+    Valori ``chiave -> float`` di un processo in un mmap, su file (``path``)
+    o anonimo. Una nuova voce diventa visibile ai lettori solo quando
+    l'intestazione viene aggiornata, dopo averla scritta per intero.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = None
+        size = INITIAL_SIZE
+        if path is not None:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            size = max(os.fstat(self.fd).st_size, INITIAL_SIZE)
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(-1 if self.fd is None else self.fd, size)
+        # Un pid riusato ritrova il file del worker precedente e ci somma.
+        self.positions = {key: offset for key, offset, _ in read_entries(self.map)}
+        self.used = max(HEADER.unpack_from(self.map)[0], HEADER.size)
+
+    def add(self, changes):
+        """Somma ``[(chiave, quantità)]`` sotto un'unica acquisizione del lock."""
+        with self.lock:
+            for key, amount in changes:
+                offset = self.positions.get(key)
+                if offset is None:
+                    offset = self._append(key)
+                VALUE.pack_into(self.map, offset, VALUE.unpack_from(self.map, offset)[0] + amount)
+
+    def values(self):
+        with self.lock:
+            return {key: value for key, _, value in read_entries(self.map)}
+
+    def _append(self, key):
+        data = key.encode()
+        offset = _value_offset(self.used, len(data))
+        end = offset + VALUE.size
+        if end > len(self.map):
+            self._grow(end)
+        LENGTH.pack_into(self.map, self.used, len(data))
+        start = self.used + LENGTH.size
+        self.map[start:start + len(data)] = data
+        VALUE.pack_into(self.map, offset, 0.0)
+        HEADER.pack_into(self.map, 0, end)
+        self.used = end
+        self.positions[key] = offset
+        return offset
+
+    def _grow(self, needed):
+        size = len(self.map)
+        while size < needed:
+            size *= 2
+        if self.fd is None:
+            grown = mmap.mmap(-1, size)
+            grown[:self.used] = self.map[:self.used]
+        else:
+            os.ftruncate(self.fd, size)
+            grown = mmap.mmap(self.fd, size)
+        self.map.close()
+        self.map = grown
+
+    def close(self):
+        self.map.close()
+        if self.fd is not None:
+            os.close(self.fd)
+
+
+_store = None
+_store_owner = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Lo store del processo corrente; dopo un fork il figlio ne apre uno suo."""
+    global _store, _store_owner
+    owner = (os.getpid(), getattr(settings, 'METRICS_DIR', None))
+    if _store_owner != owner:
+        with _store_lock:
+            if _store_owner != owner:
+                pid, directory = owner
+                _store = MmapStore(os.path.join(directory, f'{pid}.db') if directory else None)
+                _store_owner = owner
+    return _store
+
+
+def clear_metrics_dir():
+    """Elimina i file dei worker precedenti: da chiamare all'avvio del master."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def collect():
+    """``{chiave: valore}`` sommati su tutti i processi."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return get_store().values()
+    totals = defaultdict(float)
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        with open(path, 'rb') as file:
+            data = file.read()
+        for key, _, value in read_entries(data):
+            totals[key] += value
+    return totals
+
+
+REGISTRY = {}
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._keys = {}
+        REGISTRY[name] = self
+
+    def key(self, suffix, labelvalues, extra=()):
+        """Chiave dello store per un campione; calcolata una volta sola."""
+        cache_key = (suffix, labelvalues, extra)
+        key = self._keys.get(cache_key)
+        if key is None:
+            labels = [*zip(self.labelnames, map(str, labelvalues)), *extra]
+            key = self._keys[cache_key] = json.dumps([self.name, suffix, labels])
+        return key
+
+    def _labelvalues(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def expose(self, samples):
+        """Righe di testo per ``samples``: ``{(suffisso, etichette): valore}``."""
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        for (suffix, labels), value in sorted(samples.items()):
+            yield f'{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}'
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        get_store().add([(self.key('', self._labelvalues(labels)), amount)])
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.bounds = [_format_value(bound) for bound in (*self.buckets, math.inf)]
+
+    def observe(self, value, **labels):
+        labelvalues = self._labelvalues(labels)
+        # Il bucket di ``value`` viene salvato da solo: le somme cumulative
+        # si fanno all'esposizione, non a ogni osservazione.
+        bound = self.bounds[bisect_left(self.buckets, value)]
+        get_store().add([
+            (self.key('_bucket', labelvalues, (('le', bound),)), 1),
+            (self.key('_sum', labelvalues), value),
+            (self.key('_count', labelvalues), 1),
+        ])
+
+    def expose(self, samples):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        series = defaultdict(dict)
+        for (suffix, labels), value in samples.items():
+            if suffix == '_bucket':
+                *labels, (_, bound) = labels
+                series[tuple(labels)][bound] = value
+            else:
+                series[labels][suffix] = value
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound in self.bounds:
+                cumulative += values.get(bound, 0)
+                bucket_labels = _format_labels((*labels, ('le', bound)))
+                yield f'{self.name}_bucket{bucket_labels} {_format_value(cumulative)}'
+            for suffix in ('_sum', '_count'):
+                yield f'{self.name}{suffix}{_format_labels(labels)} ' \
+                      f'{_format_value(values.get(suffix, 0))}'
+
+
+def exposition():
+    """Tutte le metriche registrate nel formato testuale di Prometheus."""
+    samples = defaultdict(dict)
+    for key, value in collect().items():
+        name, suffix, labels = json.loads(key)
+        samples[name][suffix, tuple(map(tuple, labels))] = value
+    lines = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.expose(samples.get(metric.name, {})))
+    return '\n'.join(lines) + '\n'
+
+
+REQUESTS = Counter(
+    'django_http_requests_total', 'Richieste HTTP per vista, metodo e stato.',
+    ('view', 'method', 'status'))
+REQUEST_LATENCY = Histogram(
+    'django_http_request_duration_seconds', 'Latenza delle richieste HTTP per vista e metodo.',
+    ('view', 'method'))
+REQUEST_QUERIES = Counter(
+    'django_http_request_queries_total', 'Query eseguite dalle richieste, per vista.', ('view',))
+QUERY_LATENCY = Histogram(
+    'django_db_query_duration_seconds', 'Durata delle query per connessione.',
+    ('alias',), buckets=QUERY_BUCKETS)
+
+
+class QueryTimer:
+    """``execute_wrapper``: durata di ogni query e conteggio per la richiesta."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            QUERY_LATENCY.observe(time.perf_counter() - start,
+                                  alias=context['connection'].alias)
+            self.queries += 1
+
+    @contextmanager
+    def activate(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+class MetricsMiddleware:
+    """
+    Richieste, latenza e query per nome della vista (``view_name`` del
+    resolver, mai il percorso, per non moltiplicare le serie).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start, timer = time.perf_counter(), QueryTimer()
+        with timer.activate():
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    async def __acall__(self, request):
+        start, timer = time.perf_counter(), QueryTimer()
+        with timer.activate():
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    def record(self, request, response, duration, timer):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_LATENCY.observe(duration, view=view, method=request.method)
+        if timer.queries:
+            REQUEST_QUERIES.inc(timer.queries, view=view)
+
+
+def metrics_view(request):
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
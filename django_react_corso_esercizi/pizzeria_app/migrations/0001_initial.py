@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Autore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('cognome', models.CharField(max_length=100)),
+                ('data_nascita', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Libro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titolo', models.CharField(max_length=200)),
+                ('data_pubblicazione', models.DateField()),
+                ('isbn', models.CharField(max_length=13, unique=True)),
+                ('numero_pagine', models.IntegerField(blank=True, null=True)),
+                ('prezzo', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('autore', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='libri', to='pizzeria_app.autore')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizzeria_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autore',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizzeria_app', '0002_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermineRicerca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termine', models.CharField(max_length=50)),
+                ('peso', models.PositiveSmallIntegerField()),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termini_ricerca', to='pizzeria_app.libro')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('termine', 'libro'), name='termine_libro_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizzeria_app', '0003_termine_ricerca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticheAnno',
+            fields=[
+                ('libri', models.PositiveIntegerField(default=0)),
+                ('somma_prezzi', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('prezzi', models.PositiveIntegerField(default=0)),
+                ('somma_pagine', models.BigIntegerField(default=0)),
+                ('pagine', models.PositiveIntegerField(default=0)),
+                ('anno', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StatisticheAutore',
+            fields=[
+                ('libri', models.PositiveIntegerField(default=0)),
+                ('somma_prezzi', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('prezzi', models.PositiveIntegerField(default=0)),
+                ('somma_pagine', models.BigIntegerField(default=0)),
+                ('pagine', models.PositiveIntegerField(default=0)),
+                ('autore', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistiche', serialize=False, to='pizzeria_app.autore')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-libri'], name='statistiche_autore_libri')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizzeria_app', '0004_statistiche'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='autore',
+            index=models.Index(fields=['cognome', 'nome', 'id'], name='autore_cognome_nome_id'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['titolo', 'id'], name='libro_titolo_id'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['autore', 'data_pubblicazione'], name='libro_autore_data'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='autore',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='libri', to='pizzeria_app.autore'),
+        ),
+    ]
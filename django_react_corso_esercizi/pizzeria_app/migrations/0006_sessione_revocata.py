@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizzeria_app', '0005_indici_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessioneRevocata',
+            fields=[
+                ('sid', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('scadenza', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
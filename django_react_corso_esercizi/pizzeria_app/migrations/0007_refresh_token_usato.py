@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizzeria_app', '0006_sessione_revocata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshTokenUsato',
+            fields=[
+                ('jti', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('scadenza', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,126 @@
 from django.db import models
 
-# Create your models here.
+from .managers import LibroManager
+
+
+class Autore(models.Model):
+    nome = models.CharField(max_length=100)
+    cognome = models.CharField(max_length=100)
+    data_nascita = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Ordinamento delle liste e paginazione keyset (id come spareggio).
+            models.Index(fields=['cognome', 'nome', 'id'], name='autore_cognome_nome_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} {self.cognome}"
+
+
+class Libro(models.Model):
+    titolo = models.CharField(max_length=200)
+    # L'indice (autore, data_pubblicazione) copre anche le ricerche per autore.
+    autore = models.ForeignKey(Autore, on_delete=models.CASCADE, related_name='libri',
+                               db_index=False)
+    data_pubblicazione = models.DateField()
+    isbn = models.CharField(max_length=13, unique=True)
+    numero_pagine = models.IntegerField(null=True, blank=True)
+    prezzo = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LibroManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['titolo', 'id'], name='libro_titolo_id'),
+            models.Index(fields=['autore', 'data_pubblicazione'], name='libro_autore_data'),
+        ]
+
+    def __str__(self):
+        return self.titolo
+
+
+class TermineRicerca(models.Model):
+    """
+    Indice invertito per la ricerca nel catalogo: una riga per ogni termine
+    (parola normalizzata di titolo, nome dell'autore o ISBN) di ciascun libro.
+    """
+    termine = models.CharField(max_length=50)
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='termini_ricerca')
+    peso = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['termine', 'libro'], name='termine_libro_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.termine} -> {self.libro_id}"
+
+
+class StatisticheCatalogo(models.Model):
+    """
+    Contatori precalcolati del catalogo, aggiornati a ogni scrittura di un
+    ``Libro`` (vedi ``stats.py``). Le medie si ricavano da somme e conteggi
+    dei valori non nulli.
+    """
+    libri = models.PositiveIntegerField(default=0)
+    somma_prezzi = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    prezzi = models.PositiveIntegerField(default=0)
+    somma_pagine = models.BigIntegerField(default=0)
+    pagine = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def prezzo_medio(self):
+        return self.somma_prezzi / self.prezzi if self.prezzi else None
+
+    @property
+    def pagine_medie(self):
+        return self.somma_pagine / self.pagine if self.pagine else None
+
+
+class StatisticheAutore(StatisticheCatalogo):
+    autore = models.OneToOneField(
+        Autore, on_delete=models.CASCADE, primary_key=True, related_name='statistiche')
+
+    class Meta:
+        indexes = [models.Index(fields=['-libri'], name='statistiche_autore_libri')]
+
+    def __str__(self):
+        return f"Statistiche autore {self.autore_id}"
+
+
+class StatisticheAnno(StatisticheCatalogo):
+    anno = models.PositiveSmallIntegerField(primary_key=True)
+
+    def __str__(self):
+        return f"Statistiche {self.anno}"
+
+
+class SessioneRevocata(models.Model):
+    """
+    Sessione di token firmati revocata (logout). La riga serve solo finché
+    gli access token della sessione possono essere validi.
+    """
+    sid = models.CharField(max_length=32, primary_key=True)
+    scadenza = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Sessione revocata {self.sid}"
+
+
+class RefreshTokenUsato(models.Model):
+    """
+    Refresh token già scambiato o chiuso dal logout: ognuno vale una volta
+    sola. La riga serve finché il token non scade.
+    """
+    jti = models.CharField(max_length=32, primary_key=True)
+    scadenza = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Refresh token usato {self.jti}"
@@ -0,0 +1,180 @@
+"""
+Paginazione keyset (a cursore) per le API del catalogo.
+
+A differenza di ``PageNumberPagination`` non esegue mai ``COUNT(*)`` né
+``OFFSET``: ogni pagina è una "seek" sulle colonne di ordinamento del
+queryset (più ``id`` come spareggio), per cui il costo resta costante a
+qualunque profondità della lista.
+"""
+import base64
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagina un queryset ordinato cercando la posizione dell'ultima riga vista.
+
+    L'ordinamento viene letto dal queryset della vista (es.
+    ``order_by('cognome', 'nome')``) e completato con ``id``, così che la
+    tupla sia unica. Le colonne di ordinamento non devono essere nullable.
+    Il cursore è opaco per il client: codifica la direzione e i valori
+    della riga di confine.
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursore non valido.'
+    # Nomi delle colonne quando il queryset restituisce tuple (values_list).
+    row_fields = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.seek_queryset(queryset, request)
+        # Una riga in più per sapere se esiste una pagina successiva senza COUNT(*).
+        return self.set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Come ``paginate_queryset``, leggendo le righe con l'ORM asincrono."""
+        queryset = self.seek_queryset(queryset, request)
+        return self.set_page([row async for row in queryset[:self.page_size + 1]])
+
+    def set_page(self, rows):
+        """Ricava pagina e link da ``page_size + 1`` righe lette dopo il cursore."""
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if self.reverse:
+            page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        self.page = page
+        return page
+
+    def seek_queryset(self, queryset, request):
+        """
+        Ordina e filtra il queryset fino alla posizione del cursore.
+
+        Le prime ``page_size`` righe del risultato sono la pagina richiesta
+        (in ordine inverso se si naviga all'indietro).
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        self.reverse, self.position = self.decode_cursor(request)
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self._invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, self.position))
+        return queryset
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        if not ordering:
+            ordering = list(queryset.model._meta.ordering)
+        names = {field.lstrip('-') for field in ordering}
+        if not names & {'id', 'pk'}:
+            ordering.append('id')
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(reverse=False, row=self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._link(reverse=True, row=self.page[0])
+
+    def encode_cursor(self, reverse, position):
+        payload = json.dumps({'r': int(reverse), 'p': position}, cls=DjangoJSONEncoder,
+                             separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            reverse, position = bool(payload['r']), payload['p']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def _link(self, reverse, row):
+        position = [self._value(row, field.lstrip('-')) for field in self.ordering]
+        cursor = self.encode_cursor(reverse, position)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def _value(self, row, name):
+        if self.row_fields is not None:
+            return row[self.row_fields.index(name)]
+        if name == 'pk':
+            return row.pk
+        return getattr(row, row._meta.get_field(name).attname)
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _seek_filter(ordering, position):
+        """
+        Costruisce ``(a, b, id) > (va, vb, vid)`` come OR di prefissi uguali,
+        in modo portabile tra SQLite e PostgreSQL e sfruttabile dagli indici.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
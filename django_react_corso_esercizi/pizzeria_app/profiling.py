@@ -0,0 +1,227 @@
+"""
+Profilazione per richiesta: query, tempo di database, serializzazione e
+template.
+
+``QueryProfilerMiddleware`` registra per ogni richiesta un ``RequestProfile``
+(disponibile come ``request.query_profile``) con:
+
+- numero di query e tempo totale di database, tramite un
+  ``execute_wrapper`` sulle connessioni;
+- impronte delle query (SQL con i segnaposto, liste ``IN`` compresse): la
+  stessa SELECT eseguita più volte in una richiesta è il segno di un N+1;
+- tempo nei serializer DRF (``.data`` e rendering JSON, più le sezioni
+  ``section('ser')`` del percorso veloce) e nel rendering dei template.
+
+I valori finiscono nell'header ``Server-Timing`` (``PROFILER_SERVER_TIMING``)
+e, con ``PROFILER_ENFORCE_BUDGETS``, le GET oltre il budget di
+``QUERY_BUDGETS`` sollevano ``QueryBudgetExceeded``: va attivato in sviluppo
+e nei test, non in produzione. Il budget conta le query della vista, da
+``process_view`` in poi, escluse quelle dell'autenticazione (sessione,
+utente, token: sezione ``auth``), che dipendono da chi chiama e non da cosa
+mostra la vista. Con entrambe le impostazioni spente il middleware si
+toglie dalla catena e la strumentazione non viene installata.
+
+Le query eseguite mentre si consuma una ``StreamingHttpResponse`` avvengono
+dopo il middleware e non vengono contate.
+"""
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .query_budget import QUERY_BUDGETS, QueryBudgetExceeded
+
+logger = logging.getLogger(__name__)
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'IN \((?:(?:%s|\?), )+(?:%s|\?)\)')
+SECTIONS = (('auth', 'Autenticazione'), ('ser', 'Serializer'), ('tpl', 'Template'))
+
+_current = ContextVar('query_profile', default=None)
+
+
+def fingerprint(sql):
+    """
+    Impronta di una query: letterali sostituiti da ``?`` (l'SQL catturato dai
+    test ha i parametri interpolati) e ``IN (%s, %s, ...)`` ridotto a
+    ``IN (...)``, così la stessa query con valori diversi conta una volta.
+    """
+    return IN_LIST_RE.sub('IN (...)', LITERAL_RE.sub('?', sql))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        # Query della vista fuori dall'autenticazione: quelle soggette al budget.
+        self.view_queries = 0
+        self.in_view = False
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.sections = defaultdict(float)
+        self._depth = Counter()
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            if self.in_view and not self._depth['auth']:
+                self.view_queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """
+        ``{impronta: esecuzioni}`` delle SELECT ripetute nella richiesta; le
+        scritture a blocchi ripetono la stessa INSERT per scelta.
+        """
+        return {sql: count for sql, count in self.fingerprints.items()
+                if count > 1 and sql.lstrip().upper().startswith('SELECT')}
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self))
+                yield self
+        finally:
+            _current.reset(token)
+            self.duration = time.perf_counter() - self.start
+
+    def server_timing(self):
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} query"',
+            *(f'{name};dur={self.sections[name] * 1000:.1f};desc="{label}"'
+              for name, label in SECTIONS),
+        ]
+        repeated = sum(count - 1 for count in self.duplicates.values())
+        if repeated:
+            metrics.append(f'dup;desc="{repeated} query ripetute"')
+        if self.duration is not None:
+            metrics.append(f'total;dur={self.duration * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def section(name):
+    """Somma il tempo del blocco alla sezione ``name`` della richiesta corrente."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile._depth[name] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile._depth[name] -= 1
+        # Solo il livello più esterno: serializer annidati e template inclusi
+        # sono già dentro il tempo del chiamante.
+        if not profile._depth[name]:
+            profile.sections[name] += time.perf_counter() - start
+
+
+def _timed(function, name):
+    def wrapper(*args, **kwargs):
+        with section(name):
+            return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+_installed = False
+
+
+def install_instrumentation():
+    """
+    Avvolge una volta per processo i punti misurati di autenticazione, DRF e
+    template; lo chiama solo il middleware, quando la profilazione è attiva.
+    """
+    global _installed
+    if _installed:
+        return
+    from django.contrib import auth
+    from django.template.base import Template
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.serializers import ListSerializer, Serializer
+
+    # AuthenticationMiddleware chiama auth.get_user attraverso il modulo.
+    auth.get_user = _timed(auth.get_user, 'auth')
+    Request._authenticate = _timed(Request._authenticate, 'auth')
+    for cls in (Serializer, ListSerializer):
+        data = cls.data
+        cls.data = property(_timed(data.fget, 'ser'), doc=data.__doc__)
+    JSONRenderer.render = _timed(JSONRenderer.render, 'ser')
+    Template.render = _timed(Template.render, 'tpl')
+    _installed = True
+
+
+class QueryProfilerMiddleware:
+    """Va messo per primo in ``MIDDLEWARE``, così misura anche gli altri middleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PROFILER_SERVER_TIMING', False)
+        self.enforce_budgets = getattr(settings, 'PROFILER_ENFORCE_BUDGETS', False)
+        if not (self.server_timing or self.enforce_budgets):
+            raise MiddlewareNotUsed
+        install_instrumentation()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = request.query_profile = RequestProfile()
+        with profile.activate():
+            response = self.get_response(request)
+        return self.process_profile(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = request.query_profile = RequestProfile()
+        with profile.activate():
+            response = await self.get_response(request)
+        return self.process_profile(request, response, profile)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_profile.in_view = True
+
+    def process_profile(self, request, response, profile):
+        if self.server_timing:
+            response['Server-Timing'] = profile.server_timing()
+        if request.method not in ('GET', 'HEAD'):
+            # Le scritture a blocchi ripetono per scelta le stesse query a ogni blocco.
+            return response
+        duplicates = profile.duplicates
+        if duplicates:
+            logger.warning(
+                '%s %s: query ripetute (possibile N+1): %s', request.method, request.path,
+                '; '.join(f'{count}x {sql[:200]}' for sql, count in duplicates.items()))
+        if self.enforce_budgets:
+            self.check_budget(request, profile)
+        return response
+
+    def check_budget(self, request, profile):
+        match = getattr(request, 'resolver_match', None)
+        budget = QUERY_BUDGETS.get(match.view_name) if match else None
+        if budget is not None and profile.view_queries > budget:
+            queries = '\n'.join(f'{count}x {sql}' for sql, count in profile.fingerprints.items())
+            raise QueryBudgetExceeded(
+                f'{match.view_name}: {profile.view_queries} query eseguite dalla vista, '
+                f'budget {budget}.\n{queries}')
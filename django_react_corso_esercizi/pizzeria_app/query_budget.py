@@ -0,0 +1,53 @@
+"""
+Budget di query per i punti d'ingresso del catalogo.
+
+``QUERY_BUDGETS`` dichiara il numero massimo di query SQL che ogni URL
+(per nome, con namespace) può eseguire indipendentemente da quanti libri
+mostra. ``query_budget()`` è la guardia da usare nei test: se la vista
+sfora, il test fallisce con l'elenco delle query eseguite. In sviluppo
+``profiling.QueryProfilerMiddleware`` applica gli stessi budget a ogni GET,
+contando però solo le query della vista: l'autenticazione ne è esclusa.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+QUERY_BUDGETS = {
+    'pizzeria_app:lista_libri': 1,
+    # Validatori ETag/Last-Modified (una aggregazione) più la lettura dei dati.
+    'pizzeria_app:dettaglio_libro': 2,
+    'pizzeria_app:libro-list': 1,
+    'pizzeria_app:libro-detail': 1,
+    'pizzeria_app:autore-list': 1,
+    # Scansione dell'indice di ricerca più la lettura dei libri trovati.
+    'pizzeria_app:libro-search': 2,
+    # Riga di statistiche per chiave primaria (più l'autore se non ha libri).
+    'pizzeria_app:autore-stats': 2,
+    # Sessione e utente (solo per query_budget()), conteggi della changelist e
+    # pagina di risultati.
+    'admin:pizzeria_app_libro_changelist': 4,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Una vista ha eseguito più query di quelle dichiarate nel suo budget."""
+
+
+@contextmanager
+def query_budget(url_name, using=DEFAULT_DB_ALIAS):
+    """Fallisce se il blocco esegue più query di ``QUERY_BUDGETS[url_name]``."""
+    # django.test costa decine di ms di import e serve solo qui: il resto del
+    # modulo lo carica anche il middleware di profiling a ogni avvio.
+    from django.test.utils import CaptureQueriesContext
+
+    budget = QUERY_BUDGETS[url_name]
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    executed = len(context.captured_queries)
+    if executed > budget:
+        queries = '\n'.join(
+            f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1)
+        )
+        raise QueryBudgetExceeded(
+            f'{url_name}: {executed} query eseguite, budget {budget}.\n{queries}'
+        )
@@ -0,0 +1,111 @@
+"""
+Ricerca nel catalogo tramite indice invertito precalcolato.
+
+Titolo, nome e cognome dell'autore e ISBN di ogni libro vengono spezzati
+in termini normalizzati (minuscole, senza accenti) e salvati in
+``TermineRicerca`` con un peso per campo. Una ricerca è quindi una scansione
+per intervallo sull'indice ``(termine, libro)`` invece di un
+``titolo__icontains`` sull'intera tabella; funziona allo stesso modo su
+SQLite e PostgreSQL.
+
+L'indice si aggiorna incrementalmente dai segnali (vedi ``signals.py``) e
+si ricostruisce da zero con ``manage.py rebuild_search_index``.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+
+from .models import Libro, TermineRicerca
+
+PESO_ISBN = 8
+PESO_TITOLO = 4
+PESO_COGNOME = 3
+PESO_NOME = 2
+MAX_TERMINE = TermineRicerca._meta.get_field('termine').max_length
+MAX_TERMINI_QUERY = 8
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Termini normalizzati di ``text``: 'Città di Vetro' -> ['citta', 'di', 'vetro']."""
+    if not text:
+        return []
+    ascii_text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return [token[:MAX_TERMINE] for token in TOKEN_RE.findall(ascii_text.lower())]
+
+
+def terms_for(titolo, nome, cognome, isbn):
+    """``{termine: peso}`` per un libro; i pesi di campi diversi si sommano."""
+    weights = {}
+    for text, weight in ((titolo, PESO_TITOLO), (cognome, PESO_COGNOME), (nome, PESO_NOME)):
+        for token in set(tokenize(text)):
+            weights[token] = weights.get(token, 0) + weight
+    if isbn:
+        weights[isbn] = weights.get(isbn, 0) + PESO_ISBN
+    return weights
+
+
+def reindex_libri(pks, batch_size=500):
+    """
+    Ricostruisce i termini dei libri indicati (quelli eliminati spariscono):
+    per ogni blocco una lettura, una DELETE e le INSERT dei nuovi termini.
+    """
+    pks = list(pks)
+    for start in range(0, len(pks), batch_size):
+        chunk = pks[start:start + batch_size]
+        rows = Libro.objects.filter(pk__in=chunk).values_list(
+            'pk', 'titolo', 'autore__nome', 'autore__cognome', 'isbn')
+        termini = [
+            TermineRicerca(termine=termine, libro_id=pk, peso=peso)
+            for pk, titolo, nome, cognome, isbn in rows
+            for termine, peso in terms_for(titolo, nome, cognome, isbn).items()
+        ]
+        with transaction.atomic():
+            TermineRicerca.objects.filter(libro_id__in=chunk).delete()
+            TermineRicerca.objects.bulk_create(termini, batch_size=1000)
+
+
+def reindex_autore(autore_id):
+    reindex_libri(Libro.objects.filter(autore_id=autore_id).values_list('pk', flat=True))
+
+
+def prefix_q(token):
+    """``termine LIKE 'token%'`` scritto come intervallo, così usa l'indice B-tree."""
+    upper = token[:-1] + chr(ord(token[-1]) + 1)
+    return Q(termine__gte=token, termine__lt=upper)
+
+
+def search(query, limit=20):
+    """
+    ``[(libro_id, punteggio)]`` ordinati per rilevanza.
+
+    Tutti i termini della query devono comparire (AND); l'ultimo è trattato
+    come prefisso per la ricerca mentre si digita. Un termine trovato
+    esattamente vale il doppio di uno trovato per prefisso.
+    """
+    tokens = tokenize(query)[:MAX_TERMINI_QUERY]
+    if not tokens:
+        return []
+    conditions = [Q(termine=token) for token in tokens[:-1]] + [prefix_q(tokens[-1])]
+    any_match = Q()
+    for condition in conditions:
+        any_match |= condition
+    matched = sum(
+        (Max(Case(When(condition, then=Value(1)), default=Value(0))) for condition in conditions),
+        start=Value(0),
+    )
+    score = Sum(Case(
+        When(termine__in=tokens, then=F('peso') * 2),
+        default=F('peso'),
+        output_field=IntegerField(),
+    ))
+    ranking = (
+        TermineRicerca.objects.filter(any_match)
+        .values('libro_id')
+        .annotate(trovati=matched, punteggio=score)
+        .filter(trovati=len(conditions))
+        .order_by('-punteggio', 'libro_id')
+    )
+    return list(ranking.values_list('libro_id', 'punteggio')[:limit])
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+
+from .hashing import hash_password
+from .isbn import InvalidISBN, normalize
+from .models import Autore, Libro
+
+
+class IsbnField(serializers.CharField):
+    """ISBN-10 o ISBN-13, con o senza trattini, salvato come ISBN-13 canonico."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', 17)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            return normalize(super().to_internal_value(data))
+        except InvalidISBN as exc:
+            raise serializers.ValidationError(str(exc))
+
+
+class AutoreSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Autore
+        fields = ['id', 'nome', 'cognome', 'data_nascita']
+
+
+class LibroSerializer(serializers.ModelSerializer):
+    # I validatori di campo girano dopo to_internal_value: l'unicità si
+    # controlla sulla forma canonica, non su quella digitata dal client.
+    isbn = IsbnField(validators=[UniqueValidator(queryset=Libro.objects.all())])
+
+    class Meta:
+        model = Libro
+        fields = ['id', 'titolo', 'autore', 'data_pubblicazione', 'isbn', 'numero_pagine', 'prezzo']
+
+
+class UserSerializer(serializers.ModelSerializer):
+    password = serializers.CharField(write_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'password', 'email', 'first_name', 'last_name']
+
+    def create(self, validated_data):
+        # Come create_user, ma l'hash si calcola nel pool di hashing.py.
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.username = User.normalize_username(user.username)
+        user.email = User.objects.normalize_email(user.email)
+        user.password = hash_password(password)
+        user.save()
+        return user
@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_digest
+from .cache import bump_generation
+from .models import Autore, Libro
+from .search import reindex_autore, reindex_libri
+from .stats import (
+    STATS_FIELDS, add_created, apply_change, apply_changes, rebuild_stats, snapshot,
+)
+from .suggest import indici
+
+# bulk_create/bulk_update non emettono post_save: chi scrive libri in blocco
+# (``LibroBulkWriter``, comandi di gestione) invia questo segnale con ``pks``,
+# ``created=True`` se le righe sono nuove e ``deleted=True`` se sono state
+# eliminate. Per le modifiche ``update_fields`` elenca i campi scritti e
+# ``changes`` le coppie ``(prima, dopo)`` di ``stats.snapshot``, se note.
+libri_scritti_in_blocco = Signal()
+
+# Vero mentre ``eliminazione_in_blocco`` è attivo: Django invia comunque
+# post_delete riga per riga, ma il lavoro lo fa il segnale del lotto.
+_eliminazione_in_blocco = ContextVar('eliminazione_in_blocco', default=False)
+
+
+@contextmanager
+def eliminazione_in_blocco():
+    """
+    Sospende i receiver ``post_delete`` di ``Libro`` (cache, suggerimenti,
+    statistiche); chi elimina invia poi ``libri_scritti_in_blocco`` con
+    ``deleted=True`` e i ``changes`` delle righe eliminate.
+    """
+    token = _eliminazione_in_blocco.set(True)
+    try:
+        yield
+    finally:
+        _eliminazione_in_blocco.reset(token)
+
+
+def per_riga(sender):
+    return not (sender is Libro and _eliminazione_in_blocco.get())
+
+
+# Le invalidazioni aspettano il commit, riga per riga come per i lotti: un
+# incremento fatto prima lascerebbe a un altro worker il tempo di rimettere
+# in cache i dati vecchi sotto la nuova generazione, e se la transazione
+# viene annullata invaliderebbe per niente. Fuori da una transazione
+# ``on_commit`` esegue subito.
+@receiver([post_save, post_delete], sender=Libro)
+@receiver([post_save, post_delete], sender=Autore)
+def invalida_cache_catalogo(sender, **kwargs):
+    if per_riga(sender):
+        transaction.on_commit(lambda: bump_generation(sender))
+
+
+@receiver(libri_scritti_in_blocco)
+def invalida_cache_libri_in_blocco(sender, pks, deleted=False, **kwargs):
+    transaction.on_commit(lambda: bump_generation(Libro))
+
+
+@receiver(post_save, sender=Libro)
+def indicizza_libro(sender, instance, **kwargs):
+    reindex_libri([instance.pk])
+
+
+@receiver(post_save, sender=Autore)
+def indicizza_libri_autore(sender, instance, created, **kwargs):
+    # Un autore appena creato non ha libri; l'eliminazione passa dal CASCADE.
+    if not created:
+        reindex_autore(instance.pk)
+
+
+@receiver(libri_scritti_in_blocco)
+def indicizza_libri_in_blocco(sender, pks, deleted=False, **kwargs):
+    # I termini dei libri eliminati spariscono con il CASCADE.
+    if not deleted:
+        reindex_libri(pks)
+
+
+# Registrati dopo ``invalida_cache_catalogo``: le callback di ``on_commit``
+# girano in ordine, quindi l'indice dei suggerimenti si allinea alla
+# generazione appena incrementata, e non vede righe mai confermate.
+@receiver(post_save, sender=Libro)
+@receiver(post_save, sender=Autore)
+def aggiorna_suggerimenti(sender, instance, **kwargs):
+    transaction.on_commit(lambda: indici[sender._meta.model_name].update(instance))
+
+
+@receiver(post_delete, sender=Libro)
+@receiver(post_delete, sender=Autore)
+def rimuovi_suggerimenti(sender, instance, **kwargs):
+    if per_riga(sender):
+        # Dopo i receiver ``delete()`` azzera il pk dell'istanza.
+        pk = instance.pk
+        transaction.on_commit(lambda: indici[sender._meta.model_name].remove(pk))
+
+
+@receiver(libri_scritti_in_blocco)
+def ricostruisci_suggerimenti_libri(sender, pks, **kwargs):
+    transaction.on_commit(indici['libro'].invalidate)
+
+
+@receiver(pre_save, sender=Libro)
+def ricorda_statistiche_precedenti(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._statistiche_prima = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not {
+            sender._meta.get_field(name).attname for name in update_fields} & set(STATS_FIELDS):
+        instance._statistiche_prima = snapshot(instance)
+        return
+    instance._statistiche_prima = (
+        sender.objects.filter(pk=instance.pk).values_list(*STATS_FIELDS).first())
+
+
+@receiver(post_save, sender=Libro)
+def aggiorna_statistiche(sender, instance, raw=False, **kwargs):
+    if not raw:
+        apply_change(getattr(instance, '_statistiche_prima', None), snapshot(instance))
+
+
+@receiver(post_delete, sender=Libro)
+def sottrai_statistiche(sender, instance, **kwargs):
+    if per_riga(sender):
+        apply_change(snapshot(instance), None)
+
+
+@receiver(libri_scritti_in_blocco)
+def ricalcola_statistiche(sender, pks, deleted=False, created=False, update_fields=None,
+                          changes=None, **kwargs):
+    # Le righe nuove non avevano contributo; le eliminazioni senza ``changes``
+    # sono già passate da post_delete; per le modifiche si applicano le
+    # differenze e si ricalcola solo se mancano i valori precedenti.
+    if created:
+        add_created(pks)
+    elif deleted:
+        if changes is not None:
+            apply_changes(changes)
+    elif update_fields is not None and not {
+            sender._meta.get_field(name).attname for name in update_fields} & set(STATS_FIELDS):
+        return
+    elif changes is not None:
+        apply_changes(changes)
+    else:
+        rebuild_stats()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def crea_token_utente(sender, instance, created, **kwargs):
+    if created:
+        Token.objects.create(user=instance)
+
+
+# Le fotografie dei token sono legate alla generazione del singolo token
+# (vedi authentication.py): ogni modifica invalida solo quelle dell'utente.
+# Come per il catalogo l'incremento aspetta il commit, altrimenti una
+# richiesta concorrente rimetterebbe in cache l'utente non ancora salvato
+# sotto la nuova generazione.
+def invalida_token(key):
+    digest = token_digest(key)
+    transaction.on_commit(lambda: bump_generation(Token, scope=digest))
+
+
+# Copre anche l'eliminazione dell'utente: il CASCADE elimina il suo token.
+@receiver(post_delete, sender=Token)
+def invalida_token_eliminato(sender, instance, **kwargs):
+    invalida_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalida_token_utente_modificato(sender, instance, created, update_fields, **kwargs):
+    # Un utente nuovo non ha fotografie in cache; last_login cambia a ogni
+    # login e non conta per l'autenticazione (vedi authentication.py).
+    if not created and set(update_fields or ()) != {'last_login'}:
+        for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+            invalida_token(key)
@@ -0,0 +1,193 @@
+"""
+Token firmati senza stato, in alternativa ai token di ``authtoken``.
+
+``issue_pair`` firma con ``django.core.signing`` (HMAC con ``SECRET_KEY``)
+due token della stessa sessione:
+
+- l'access token (``Authorization: Bearer <token>``) contiene id, username e
+  permessi dell'utente e scade dopo ``SIGNED_TOKEN_ACCESS_TTL`` secondi:
+  ``SignedTokenAuthentication`` lo verifica senza leggere il database;
+- il refresh token scade dopo ``SIGNED_TOKEN_REFRESH_TTL`` e si scambia una
+  sola volta con una nuova coppia della stessa sessione (``refresh``), dopo
+  aver controllato che l'utente sia ancora attivo. Il suo ``jti`` finisce in
+  ``RefreshTokenUsato``, letto solo dal refresh.
+
+Solo il logout revoca la sessione: ``SessioneRevocata`` tiene le sessioni
+revocate per ``SIGNED_TOKEN_REFRESH_TTL``, finché può essere valido un
+qualunque refresh token emesso prima del logout (anche uno più recente di
+quello presentato), quindi la lista cresce con i logout e non con i refresh.
+Ogni processo ne tiene una copia
+legata alla generazione del modello nella cache (vedi ``cache.py``):
+verificare un access token costa una lettura di cache. Un utente
+disattivato conserva gli access token già emessi fino alla loro scadenza.
+"""
+import secrets
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .cache import bump_generation, get_generations
+from .models import RefreshTokenUsato, SessioneRevocata
+
+ACCESS_SALT = 'pizzeria_app.signed_tokens.access'
+REFRESH_SALT = 'pizzeria_app.signed_tokens.refresh'
+DEFAULT_ACCESS_TTL = 5 * 60
+DEFAULT_REFRESH_TTL = 24 * 60 * 60
+# Campi dell'utente copiati nell'access token.
+USER_FIELDS = ('username', 'is_staff', 'is_superuser')
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def access_ttl():
+    return getattr(settings, 'SIGNED_TOKEN_ACCESS_TTL', DEFAULT_ACCESS_TTL)
+
+
+def refresh_ttl():
+    return getattr(settings, 'SIGNED_TOKEN_REFRESH_TTL', DEFAULT_REFRESH_TTL)
+
+
+def issue_pair(user, sid=None):
+    """
+    ``{'access', 'refresh', 'expires_in'}`` della sessione ``sid``, o di una
+    nuova sessione.
+    """
+    sid = sid or secrets.token_hex(16)
+    access = {'sid': sid, 'uid': user.pk, **{name: getattr(user, name) for name in USER_FIELDS}}
+    refresh = {'sid': sid, 'uid': user.pk, 'jti': secrets.token_hex(16)}
+    return {
+        'access': signing.dumps(access, salt=ACCESS_SALT, compress=True),
+        'refresh': signing.dumps(refresh, salt=REFRESH_SALT),
+        'expires_in': access_ttl(),
+    }
+
+
+def _load(token, salt, max_age):
+    try:
+        payload = signing.loads(token, salt=salt, max_age=max_age)
+    except signing.SignatureExpired:
+        raise InvalidToken(_('Token expired.'))
+    except signing.BadSignature:
+        raise InvalidToken(_('Invalid token.'))
+    if revocations.is_revoked(payload['sid']):
+        raise InvalidToken(_('Token revoked.'))
+    return payload
+
+
+def _record(model, ttl, **key):
+    """Inserisce la riga di ``key`` con scadenza; ``False`` se esisteva già."""
+    now = timezone.now()
+    model.objects.filter(scadenza__lte=now).delete()
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, scadenza=now + timedelta(seconds=ttl))
+    except IntegrityError:
+        return False
+    return True
+
+
+def consume(payload):
+    """Segna come usato il refresh token di ``payload``; ``False`` se lo era già."""
+    if 'jti' not in payload:
+        return False
+    return _record(RefreshTokenUsato, refresh_ttl(), jti=payload['jti'])
+
+
+def revoke(sid):
+    """
+    Revoca la sessione, access e refresh token; restituisce ``False`` se lo
+    era già. Dura quanto un refresh token: il logout può arrivare con un
+    refresh vecchio mentre il più recente della sessione vale ancora.
+    """
+    if not _record(SessioneRevocata, refresh_ttl(), sid=sid):
+        return False
+    bump_generation(SessioneRevocata)
+    return True
+
+
+def refresh(token):
+    """
+    Scambia un refresh token con una nuova coppia della stessa sessione. Il
+    token viene consumato prima di emettere la nuova: due refresh concorrenti
+    dello stesso token non producono due coppie. Gli access token già emessi
+    restano validi fino alla scadenza.
+    """
+    payload = _load(token, REFRESH_SALT, refresh_ttl())
+    user = get_user_model().objects.filter(pk=payload['uid'], is_active=True).first()
+    if user is None:
+        raise InvalidToken(_('User inactive or deleted.'))
+    if not consume(payload):
+        raise InvalidToken(_('Token revoked.'))
+    return issue_pair(user, sid=payload['sid'])
+
+
+def logout(token):
+    payload = _load(token, REFRESH_SALT, refresh_ttl())
+    consume(payload)
+    revoke(payload['sid'])
+
+
+class RevocationList:
+    """Copia per processo degli ``sid`` revocati, legata alla generazione in cache."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = None
+        self.sids = frozenset()
+
+    def is_revoked(self, sid):
+        generation, = get_generations([SessioneRevocata])
+        if generation != self.generation:
+            self.reload(generation)
+        return sid in self.sids
+
+    def reload(self, generation):
+        cache_key = f'auth:revocati:{generation}'
+        sids = cache.get(cache_key)
+        if sids is None:
+            sids = frozenset(SessioneRevocata.objects.filter(
+                scadenza__gt=timezone.now()).values_list('sid', flat=True))
+            cache.set(cache_key, sids, access_ttl())
+        with self.lock:
+            self.sids, self.generation = sids, generation
+
+
+revocations = RevocationList()
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """``Authorization: Bearer <access token>``, verificato senza query."""
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            payload = _load(auth[1].decode(), ACCESS_SALT, access_ttl())
+        except (InvalidToken, UnicodeError) as exc:
+            raise exceptions.AuthenticationFailed(str(exc) or _('Invalid token.'))
+        model = get_user_model()
+        known = {model._meta.pk.attname: payload['uid'], 'is_active': True,
+                 **{name: payload[name] for name in USER_FIELDS}}
+        # from_db vuole i valori nell'ordine dei campi; gli altri restano
+        # differiti e leggerli costa una query.
+        fields = [f.attname for f in model._meta.concrete_fields if f.attname in known]
+        user = model.from_db(router.db_for_read(model), fields, [known[f] for f in fields])
+        return user, payload
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,184 @@
+"""
+Statistiche del catalogo materializzate per autore e per anno.
+
+Invece di un ``GROUP BY`` sull'intera tabella ``Libro`` a ogni richiesta,
+``StatisticheAutore`` e ``StatisticheAnno`` tengono conteggi e somme già
+pronti: la lettura di un autore è un accesso per chiave primaria, quella
+del riepilogo annuale legge una riga per anno.
+
+I segnali (vedi ``signals.py``) applicano a ogni ``save()``/``delete()`` la
+differenza tra il contributo vecchio e quello nuovo del libro con
+``UPDATE ... SET campo = campo + delta``, sicuro anche con scritture
+concorrenti. Le creazioni in blocco sommano il proprio contributo
+(``add_created``), le modifiche in blocco le differenze tra i valori
+precedenti e quelli nuovi (``apply_changes``). ``manage.py rebuild_stats``
+ricalcola tutto con due aggregazioni, e chi usa ``QuerySet.update`` sui
+campi di ``STATS_FIELDS`` deve fare altrettanto.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractYear
+
+from .models import Libro, StatisticheAnno, StatisticheAutore
+
+# Colonne di ``Libro`` da cui dipendono le statistiche.
+STATS_FIELDS = ('autore_id', 'data_pubblicazione', 'prezzo', 'numero_pagine')
+COUNTERS = ('libri', 'somma_prezzi', 'prezzi', 'somma_pagine', 'pagine')
+CENTESIMI = Decimal('0.01')
+
+
+def contribution(autore_id, data_pubblicazione, prezzo, numero_pagine):
+    """Contributo di un libro ai contatori: ``(autore_id, anno, {contatore: valore})``."""
+    return autore_id, data_pubblicazione.year, {
+        'libri': 1,
+        'somma_prezzi': prezzo or Decimal(0),
+        'prezzi': int(prezzo is not None),
+        'somma_pagine': numero_pagine or 0,
+        'pagine': int(numero_pagine is not None),
+    }
+
+
+def snapshot(libro):
+    """Valori di ``STATS_FIELDS`` di un'istanza, o ``None`` se mancano."""
+    values = tuple(getattr(libro, field) for field in STATS_FIELDS)
+    return None if values[1] is None else values
+
+
+def _apply(model, pk, deltas, sign):
+    changes = {name: F(name) + sign * value for name, value in deltas.items() if value}
+    if not changes or model.objects.filter(pk=pk).update(**changes) or sign < 0:
+        return
+    # Prima riga per questa chiave; se un'altra scrittura la crea nel frattempo
+    # si ripiega sull'UPDATE.
+    try:
+        with transaction.atomic():
+            model.objects.create(pk=pk, **deltas)
+    except IntegrityError:
+        model.objects.filter(pk=pk).update(**changes)
+
+
+def apply_change(old, new):
+    """
+    Aggiorna le statistiche per un libro passato da ``old`` a ``new``
+    (tuple di ``STATS_FIELDS``; ``None`` per creazione/eliminazione).
+    """
+    if old == new:
+        return
+    with transaction.atomic():
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None:
+                continue
+            autore_id, anno, deltas = contribution(*values)
+            _apply(StatisticheAutore, autore_id, deltas, sign)
+            _apply(StatisticheAnno, anno, deltas, sign)
+
+
+def add_created(pks):
+    """
+    Somma ai contatori il contributo di libri appena creati in blocco: una
+    lettura per lotto di ``pks`` e un ``UPDATE`` per autore e per anno
+    coinvolti, invece di ricalcolare le tabelle.
+    """
+    pks = list(pks)
+    created = []
+    limit = connection.features.max_query_params or len(pks) or 1
+    for start in range(0, len(pks), limit):
+        rows = Libro.objects.filter(pk__in=pks[start:start + limit]).values_list(*STATS_FIELDS)
+        created.extend((None, values) for values in rows)
+    apply_changes(created)
+
+
+def apply_changes(changes):
+    """
+    ``apply_change`` per molti libri (coppie ``(old, new)``): le differenze
+    si sommano per autore e per anno e si applicano con un ``UPDATE`` per
+    chiave coinvolta.
+    """
+    per_autore, per_anno = defaultdict(Counter), defaultdict(Counter)
+    for old, new in changes:
+        if old == new:
+            continue
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None:
+                continue
+            autore_id, anno, deltas = contribution(*values)
+            signed = {name: sign * value for name, value in deltas.items()}
+            per_autore[autore_id].update(signed)
+            per_anno[anno].update(signed)
+    with transaction.atomic():
+        for model, totals in ((StatisticheAutore, per_autore), (StatisticheAnno, per_anno)):
+            _add_many(model, {pk: [deltas[name] for name in COUNTERS]
+                              for pk, deltas in totals.items() if any(deltas.values())})
+
+
+def _add_many(model, totals):
+    """
+    ``_apply`` per molte chiavi: un ``executemany`` per le righe esistenti e
+    un ``bulk_create`` per le nuove. Con migliaia di autori in un lotto
+    l'ORM impiegherebbe più a compilare gli UPDATE che a eseguirli.
+    """
+    existing = set()
+    keys = list(totals)
+    limit = connection.features.max_query_params or len(keys) or 1
+    for start in range(0, len(keys), limit):
+        existing.update(model.objects.filter(pk__in=keys[start:start + limit])
+                        .values_list('pk', flat=True))
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(model._meta.db_table),
+        ', '.join(f'{quote(name)} = {quote(name)} + %s' for name in COUNTERS),
+        quote(model._meta.pk.column))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[*totals[pk], pk] for pk in existing])
+    missing = [pk for pk in keys if pk not in existing]
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(
+                model(pk=pk, **dict(zip(COUNTERS, totals[pk]))) for pk in missing)
+    except IntegrityError:
+        # Qualcuno ha creato una delle righe nel frattempo: si procede una a una.
+        for pk in missing:
+            _apply(model, pk, dict(zip(COUNTERS, totals[pk])), 1)
+
+
+def rebuild_stats():
+    """Ricalcola da zero entrambe le tabelle."""
+    aggregates = {
+        'libri': Count('pk'),
+        'somma_prezzi': Sum('prezzo', default=Decimal(0)),
+        'prezzi': Count('prezzo'),
+        'somma_pagine': Sum('numero_pagine', default=0),
+        'pagine': Count('numero_pagine'),
+    }
+    libri = Libro.objects.order_by()
+    per_autore = libri.values('autore_id').annotate(**aggregates)
+    per_anno = (libri.annotate(anno=ExtractYear('data_pubblicazione'))
+                .values('anno').annotate(**aggregates))
+    with transaction.atomic():
+        StatisticheAutore.objects.all().delete()
+        StatisticheAnno.objects.all().delete()
+        StatisticheAutore.objects.bulk_create(
+            StatisticheAutore(**row) for row in per_autore)
+        StatisticheAnno.objects.bulk_create(StatisticheAnno(**row) for row in per_anno)
+
+
+def as_dict(stats):
+    """Rappresentazione JSON di una riga di statistiche (anche non salvata)."""
+    prezzo_medio, pagine_medie = stats.prezzo_medio, stats.pagine_medie
+    return {
+        'libri': stats.libri,
+        'prezzo_medio': None if prezzo_medio is None else prezzo_medio.quantize(CENTESIMI),
+        'pagine_medie': None if pagine_medie is None else round(pagine_medie, 1),
+    }
+
+
+def totals(rows):
+    """Somma delle righe per anno: il riepilogo dell'intero catalogo."""
+    total = StatisticheAnno()
+    for row in rows:
+        for name in COUNTERS:
+            setattr(total, name, getattr(total, name) + getattr(row, name))
+    return total
@@ -0,0 +1,59 @@
+"""
+Risposte di lista in streaming per i ViewSet del catalogo.
+
+Il queryset viene letto con un cursore lato server (``.iterator()``) e
+ogni riga viene serializzata e scritta subito, così l'export dell'intero
+catalogo usa memoria costante e il primo byte parte dopo il primo blocco.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamingListMixin:
+    """
+    Aggiunge l'azione ``stream`` (``GET <prefisso>/stream/``) a un ViewSet.
+
+    Il formato si sceglie con ``?output=json`` (array JSON, default) o
+    ``?output=ndjson`` (un oggetto JSON per riga).
+    """
+    stream_chunk_size = 2000
+    stream_output_param = 'output'
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def stream(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        ndjson = request.query_params.get(self.stream_output_param) == 'ndjson'
+        rows = self._stream_rows(queryset, serializer)
+        if ndjson:
+            content = (f'{row}\n' for row in rows)
+            content_type = 'application/x-ndjson'
+        else:
+            content = self._json_array(rows)
+            content_type = 'application/json'
+        return StreamingHttpResponse(self._buffered(content), content_type=content_type)
+
+    def _stream_rows(self, queryset, serializer):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        # Un solo serializer per tutte le righe: to_representation non tiene stato.
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            yield encoder.encode(serializer.to_representation(instance))
+
+    @staticmethod
+    def _json_array(rows):
+        yield '['
+        for index, row in enumerate(rows):
+            yield row if index == 0 else f',{row}'
+        yield ']'
+
+    def _buffered(self, content):
+        # Raggruppa i pezzi per non fare una write() sul socket per ogni riga.
+        buffer = []
+        for piece in content:
+            buffer.append(piece)
+            if len(buffer) >= self.stream_chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
@@ -0,0 +1,174 @@
+"""
+Suggerimenti per prefisso (type-ahead) su titoli e autori, senza database.
+
+Ogni worker tiene in memoria un ``PrefixIndex`` per tipo: un array ordinato
+di chiavi normalizzate interrogato con ``bisect``, costruito alla prima
+richiesta. I segnali ``post_save``/``post_delete`` lo aggiornano riga per
+riga; le scritture in blocco lo segnano come da ricostruire.
+
+Per accorgersi delle modifiche fatte da altri worker ogni ricerca confronta
+la generazione del modello nella cache (vedi ``cache.py``) con quella da cui
+è stato costruito l'indice: una lettura di cache, nessuna query. Dopo una
+modifica locale l'indice adotta la nuova generazione solo se è quella
+successiva alla sua; se nel frattempo ha scritto anche un altro worker si
+ricostruisce alla ricerca seguente. La memoria è limitata da
+``SUGGEST_MAX_ENTRIES`` chiavi per indice: oltre, le righe create per prime
+non vengono suggerite.
+"""
+import bisect
+import threading
+
+from django.conf import settings
+
+from .cache import get_generations
+from .models import Autore, Libro
+from .search import tokenize
+
+DEFAULT_MAX_ENTRIES = 100_000
+MAX_CHIAVE = 60
+MAX_ETICHETTA = 120
+
+
+def normalize_key(text):
+    return ' '.join(tokenize(text))[:MAX_CHIAVE]
+
+
+class PrefixIndex:
+    """
+    Chiavi ``(chiave, pk)`` ordinate e, per ogni pk, etichetta e chiavi (per
+    poterle rimuovere). Sottoclassi: ``model``, ``fields`` e ``entries()``.
+    """
+    model = None
+    fields = ()
+
+    def __init__(self, max_entries=None):
+        self._max_entries = max_entries
+        self.lock = threading.Lock()
+        self.keys = []
+        self.items = {}
+        self.generation = None
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'SUGGEST_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+
+    def entries(self, row):
+        """``(etichetta, [chiavi])`` per una tupla di ``fields``."""
+        raise NotImplementedError
+
+    def current_generation(self):
+        return get_generations([self.model])[0]
+
+    def build(self):
+        generation = self.current_generation()
+        keys, items = [], {}
+        # I più recenti per primi: se il limite taglia, restano quelli più
+        # cercati. Per chiave primaria, che ha già il suo indice: ordinare per
+        # updated_at ordinerebbe tutta la tabella a ogni ricostruzione.
+        rows = self.model.objects.order_by('-pk').values_list('pk', *self.fields)
+        for pk, *row in rows.iterator(chunk_size=2000):
+            label, row_keys = self.entries(row)
+            if len(keys) + len(row_keys) > self.max_entries:
+                break
+            items[pk] = (label, row_keys)
+            keys.extend((key, pk) for key in row_keys)
+        keys.sort()
+        with self.lock:
+            self.keys, self.items = keys, items
+            self.generation = generation
+
+    def ensure_current(self):
+        if self.generation is None or self.generation != self.current_generation():
+            self.build()
+
+    def invalidate(self):
+        self.generation = None
+
+    def _remove(self, pk):
+        _, row_keys = self.items.pop(pk, (None, ()))
+        for key in row_keys:
+            index = bisect.bisect_left(self.keys, (key, pk))
+            if index < len(self.keys) and self.keys[index] == (key, pk):
+                del self.keys[index]
+
+    def update(self, instance):
+        """Aggiorna le chiavi di ``instance``, se l'indice è già in memoria."""
+        if self.generation is None:
+            return
+        label, row_keys = self.entries([getattr(instance, field) for field in self.fields])
+        with self.lock:
+            self._remove(instance.pk)
+            if len(self.keys) + len(row_keys) <= self.max_entries:
+                self.items[instance.pk] = (label, row_keys)
+                for key in row_keys:
+                    bisect.insort(self.keys, (key, instance.pk))
+        self.sync()
+
+    def remove(self, pk):
+        if self.generation is None:
+            return
+        with self.lock:
+            self._remove(pk)
+        self.sync()
+
+    def sync(self):
+        # Chiamato dopo l'incremento della generazione fatto dai segnali della
+        # cache: l'indice locale è già aggiornato e non va ricostruito, ma solo
+        # se quell'incremento è l'unico dalla costruzione. Altrimenti un altro
+        # worker ha scritto nel frattempo e le sue modifiche qui mancano.
+        current = self.current_generation()
+        with self.lock:
+            if self.generation is not None and current == self.generation + 1:
+                self.generation = current
+            else:
+                self.generation = None
+
+    def suggest(self, prefix, limit=10):
+        """``[(pk, etichetta)]`` le cui chiavi iniziano con ``prefix``."""
+        prefix = normalize_key(prefix)
+        if not prefix:
+            return []
+        self.ensure_current()
+        results, seen = [], set()
+        with self.lock:
+            index = bisect.bisect_left(self.keys, (prefix,))
+            while index < len(self.keys) and len(results) < limit:
+                key, pk = self.keys[index]
+                if not key.startswith(prefix):
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append((pk, self.items[pk][0]))
+                index += 1
+        return results
+
+    def label(self, pk):
+        item = self.items.get(pk)
+        return item[0] if item else None
+
+
+class TitoloIndex(PrefixIndex):
+    model = Libro
+    fields = ('titolo',)
+
+    def entries(self, row):
+        (titolo,) = row
+        key = normalize_key(titolo)
+        return titolo[:MAX_ETICHETTA], [key] if key else []
+
+
+class AutoreIndex(PrefixIndex):
+    """Si trova sia per ``cognome nome`` sia per ``nome cognome``."""
+    model = Autore
+    fields = ('nome', 'cognome')
+
+    def entries(self, row):
+        nome, cognome = row
+        label = f'{nome} {cognome}'[:MAX_ETICHETTA]
+        keys = {normalize_key(f'{cognome} {nome}'), normalize_key(f'{nome} {cognome}')}
+        return label, sorted(key for key in keys if key)
+
+
+indici = {'libro': TitoloIndex(), 'autore': AutoreIndex()}
@@ -1,3 +1,1665 @@
-from django.test import TestCase
+import csv
+import datetime
+import gc
+import io
+import itertools
+import json
+import mmap
+import os
+import re
+import runpy
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User, update_last_login
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import engines
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import importtime
+from .authentication import SnapshotLRU, snapshots, token_digest
+from .bulk import LibroBulkMixin, LibroBulkWriter
+from .cache import bump_generation, get_generations
+from .columnar import (
+    ColumnarFile, InvalidFile, UnsupportedValue, encode_column, export_catalogue,
+)
+from .fast_serializers import ValuesSerializer
+from .index_advisor import analyze, candidate_columns, capture
+from .forms import LibroForm
+from .fragments import DETTAGLIO, LISTA
+from .hashing import HashingPool, PoolBusy, per_ip
+from .isbn import InvalidISBN, complete_isbn13, find_existing, normalize, normalize_many
+from .metrics import REQUEST_LATENCY, MmapStore, exposition
+from .models import (
+    Autore, Libro, SessioneRevocata, StatisticheAnno, StatisticheAutore, TermineRicerca,
+)
+from .profiling import RequestProfile
+from .query_budget import QUERY_BUDGETS, QueryBudgetExceeded, query_budget
+from .search import search, tokenize
+from .serializers import AutoreSerializer, LibroSerializer
+from .signals import libri_scritti_in_blocco
+from .signed_tokens import access_ttl, refresh_ttl
+from .stats import rebuild_stats
+from .suggest import TitoloIndex, indici
+from .throttling import AuthRateThrottle
+from .warmup import TEMPLATES, warm_templates
+
+
+ISBN_PROGRESSIVI = itertools.count(9780000000000)
+
+
+class CatalogoTestCase(TestCase):
+    def setUp(self):
+        # La cache sopravvive al rollback dei test: ogni test parte da vuota.
+        cache.clear()
+
+    def autentica(self, username='redattore'):
+        """Le scritture sulle API richiedono un utente: le richieste portano il suo token."""
+        utente = User.objects.create(username=username)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {utente.auth_token.key}'
+        return utente
+
+
+def crea_libri(autore, quanti, titolo='Libro'):
+    return Libro.objects.bulk_create(
+        Libro(
+            titolo=f'{titolo} {i:03d}',
+            autore=autore,
+            data_pubblicazione=datetime.date(2000, 1, 1) + datetime.timedelta(days=i),
+            isbn=str(next(ISBN_PROGRESSIVI)),
+            numero_pagine=100 + i,
+        )
+        for i in range(quanti)
+    )
+
+
+class KeysetPaginationTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Italo', cognome='Calvino')
+        crea_libri(cls.autore, 25)
+        # Titoli duplicati: lo spareggio su id deve evitare salti e ripetizioni.
+        Libro.objects.create(titolo='Libro 010', autore=cls.autore,
+                             data_pubblicazione=datetime.date(2001, 1, 1), isbn='9781111111111')
+
+    def test_scorre_tutte_le_pagine_senza_duplicati(self):
+        url = reverse('pizzeria_app:libro-list') + '?page_size=7'
+        visti = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            visti.extend(libro['id'] for libro in response.data['results'])
+            url = response.data['next']
+        attesi = list(Libro.objects.order_by('titolo', 'id').values_list('id', flat=True))
+        self.assertEqual(visti, attesi)
+
+    def test_nessun_count_ne_offset(self):
+        primo = self.client.get(reverse('pizzeria_app:libro-list') + '?page_size=5')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(primo.data['next'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_link_previous_torna_alla_pagina_precedente(self):
+        url = reverse('pizzeria_app:libro-list') + '?page_size=4'
+        prima = self.client.get(url)
+        seconda = self.client.get(prima.data['next'])
+        indietro = self.client.get(seconda.data['previous'])
+        self.assertEqual(indietro.data['results'], prima.data['results'])
+        self.assertIsNone(prima.data['previous'])
+
+    def test_ordinamento_autori_per_cognome_e_nome(self):
+        Autore.objects.create(nome='Alberto', cognome='Moravia')
+        Autore.objects.create(nome='Alessandro', cognome='Manzoni')
+        response = self.client.get(reverse('pizzeria_app:autore-list') + '?page_size=2')
+        cognomi = [autore['cognome'] for autore in response.data['results']]
+        self.assertEqual(cognomi, ['Calvino', 'Manzoni'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([a['cognome'] for a in response.data['results']], ['Moravia'])
+        self.assertIsNone(response.data['next'])
+
+    def test_cursore_non_valido(self):
+        response = self.client.get(reverse('pizzeria_app:libro-list') + '?cursor=non-valido')
+        self.assertEqual(response.status_code, 404)
+
+
+class StreamingListTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Elsa', cognome='Morante')
+        crea_libri(cls.autore, 12)
+
+    def leggi(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_array_json_uguale_al_serializer(self):
+        response = self.client.get(reverse('pizzeria_app:libro-stream'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        dati = json.loads(self.leggi(response))
+        attesi = json.loads(json.dumps(
+            LibroSerializer(Libro.objects.order_by('titolo'), many=True).data, cls=JSONEncoder))
+        self.assertEqual(dati, attesi)
+
+    def test_ndjson_una_riga_per_oggetto(self):
+        response = self.client.get(reverse('pizzeria_app:autore-stream') + '?output=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        righe = self.leggi(response).splitlines()
+        self.assertEqual([json.loads(riga)['cognome'] for riga in righe], ['Morante'])
+
+    def test_lista_vuota(self):
+        Libro.objects.all().delete()
+        response = self.client.get(reverse('pizzeria_app:libro-stream'))
+        self.assertEqual(self.leggi(response), '[]')
+
+
+class ColumnarExportTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.morante = Autore.objects.create(nome='Elsa', cognome='Morante',
+                                            data_nascita=datetime.date(1912, 8, 18))
+        cls.eco = Autore.objects.create(nome='Umberto', cognome='Eco')
+        crea_libri(cls.morante, 3, titolo='L\'isola di Arturo')
+        Libro.objects.create(titolo='Il nome della rosa', autore=cls.eco,
+                             data_pubblicazione=datetime.date(1980, 1, 1),
+                             isbn=str(next(ISBN_PROGRESSIVI)), prezzo=Decimal('12.90'))
+
+    def leggi(self, chunk_size=2):
+        return ColumnarFile(b''.join(export_catalogue(chunk_size)))
+
+    def test_righe_uguali_al_database(self):
+        catalogo = self.leggi()
+        autori = list(catalogo.rows('autori'))
+        self.assertEqual([(a['id'], a['cognome'], a['data_nascita']) for a in autori],
+                         [(self.morante.pk, 'Morante', datetime.date(1912, 8, 18)),
+                          (self.eco.pk, 'Eco', None)])
+        libri = list(catalogo.rows('libri'))
+        self.assertEqual(len(catalogo.tables['libri']['blocks']), 2)
+        for riga, libro in zip(libri, Libro.objects.order_by('pk')):
+            self.assertEqual(
+                (riga['id'], riga['titolo'], autori[riga['autore']]['id'],
+                 riga['data_pubblicazione'], riga['isbn'], riga['numero_pagine'],
+                 riga['prezzo'], riga['updated_at']),
+                (libro.pk, libro.titolo, libro.autore_id, libro.data_pubblicazione, libro.isbn,
+                 libro.numero_pagine, libro.prezzo, libro.updated_at))
+        self.assertEqual(len(libri), 4)
+
+    def test_colonne_numeriche_senza_copie(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'catalogo.pzcol')
+        call_command('export_catalogue', path, chunk_size=2, stdout=io.StringIO())
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            catalogo = ColumnarFile(m)
+            pagine = [list(blocco) for blocco in catalogo.chunks('libri', 'numero_pagine')]
+            self.assertEqual(pagine, [[100, 101], [102, -2 ** 31]])
+            del catalogo, pagine
+
+    def test_autore_creato_durante_l_export(self):
+        pezzi = export_catalogue(chunk_size=10)
+        intestazione, autori = next(pezzi), next(pezzi)
+        calvino = Autore.objects.create(nome='Italo', cognome='Calvino')
+        crea_libri(calvino, 1, titolo='Palomar')
+        catalogo = ColumnarFile(intestazione + autori + b''.join(pezzi))
+        cognomi = [a['cognome'] for a in catalogo.rows('autori')]
+        self.assertEqual(cognomi, ['Morante', 'Eco', 'Calvino'])
+        ultimo = list(catalogo.rows('libri'))[-1]
+        self.assertEqual((ultimo['titolo'], cognomi[ultimo['autore']]), ('Palomar 000', 'Calvino'))
+
+    def test_valori_non_rappresentabili(self):
+        libro = Libro.objects.filter(autore=self.morante).first()
+        for campi in ({'numero_pagine': -2 ** 31}, {'numero_pagine': 2 ** 31},
+                      {'isbn': '97800000000001'}, {'isbn': '97800000000è'}):
+            with self.subTest(campi=campi):
+                Libro.objects.filter(pk=libro.pk).update(**campi)
+                # Prima del primo pezzo: lo streaming non comincia.
+                with self.assertRaisesMessage(UnsupportedValue, str(libro.pk)):
+                    export_catalogue()
+                response = self.client.get(reverse('pizzeria_app:libro-export'))
+                self.assertEqual(response.status_code, 409)
+                Libro.objects.filter(pk=libro.pk).update(
+                    numero_pagine=libro.numero_pagine, isbn=libro.isbn)
+        with self.assertRaises(UnsupportedValue):
+            encode_column('int32', [1, -2 ** 31])
+        with self.assertRaises(UnsupportedValue):
+            encode_column('ascii(13)', ['97800000000001'])
+
+    def test_file_troncato(self):
+        contenuto = b''.join(export_catalogue())
+        with self.assertRaises(InvalidFile):
+            ColumnarFile(contenuto[:-4])
+
+    def test_api_export(self):
+        response = self.client.get(reverse('pizzeria_app:libro-export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/vnd.pizzeria.catalogue')
+        catalogo = ColumnarFile(b''.join(response.streaming_content))
+        self.assertEqual(catalogo.tables['libri']['rows'], 4)
+
+
+class ValuesSerializerParityTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Grazia', cognome='Deledda',
+                                           data_nascita=datetime.date(1871, 9, 27))
+        Autore.objects.create(nome='Anonimo', cognome='Veneziano')
+        prezzi = [None, Decimal('0.01'), Decimal('9.5'), Decimal('10'), Decimal('9999.99')]
+        for i, prezzo in enumerate(prezzi):
+            Libro.objects.create(
+                titolo=f'Canne al vento {i}', autore=cls.autore, prezzo=prezzo,
+                data_pubblicazione=datetime.date(1913, 1, 1 + i), isbn=f'978000000000{i}',
+                numero_pagine=None if i % 2 else 200 + i,
+            )
+
+    def assertParita(self, serializer_class, queryset):
+        compiled = ValuesSerializer.for_serializer(serializer_class)
+        self.assertIsNotNone(compiled)
+        self.assertEqual(compiled.serialize(queryset), serializer_class(queryset, many=True).data)
+
+    def test_parita_libro(self):
+        self.assertParita(LibroSerializer, Libro.objects.order_by('titolo'))
+
+    def test_parita_autore(self):
+        self.assertParita(AutoreSerializer, Autore.objects.order_by('cognome', 'nome'))
+
+    def test_parita_endpoint_list(self):
+        response = self.client.get(reverse('pizzeria_app:libro-list') + '?page_size=2')
+        attesi = LibroSerializer(Libro.objects.order_by('titolo', 'id')[:2], many=True).data
+        self.assertEqual(response.data['results'], attesi)
+        response = self.client.get(response.data['next'])
+        attesi = LibroSerializer(Libro.objects.order_by('titolo', 'id')[2:4], many=True).data
+        self.assertEqual(response.data['results'], attesi)
+
+    def test_list_non_istanzia_modelli(self):
+        with mock.patch.object(Libro, '__init__', side_effect=AssertionError):
+            response = self.client.get(reverse('pizzeria_app:libro-list'))
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_serializer_incompatibile_ricade_sul_percorso_standard(self):
+        class ConAutore(LibroSerializer):
+            autore = AutoreSerializer(read_only=True)
+
+        self.assertIsNone(ValuesSerializer.for_serializer(ConAutore))
+
+
+class FrammentiTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Natalia', cognome='Ginzburg')
+        cls.libri = crea_libri(cls.autore, 3, titolo='Lessico famigliare')
+
+    def test_lista_a_cache_calda_non_rende_i_libri(self):
+        url = reverse('pizzeria_app:lista_libri')
+        fredda = self.client.get(url)
+        self.assertTemplateUsed(fredda, LISTA, count=3)
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            calda = self.client.get(url)
+        self.assertTemplateNotUsed(calda, LISTA)
+        # Le generazioni per l'ETag, poi tutti i frammenti in una lettura.
+        self.assertEqual(get_many.call_count, 2)
+        self.assertEqual(calda.content, fredda.content)
+        self.assertContains(calda, 'Lessico famigliare 002')
+
+    def test_modifica_del_libro_rende_solo_il_suo_frammento(self):
+        url = reverse('pizzeria_app:lista_libri')
+        self.client.get(url)
+        libro = Libro.objects.get(pk=self.libri[1].pk)
+        libro.titolo = 'Le voci della sera'
+        libro.save()
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, LISTA, count=1)
+        self.assertContains(response, 'Le voci della sera')
+
+    def test_modifica_dell_autore_invalida_i_frammenti(self):
+        url = reverse('pizzeria_app:dettaglio_libro', args=[self.libri[0].pk])
+        self.assertContains(self.client.get(url), 'Natalia Ginzburg')
+        self.autore.nome = 'N.'
+        self.autore.save()
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, DETTAGLIO)
+        self.assertContains(response, 'N. Ginzburg')
+
+    def test_lista_vuota(self):
+        Libro.objects.all().delete()
+        self.assertContains(self.client.get(reverse('pizzeria_app:lista_libri')),
+                            'Nessun libro disponibile')
+
+
+class WarmupTests(CatalogoTestCase):
+    def test_template_nella_cache_del_loader(self):
+        loader, = engines['django'].engine.template_loaders
+        loader.reset()
+        warm_templates()
+        self.assertLessEqual(set(TEMPLATES), set(loader.get_template_cache))
+        # Il loader cached sovrascrive get_template: così fallisce solo chi cerca su disco.
+        with mock.patch('django.template.loaders.base.Loader.get_template',
+                        side_effect=AssertionError):
+            self.assertContains(self.client.get(reverse('pizzeria_app:lista_libri')),
+                                'Elenco dei Nostri Libri')
+
+    def test_comando(self):
+        out = io.StringIO()
+        call_command('warm_templates', 'pizzeria_app/base.html', stdout=out)
+        self.assertIn('1 template compilati', out.getvalue())
+
+
+class PreforkTests(CatalogoTestCase):
+    def test_preload(self):
+        from myproject_exercise import prefork
+
+        self.addCleanup(gc.unfreeze)
+        # Nel test la connessione è dentro la transazione del TestCase.
+        with mock.patch.object(prefork, 'connections') as connections:
+            timings = prefork.preload()
+        connections.close_all.assert_called_once_with()
+        self.assertEqual(list(timings),
+                         ['url', 'modelli', 'serializer', 'traduzioni', 'template', 'gc.freeze'])
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.assertIsNotNone(ValuesSerializer._compiled.get(LibroSerializer))
+
+    def test_preload_solo_nel_master_di_gunicorn(self):
+        from myproject_exercise import prefork, wsgi
+
+        self.assertFalse(hasattr(wsgi, 'preload_timings'))
+        config = runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+        server = mock.Mock()
+        with mock.patch.object(prefork, 'preload', return_value={'url': 0.01}) as preload:
+            config['when_ready'](server)
+            server.cfg.preload_app = False
+            config['when_ready'](server)
+        preload.assert_called_once_with()
+
+    def test_report_importtime(self):
+        entries = importtime.parse(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     django.utils.version\n'
+            'import time:       300 |        420 |   django.utils\n'
+            'import time:        80 |        500 | django\n'
+            'Traceback (altro output)\n')
+        self.assertEqual(entries[0], importtime.ImportEntry('django.utils.version', 120, 120, 2))
+        self.assertEqual(entries[-1].depth, 0)
+        self.assertEqual(importtime.by_package(entries), {'django': 500})
+        self.assertEqual(importtime.slowest(entries, 1)[0].module, 'django')
+
+
+class ImportProfileTests(CatalogoTestCase):
+    def test_setup_senza_drf(self):
+        # I segnali si caricano in ogni processo: non devono trascinarsi dietro DRF.
+        stdout, _ = importtime.run(
+            'import sys, django; django.setup(); '
+            'print(sorted(m for m in sys.modules if m.startswith(("rest_framework.serializers", '
+            '"rest_framework.views", "django.test"))))',
+            settings.SETTINGS_MODULE, importtime=False)
+        self.assertEqual(stdout.strip(), '[]')
+
+    def test_comando(self):
+        out = io.StringIO()
+        call_command('import_profile', 'rebuild_stats', runs=1, top=3, stdout=out)
+        self.assertRegex(out.getvalue(), r'manage.py rebuild_stats: \d+ ms')
+        self.assertIn('django.setup', out.getvalue())
+        self.assertIn('controlli', out.getvalue())
+        self.assertIn('pizzeria_app.signals', out.getvalue())
+
+
+class QueryBudgetTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        for i in range(5):
+            autore = Autore.objects.create(nome=f'Nome {i}', cognome=f'Cognome {i}')
+            crea_libri(autore, 6, titolo=f'Autore {i}')
+        cls.libro = Libro.objects.first()
+
+    def assertNelBudget(self, url_name, *args):
+        with query_budget(url_name):
+            response = self.client.get(reverse(url_name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_lista_libri(self):
+        response = self.assertNelBudget('pizzeria_app:lista_libri')
+        self.assertContains(response, 'Nome 3 Cognome 3')
+
+    def test_dettaglio_libro(self):
+        response = self.assertNelBudget('pizzeria_app:dettaglio_libro', self.libro.pk)
+        self.assertContains(response, self.libro.autore.cognome)
+
+    def test_api_libri(self):
+        self.assertNelBudget('pizzeria_app:libro-list')
+        self.assertNelBudget('pizzeria_app:libro-detail', self.libro.pk)
+        self.assertNelBudget('pizzeria_app:autore-list')
+
+    def test_changelist_admin(self):
+        self.client.force_login(self.admin)
+        self.assertNelBudget('admin:pizzeria_app_libro_changelist')
+
+    def test_la_guardia_segnala_n_piu_uno(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget('pizzeria_app:lista_libri'):
+                [libro.autore.nome for libro in Libro.objects.all()]
+
+
+class CachedReadTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Cesare', cognome='Pavese')
+        crea_libri(cls.autore, 3)
+        cls.libro = Libro.objects.order_by('titolo').first()
+
+    def test_seconda_richiesta_senza_query(self):
+        url = reverse('pizzeria_app:libro-list')
+        prima = self.client.get(url)
+        with self.assertNumQueries(0):
+            seconda = self.client.get(url)
+        self.assertEqual(seconda.data, prima.data)
+
+    def test_parametri_normalizzati(self):
+        url = reverse('pizzeria_app:libro-list')
+        self.client.get(url + '?page_size=2&output=json')
+        with self.assertNumQueries(0):
+            self.client.get(url + '?output=json&page_size=2')
+        with self.assertNumQueries(1):
+            self.client.get(url + '?page_size=1')
+
+    def test_salvataggio_invalida_lista_e_dettaglio(self):
+        lista = reverse('pizzeria_app:libro-list')
+        dettaglio = reverse('pizzeria_app:libro-detail', args=[self.libro.pk])
+        self.client.get(lista)
+        self.client.get(dettaglio)
+        self.libro.titolo = 'AAA Nuovo titolo'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.libro.save()
+        self.assertEqual(self.client.get(lista).data['results'][0]['titolo'], 'AAA Nuovo titolo')
+        self.assertEqual(self.client.get(dettaglio).data['titolo'], 'AAA Nuovo titolo')
+
+    def test_invalidazione_solo_dopo_il_commit(self):
+        url = reverse('pizzeria_app:libro-list')
+        prima = self.client.get(url).data
+        generazione = get_generations([Libro])[0]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.libro.titolo = 'AAA Mai confermato'
+                self.libro.save()
+                # Prima del commit la lista in cache resta quella confermata.
+                self.assertEqual(self.client.get(url).data, prima)
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_generations([Libro])[0], generazione)
+
+    def test_eliminazione_autore_invalida_i_libri(self):
+        url = reverse('pizzeria_app:libro-list')
+        self.assertEqual(len(self.client.get(url).data['results']), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.autore.delete()
+        self.assertEqual(self.client.get(url).data['results'], [])
+
+    def test_backend_su_file(self):
+        with tempfile.TemporaryDirectory() as cartella:
+            backend = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cartella,
+            }}
+            with override_settings(CACHES=backend):
+                url = reverse('pizzeria_app:autore-list')
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    self.client.get(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    Autore.objects.create(nome='Natalia', cognome='Ginzburg')
+                self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+
+class ConditionalGetTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Primo', cognome='Levi')
+        crea_libri(cls.autore, 4)
+        cls.libro = Libro.objects.order_by('titolo').first()
+
+    def assertNonModificato(self, url, validatori=0):
+        """``validatori``: query per ricalcolare l'ETag (e Last-Modified, se c'è)."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual('Last-Modified' in response, bool(validatori))
+        with self.assertNumQueries(validatori):
+            ripetuta = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(ripetuta.status_code, 304)
+        self.assertEqual(ripetuta.content, b'')
+        return response['ETag']
+
+    def test_304_su_api_e_pagine(self):
+        self.assertNonModificato(reverse('pizzeria_app:libro-list') + '?page_size=2')
+        self.assertNonModificato(reverse('pizzeria_app:libro-detail', args=[self.libro.pk]))
+        self.assertNonModificato(reverse('pizzeria_app:autore-list'))
+        self.assertNonModificato(reverse('pizzeria_app:lista_libri'))
+        self.assertNonModificato(
+            reverse('pizzeria_app:dettaglio_libro', args=[self.libro.pk]), validatori=1)
+
+    def test_modifica_cambia_etag(self):
+        url = reverse('pizzeria_app:libro-detail', args=[self.libro.pk])
+        etag = self.assertNonModificato(url)
+        self.libro.numero_pagine = 999
+        with self.captureOnCommitCallbacks(execute=True):
+            self.libro.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['numero_pagine'], 999)
+
+    def test_modifica_autore_cambia_etag_della_pagina_html(self):
+        url = reverse('pizzeria_app:dettaglio_libro', args=[self.libro.pk])
+        etag = self.assertNonModificato(url, validatori=1)
+        self.autore.cognome = 'Levi Montalcini'
+        self.autore.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Levi Montalcini')
+
+    def test_eliminazione_nella_pagina_cambia_etag(self):
+        url = reverse('pizzeria_app:libro-list') + '?page_size=2'
+        etag = self.assertNonModificato(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.libro.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_eliminazione_con_if_modified_since(self):
+        # Le liste non hanno Last-Modified: una data non basta per un 304.
+        url = reverse('pizzeria_app:lista_libri')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.libro.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertNotContains(response, self.libro.titolo)
+
+    def test_inserimento_oltre_la_pagina_cambia_etag(self):
+        url = reverse('pizzeria_app:libro-list') + '?page_size=4'
+        etag = self.assertNonModificato(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Libro.objects.create(
+                titolo='Zeta', autore=self.autore, isbn=str(next(ISBN_PROGRESSIVI)),
+                data_pubblicazione=datetime.date(2001, 1, 1), numero_pagine=10)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_pagine_diverse_etag_diversi(self):
+        url = reverse('pizzeria_app:libro-list') + '?page_size=2'
+        prima = self.client.get(url)
+        seconda = self.client.get(prima.data['next'])
+        self.assertNotEqual(prima['ETag'], seconda['ETag'])
+
+
+class LibroBulkTests(CatalogoTestCase):
+    url = reverse_lazy('pizzeria_app:libro-bulk')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Dino', cognome='Buzzati')
+        cls.esistente = Libro.objects.create(
+            titolo='Il deserto dei Tartari', autore=cls.autore, isbn='9788804668237',
+            data_pubblicazione=datetime.date(1940, 1, 1))
+
+    def setUp(self):
+        super().setUp()
+        self.autentica()
+
+    def riga(self, i, **campi):
+        return {'titolo': f'Racconto {i}', 'autore': self.autore.pk,
+                'data_pubblicazione': '1958-01-01', 'isbn': complete_isbn13(f'9788800{i:05d}'),
+                **campi}
+
+    def test_creazione_in_blocco_con_query_costanti(self):
+        righe = [self.riga(i) for i in range(600)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, righe, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'created': 600, 'errors': []})
+        self.assertEqual(Libro.objects.count(), 601)
+        # Il token (mai visto prima), una sola lettura per gli autori e una per
+        # gli ISBN, qualunque sia il lotto (le letture successive alle INSERT
+        # sono dell'indice di ricerca).
+        validazione = itertools.takewhile(
+            lambda q: not q['sql'].startswith('INSERT'), ctx.captured_queries)
+        selects = [q for q in validazione if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 3)
+
+    def test_conflitto_in_un_blocco_successivo(self):
+        # Un ISBN scritto da un'altra richiesta dopo il controllo in blocco.
+        righe = [self.riga(i) for i in range(5)]
+        righe[3]['isbn'] = self.esistente.isbn
+        with mock.patch('pizzeria_app.bulk.find_existing', return_value={}), \
+                mock.patch.object(LibroBulkWriter, 'batch_size', 2), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, righe, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.data['created'], response.data['written']), (2, [0, 1]))
+        self.assertEqual([e['index'] for e in response.data['errors']], [2, 3, 4])
+        # I blocchi confermati hanno aggiornato statistiche e indice di ricerca.
+        self.assertEqual(StatisticheAutore.objects.get(pk=self.autore.pk).libri, 3)
+        self.assertEqual(len(search('racconto')), 2)
+
+    def test_errori_per_riga(self):
+        righe = [
+            self.riga(1),
+            self.riga(2, autore=999999),
+            self.riga(3, isbn=self.esistente.isbn),
+            self.riga(4, isbn=self.riga(1)['isbn']),
+            self.riga(5, titolo=''),
+        ]
+        response = self.client.post(self.url, righe, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        errori = {e['index']: set(e['errors']) for e in response.data['errors']}
+        self.assertEqual(errori, {1: {'autore'}, 2: {'isbn'}, 3: {'isbn'}, 4: {'titolo'}})
+
+    def test_aggiornamento_e_cancellazione(self):
+        lista = reverse('pizzeria_app:libro-list')
+        # Letture anonime: i budget di query sono pensati senza autenticazione.
+        anonimo = self.client_class()
+        anonimo.get(lista)
+        # Cache e suggerimenti si invalidano al commit delle scritture in blocco.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                self.url,
+                [{'id': self.esistente.pk, 'prezzo': '12.50'}, {'id': 999999, 'titolo': 'x'}],
+                content_type='application/json')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertEqual(anonimo.get(lista).data['results'][0]['prezzo'], '12.50')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url, {'ids': [self.esistente.pk]},
+                                          content_type='application/json')
+        self.assertEqual(response.data, {'deleted': 1})
+        self.assertEqual(anonimo.get(lista).data['results'], [])
+
+    def test_cancellazione_senza_lavoro_per_riga(self):
+        libri = crea_libri(self.autore, 20, titolo='Racconto')
+        rebuild_stats()
+        self.assertEqual(len(indici['libro'].suggest('racconto')), 10)
+        ids = [libro.pk for libro in libri]
+        with CaptureQueriesContext(connection) as ctx, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url, {'ids': ids + [999999]},
+                                          content_type='application/json')
+        self.assertEqual(response.data, {'deleted': 20})
+        scritture = [q['sql'] for q in ctx.captured_queries
+                     if q['sql'].startswith('UPDATE') and 'statistiche' in q['sql']]
+        self.assertLessEqual(len(scritture), 2)
+        self.assertEqual(StatisticheAutore.objects.get(pk=self.autore.pk).libri, 1)
+        self.assertEqual(indici['libro'].suggest('racconto'), [])
+
+    def test_cancellazione_id_non_validi(self):
+        troppi = list(range(1, LibroBulkMixin.bulk_max_rows + 2))
+        for ids in ([True], [self.esistente.pk, 'x'], troppi):
+            with self.subTest(ids=ids[:2]):
+                response = self.client.delete(self.url, {'ids': ids},
+                                              content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertTrue(Libro.objects.filter(pk=self.esistente.pk).exists())
+
+    def test_corpo_non_valido(self):
+        response = self.client.post(self.url, {'titolo': 'x'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class IsbnTests(CatalogoTestCase):
+    def test_normalizzazione(self):
+        self.assertEqual(normalize('978-3-16-148410-0'), '9783161484100')
+        self.assertEqual(normalize(' 0-306-40615-2 '), '9780306406157')
+        self.assertEqual(normalize('080442957x'), '9780804429573')
+
+    def test_cifre_di_controllo_errate(self):
+        for valore in ('9783161484101', '0306406153', '12345', 'abcdefghij'):
+            with self.subTest(valore=valore), self.assertRaises(InvalidISBN):
+                normalize(valore)
+
+    def test_lotto(self):
+        normalizzati, errori = normalize_many(['0-306-40615-2', 'x', '9783161484100'])
+        self.assertEqual(normalizzati, {0: '9780306406157', 2: '9783161484100'})
+        self.assertEqual(list(errori), [1])
+
+    def test_unicita_con_una_query(self):
+        autore = Autore.objects.create(nome='Luigi', cognome='Pirandello')
+        libro = Libro.objects.create(titolo='Uno, nessuno e centomila', autore=autore,
+                                     isbn='9783161484100',
+                                     data_pubblicazione=datetime.date(1926, 1, 1))
+        with self.assertNumQueries(1):
+            esistenti = find_existing(['9783161484100', '9780306406157'])
+        self.assertEqual(esistenti, {'9783161484100': libro.pk})
+
+    def test_form_e_serializer_salvano_la_forma_canonica(self):
+        autore = Autore.objects.create(nome='Luigi', cognome='Pirandello')
+        dati = {'titolo': 'Il fu Mattia Pascal', 'autore': autore.pk,
+                'data_pubblicazione': '1904-01-01', 'isbn': '0-306-40615-2'}
+        form = LibroForm(dati)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().isbn, '9780306406157')
+
+        serializer = LibroSerializer(data={**dati, 'isbn': '978-0-306-40615-7'})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('isbn', serializer.errors)
+        self.assertFalse(LibroForm({**dati, 'isbn': '9780306406157'}).is_valid())
+
+    def test_vista_aggiungi_libro(self):
+        autore = Autore.objects.create(nome='Luigi', cognome='Pirandello')
+        response = self.client.post(reverse('pizzeria_app:aggiungi_libro'), {
+            'titolo': 'Novelle per un anno', 'autore': autore.pk,
+            'data_pubblicazione': '1922-01-01', 'isbn': '978-3-16-148410-0'})
+        self.assertRedirects(response, reverse('pizzeria_app:lista_libri'))
+        self.assertTrue(Libro.objects.filter(isbn='9783161484100').exists())
+
+    def test_comando_normalize_isbn(self):
+        autore = Autore.objects.create(nome='Luigi', cognome='Pirandello')
+        Libro.objects.bulk_create([
+            Libro(titolo='A', autore=autore, isbn='0306406152',
+                  data_pubblicazione=datetime.date(1900, 1, 1)),
+            Libro(titolo='B', autore=autore, isbn='123',
+                  data_pubblicazione=datetime.date(1900, 1, 1)),
+        ])
+        out, err = io.StringIO(), io.StringIO()
+        call_command('normalize_isbn', stdout=out, stderr=err)
+        self.assertIn('Aggiornati: 1, non validi: 1', out.getvalue())
+        self.assertTrue(Libro.objects.filter(isbn='9780306406157').exists())
+
+    def test_normalize_isbn_stesso_isbn_nel_lotto(self):
+        autore = Autore.objects.create(nome='Luigi', cognome='Pirandello')
+        primo, secondo = Libro.objects.bulk_create([
+            Libro(titolo='A', autore=autore, isbn='0306406152',
+                  data_pubblicazione=datetime.date(1900, 1, 1)),
+            Libro(titolo='B', autore=autore, isbn='0-306-40615-2',
+                  data_pubblicazione=datetime.date(1900, 1, 1)),
+        ])
+        out, err = io.StringIO(), io.StringIO()
+        call_command('normalize_isbn', stdout=out, stderr=err)
+        self.assertIn('Aggiornati: 1, non validi: 0, conflitti: 1', out.getvalue())
+        self.assertIn(f'Libro {secondo.pk}: 9780306406157 appartiene già al libro {primo.pk}',
+                      err.getvalue())
+        self.assertEqual(Libro.objects.get(pk=primo.pk).isbn, '9780306406157')
+
+
+class SearchTests(CatalogoTestCase):
+    url = reverse_lazy('pizzeria_app:libro-search')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.calvino = Autore.objects.create(nome='Italo', cognome='Calvino')
+        cls.eco = Autore.objects.create(nome='Umberto', cognome='Eco')
+        cls.citta = Libro.objects.create(
+            titolo='Le città invisibili', autore=cls.calvino, isbn='9788804668244',
+            data_pubblicazione=datetime.date(1972, 1, 1))
+        cls.barone = Libro.objects.create(
+            titolo='Il barone rampante', autore=cls.calvino, isbn='9788804668251',
+            data_pubblicazione=datetime.date(1957, 1, 1))
+        cls.rosa = Libro.objects.create(
+            titolo='Il nome della rosa', autore=cls.eco, isbn='9788845292613',
+            data_pubblicazione=datetime.date(1980, 1, 1))
+
+    def ids(self, query):
+        return [pk for pk, _ in search(query)]
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Città, dell'Eco!"), ['citta', 'dell', 'eco'])
+
+    def test_titolo_autore_e_prefisso(self):
+        self.assertEqual(self.ids('citta'), [self.citta.pk])
+        self.assertEqual(set(self.ids('calvino')), {self.citta.pk, self.barone.pk})
+        self.assertEqual(self.ids('calvino bar'), [self.barone.pk])
+        self.assertEqual(self.ids('97888452'), [self.rosa.pk])
+        self.assertEqual(self.ids('tolkien'), [])
+        self.assertEqual(self.ids('  '), [])
+
+    def test_corrispondenza_esatta_prima_del_prefisso(self):
+        self.assertEqual(self.ids('il')[0], self.barone.pk)
+        Libro.objects.create(titolo='Ilaria', autore=self.eco, isbn='9788845292620',
+                             data_pubblicazione=datetime.date(2000, 1, 1))
+        self.assertEqual(self.ids('il')[-1], Libro.objects.get(titolo='Ilaria').pk)
+
+    def test_indice_segue_le_modifiche(self):
+        self.barone.titolo = 'Il cavaliere inesistente'
+        self.barone.save()
+        self.assertEqual(self.ids('barone'), [])
+        self.assertEqual(self.ids('cavaliere'), [self.barone.pk])
+
+        self.eco.cognome = 'Ecco'
+        self.eco.save()
+        self.assertEqual(self.ids('ecco'), [self.rosa.pk])
+
+        self.rosa.delete()
+        self.assertFalse(TermineRicerca.objects.filter(termine='rosa').exists())
+
+    def test_scritture_in_blocco_indicizzate(self):
+        righe = [{'titolo': 'Palomar', 'autore': self.calvino.pk,
+                  'data_pubblicazione': '1983-01-01', 'isbn': '9788804668268'}]
+        self.autentica()
+        self.client.post(reverse('pizzeria_app:libro-bulk'), righe,
+                         content_type='application/json')
+        self.assertEqual(len(self.ids('palomar')), 1)
+
+    def test_endpoint(self):
+        response = self.client.get(self.url, {'q': 'calvino citt'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data['results']], [self.citta.pk])
+        self.assertEqual(response.data['results'][0]['titolo'], 'Le città invisibili')
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'q': 'il', 'limit': 'x'})
+
+    def test_comando_rebuild_search_index(self):
+        TermineRicerca.objects.all().delete()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.ids('rosa'), [self.rosa.pk])
+
+
+class SuggestTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.calvino = Autore.objects.create(nome='Italo', cognome='Calvino')
+        cls.camilleri = Autore.objects.create(nome='Andrea', cognome='Camilleri')
+        cls.libri = crea_libri(cls.calvino, 3, titolo='Città')
+
+    def suggest(self, kind, prefix):
+        return [label for _, label in indici[kind].suggest(prefix)]
+
+    def test_prefisso_su_cognome_e_nome(self):
+        self.assertEqual(self.suggest('autore', 'ca'), ['Italo Calvino', 'Andrea Camilleri'])
+        self.assertEqual(self.suggest('autore', 'andrea c'), ['Andrea Camilleri'])
+        self.assertEqual(self.suggest('libro', 'citta 00'),
+                         ['Città 000', 'Città 001', 'Città 002'])
+        self.assertEqual(self.suggest('libro', ''), [])
+
+    def test_nessuna_query_dopo_la_costruzione(self):
+        self.suggest('libro', 'citta')
+        with self.assertNumQueries(0):
+            self.suggest('libro', 'citta 001')
+            self.client.get(reverse('pizzeria_app:libro-suggest'), {'q': 'cit'})
+
+    def test_aggiornamento_incrementale_dai_segnali(self):
+        self.suggest('autore', 'ca')
+        self.suggest('libro', 'citta')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.camilleri.cognome = 'Sciascia'
+            self.camilleri.save()
+            Autore.objects.create(nome='Italo', cognome='Svevo')
+            self.calvino.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('autore', 'ca'), [])
+            self.assertEqual(self.suggest('autore', 'italo'), ['Italo Svevo'])
+            self.assertEqual(self.suggest('libro', 'citta'), [])
+
+    def test_altro_worker_ricostruisce(self):
+        self.suggest('libro', 'citta')
+        Libro.objects.filter(pk=self.libri[0].pk).update(titolo='Palomar')
+        bump_generation(Libro)
+        self.assertEqual(self.suggest('libro', 'palomar'), ['Palomar'])
+
+    def test_modifica_locale_non_adotta_quelle_di_altri_worker(self):
+        self.suggest('libro', 'citta')
+        Libro.objects.filter(pk=self.libri[0].pk).update(titolo='Palomar')
+        bump_generation(Libro)
+        self.libri[1].titolo = 'Marcovaldo'
+        self.libri[1].save()
+        self.assertEqual(self.suggest('libro', 'palomar'), ['Palomar'])
+        self.assertEqual(self.suggest('libro', 'marcovaldo'), ['Marcovaldo'])
+
+    def test_memoria_limitata(self):
+        index = TitoloIndex(max_entries=2)
+        self.assertEqual(len(index.suggest('citta')), 2)
+        # Restano i libri creati per ultimi.
+        ultimi = Libro.objects.order_by('-pk').values_list('pk', flat=True)[:2]
+        self.assertEqual(set(index.items), set(ultimi))
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('pizzeria_app:autore-suggest'), {'q': 'calv'})
+        self.assertEqual(response.data, {'results': [{'id': self.calvino.pk,
+                                                      'label': 'Italo Calvino'}]})
+
+    def test_form_senza_elenco_autori(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('pizzeria_app:aggiungi_libro'))
+        self.assertNotContains(response, '<option')
+        self.assertContains(response, reverse('pizzeria_app:autore-suggest'))
+
+
+class AsyncReadPathTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.calvino = Autore.objects.create(nome='Italo', cognome='Calvino')
+        cls.eco = Autore.objects.create(nome='Umberto', cognome='Eco')
+        cls.libri = crea_libri(cls.calvino, 7) + crea_libri(cls.eco, 2, titolo='Saggio')
+        Libro.objects.filter(pk=cls.libri[0].pk).update(prezzo=Decimal('10.00'))
+        Libro.objects.filter(pk=cls.libri[1].pk).update(prezzo=Decimal('15.00'))
+        rebuild_stats()
+
+    async def test_lista_uguale_al_viewset(self):
+        for name in ('libro-list', 'autore-list'):
+            sync_url = reverse(f'pizzeria_app:{name}')
+            async_url = reverse(f'pizzeria_app:async-{name}')
+            response = await self.async_client.get(async_url, {'page_size': 4})
+            self.assertEqual(response.status_code, 200)
+            expected = (await self.async_client.get(sync_url, {'page_size': 4})).json()
+            self.assertEqual(response.json()['results'], expected['results'])
+
+    async def test_paginazione_keyset(self):
+        url = reverse('pizzeria_app:async-libro-list')
+        visti, pagina = [], (await self.async_client.get(url, {'page_size': 4})).json()
+        while True:
+            visti += [libro['id'] for libro in pagina['results']]
+            if not pagina['next']:
+                break
+            pagina = (await self.async_client.get(pagina['next'])).json()
+        self.assertEqual(sorted(visti), sorted(libro.pk for libro in self.libri))
+
+    async def test_cursore_non_valido(self):
+        response = await self.async_client.get(
+            reverse('pizzeria_app:async-libro-list'), {'cursor': 'xxx'})
+        self.assertEqual(response.status_code, 404)
+        expected = await self.async_client.get(
+            reverse('pizzeria_app:libro-list'), {'cursor': 'xxx'})
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_dettaglio(self):
+        libro = self.libri[0]
+        response = await self.async_client.get(
+            reverse('pizzeria_app:async-libro-detail', args=[libro.pk]))
+        expected = await self.async_client.get(
+            reverse('pizzeria_app:libro-detail', args=[libro.pk]))
+        self.assertEqual(response.json(), expected.json())
+        response = await self.async_client.get(
+            reverse('pizzeria_app:async-autore-detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_statistiche(self):
+        data = (await self.async_client.get(reverse('pizzeria_app:async-stats'))).json()
+        self.assertEqual((data['libri'], data['autori']), (9, 2))
+        self.assertEqual(Decimal(data['prezzo_medio']), Decimal('12.5'))
+        self.assertEqual(sum(anno['libri'] for anno in data['per_anno']), 9)
+        self.assertEqual([(a['cognome'], a['libri']) for a in data['per_autore']],
+                         [('Calvino', 7), ('Eco', 2)])
+
+
+class StatisticheTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.calvino = Autore.objects.create(nome='Italo', cognome='Calvino')
+        cls.eco = Autore.objects.create(nome='Umberto', cognome='Eco')
+
+    def crea(self, autore, anno, prezzo=None, pagine=None):
+        return Libro.objects.create(
+            titolo=f'Libro {anno}', autore=autore, isbn=str(next(ISBN_PROGRESSIVI)),
+            data_pubblicazione=datetime.date(anno, 1, 1), prezzo=prezzo, numero_pagine=pagine)
+
+    def materializzate(self):
+        return (
+            {s.pk: (s.libri, s.somma_prezzi, s.prezzi, s.somma_pagine, s.pagine)
+             for s in StatisticheAutore.objects.filter(libri__gt=0)},
+            {s.pk: (s.libri, s.somma_prezzi, s.prezzi, s.somma_pagine, s.pagine)
+             for s in StatisticheAnno.objects.filter(libri__gt=0)},
+        )
+
+    def assertUgualiAlRicalcolo(self):
+        incrementali = self.materializzate()
+        rebuild_stats()
+        self.assertEqual(incrementali, self.materializzate())
+
+    def test_aggiornamento_incrementale(self):
+        primo = self.crea(self.calvino, 1957, Decimal('10.00'), 200)
+        secondo = self.crea(self.calvino, 1972, Decimal('20.00'))
+        self.crea(self.eco, 1980, pagine=500)
+        self.assertEqual(StatisticheAutore.objects.get(pk=self.calvino.pk).prezzo_medio,
+                         Decimal('15'))
+
+        primo.autore = self.eco
+        primo.data_pubblicazione = datetime.date(1980, 6, 1)
+        primo.save()
+        secondo.delete()
+        self.assertUgualiAlRicalcolo()
+
+        self.calvino.delete()
+        self.eco.delete()
+        self.assertEqual(self.materializzate(), ({}, {}))
+
+    def test_salvataggio_senza_campi_statistici_non_interroga(self):
+        libro = self.crea(self.calvino, 1957)
+        libro.titolo = 'Il barone rampante'
+        with CaptureQueriesContext(connection) as ctx:
+            libro.save(update_fields=['titolo'])
+        self.assertFalse(any('statistiche' in q['sql'] for q in ctx.captured_queries))
+
+    def test_scritture_in_blocco(self):
+        righe = [{'titolo': f'Racconto {i}', 'autore': self.eco.pk, 'prezzo': '9.90',
+                  'data_pubblicazione': f'{1990 + i % 3}-01-01',
+                  'isbn': complete_isbn13(f'97899{i:07d}')} for i in range(6)]
+        self.autentica()
+        response = self.client.post(reverse('pizzeria_app:libro-bulk'), righe,
+                                    content_type='application/json')
+        self.assertEqual(response.data['created'], 6)
+        self.assertEqual(StatisticheAnno.objects.get(pk=1991).libri, 2)
+        self.assertUgualiAlRicalcolo()
+
+        libri = Libro.objects.order_by('pk')[:3]
+        modifiche = [{'id': libri[0].pk, 'autore': self.calvino.pk},
+                     {'id': libri[1].pk, 'data_pubblicazione': '1957-01-01', 'prezzo': None},
+                     {'id': libri[2].pk, 'numero_pagine': 300}]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(reverse('pizzeria_app:libro-bulk'), modifiche,
+                                         content_type='application/json')
+        self.assertEqual(response.data['updated'], 3)
+        # Differenze applicate per chiave, senza ricalcolo.
+        self.assertFalse(any('GROUP BY' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(StatisticheAnno.objects.get(pk=1957).libri, 1)
+        self.assertUgualiAlRicalcolo()
+
+    def test_modifica_in_blocco_senza_campi_statistici_non_ricalcola(self):
+        libro = self.crea(self.calvino, 1957)
+        with CaptureQueriesContext(connection) as ctx:
+            libri_scritti_in_blocco.send(sender=Libro, pks=[libro.pk],
+                                         update_fields=['isbn', 'updated_at'])
+        self.assertFalse(any('statistiche' in q['sql'] for q in ctx.captured_queries))
+
+    def test_endpoint_per_chiave_primaria(self):
+        self.crea(self.eco, 1980, Decimal('12.00'), 500)
+        url = reverse('pizzeria_app:autore-stats', args=[self.eco.pk])
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data, {'libri': 1, 'prezzo_medio': Decimal('12.00'),
+                                         'pagine_medie': 500.0})
+        response = self.client.get(reverse('pizzeria_app:autore-stats', args=[self.calvino.pk]))
+        self.assertEqual(response.data['libri'], 0)
+        response = self.client.get(reverse('pizzeria_app:autore-stats', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_comando_rebuild_stats(self):
+        self.crea(self.eco, 1980)
+        StatisticheAnno.objects.all().delete()
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(StatisticheAnno.objects.get(pk=1980).libri, 1)
+
+
+class IndexAdvisorTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autore = Autore.objects.create(nome='Italo', cognome='Calvino')
+        crea_libri(cls.autore, 30)
+
+    def test_colonne_candidate(self):
+        sql = str(Libro.objects.filter(numero_pagine=120, prezzo__gt=1)
+                  .order_by('data_pubblicazione').query)
+        self.assertEqual(candidate_columns(sql, 'pizzeria_app_libro'),
+                         ['numero_pagine', 'data_pubblicazione', 'prezzo'])
+
+    def test_liste_usano_gli_indici(self):
+        captured = capture([reverse('pizzeria_app:libro-list') + '?page_size=10',
+                            reverse('pizzeria_app:autore-list')])
+        self.assertTrue(any('LIMIT' in sql for _, sql in captured))
+        self.assertEqual(analyze(captured), [])
+
+    def test_suggerisce_indice_con_beneficio(self):
+        queryset = Libro.objects.filter(numero_pagine=110).order_by('prezzo')
+        with CaptureQueriesContext(connection) as ctx:
+            list(queryset)
+        [report] = analyze([('/prova/', ctx.captured_queries[0]['sql'])])
+        [suggestion] = report['suggestions']
+        # Senza prova l'indice è solo proposto.
+        self.assertIsNone(suggestion['after'])
+        self.assertIn('"numero_pagine", "prezzo"', suggestion['ddl'])
+
+        [report] = analyze([('/prova/', ctx.captured_queries[0]['sql'])], apply_trial=True)
+        [suggestion] = report['suggestions']
+        self.assertEqual(suggestion['columns'], ['numero_pagine', 'prezzo'])
+        self.assertIn('pizzeria_app_libro', suggestion['before']['scans'])
+        self.assertEqual(suggestion['after']['scans'], set())
+        self.assertLess(suggestion['after']['cost'], suggestion['before']['cost'])
+        # L'indice di prova non resta nel database.
+        with connection.cursor() as cursor:
+            indici = connection.introspection.get_constraints(cursor, 'pizzeria_app_libro')
+        self.assertNotIn('index_advisor_prova', indici)
+
+    def test_comando(self):
+        out = io.StringIO()
+        call_command('index_advisor', stdout=out)
+        self.assertIn('piano: SCAN', out.getvalue())
+
+    def test_comando_con_prova(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('index_advisor', '--apply-trial', stdout=out, stderr=err)
+        self.assertIn('--apply-trial', err.getvalue())
+        self.assertNotIn('non misurato', out.getvalue())
+
+    @override_settings(PROFILER_ENFORCE_BUDGETS=True)
+    def test_cattura_ignora_i_budget(self):
+        with mock.patch.dict(QUERY_BUDGETS, {'pizzeria_app:libro-list': 0}):
+            captured = capture([reverse('pizzeria_app:libro-list')])
+        self.assertTrue(captured)
+
+
+class ProfilerMiddlewareTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            crea_libri(Autore.objects.create(nome=f'Nome {i}', cognome=f'Cognome {i}'), 2)
+
+    def timing(self, response):
+        return dict(
+            (entry.split(';')[0], entry) for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing(self):
+        timing = self.timing(self.client.get(reverse('pizzeria_app:lista_libri')))
+        self.assertIn('desc="1 query"', timing['db'])
+        self.assertEqual(set(timing), {'db', 'auth', 'ser', 'tpl', 'total'})
+        response = self.client.get(reverse('pizzeria_app:libro-list'))
+        self.assertGreater(response.wsgi_request.query_profile.sections['ser'], 0)
+        timing = self.timing(self.client.get(reverse('pizzeria_app:async-stats')))
+        self.assertIn('query"', timing['db'])
+
+    def test_impronte_rilevano_n_piu_uno(self):
+        profile = RequestProfile()
+        with profile.activate():
+            [libro.autore.nome for libro in Libro.objects.all()]
+            list(Libro.objects.filter(pk__in=[1, 2, 3]))
+            list(Libro.objects.filter(pk__in=[4, 5]))
+        self.assertEqual(profile.queries, 9)
+        self.assertEqual(sorted(profile.duplicates.values()), [2, 6])
+
+    def test_budget_applicato_alle_get(self):
+        with mock.patch.dict(QUERY_BUDGETS, {'pizzeria_app:lista_libri': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('pizzeria_app:lista_libri'))
+            with override_settings(PROFILER_ENFORCE_BUDGETS=False):
+                self.client = self.client_class()
+                self.assertEqual(
+                    self.client.get(reverse('pizzeria_app:lista_libri')).status_code, 200)
+
+    def test_autenticazione_fuori_dal_budget(self):
+        # Sessione e utente (o token) dipendono da chi chiama, non dalla vista.
+        utente = User.objects.create(username='lettore')
+        libro = Libro.objects.first()
+        self.client.force_login(utente)
+        for url in (reverse('pizzeria_app:libro-list'),
+                    reverse('pizzeria_app:libro-detail', args=[libro.pk])):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            profile = response.wsgi_request.query_profile
+            self.assertGreater(profile.queries, profile.view_queries)
+        self.client.logout()
+        self.autentica()
+        self.assertEqual(self.client.get(reverse('pizzeria_app:libro-list')).status_code, 200)
+
+    @override_settings(PROFILER_SERVER_TIMING=False, PROFILER_ENFORCE_BUDGETS=False)
+    def test_spento_fuori_dalla_catena(self):
+        response = self.client.get(reverse('pizzeria_app:libro-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertFalse(hasattr(response.wsgi_request, 'query_profile'))
+
+    def test_scritture_non_soggette_al_budget(self):
+        riga = {'titolo': 'Nuovo', 'autore': Autore.objects.first().pk,
+                'data_pubblicazione': '2000-01-01', 'isbn': complete_isbn13('978881234567')}
+        self.autentica()
+        response = self.client.post(reverse('pizzeria_app:libro-list'), riga,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+
+class AuthTests(CatalogoTestCase):
+    def test_registrazione_e_login(self):
+        response = self.client.post(reverse('pizzeria_app:api_user_register'), {
+            'username': 'lettore', 'password': 'una-password-lunga', 'email': 'l@example.com'})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('password', response.data)
+        utente = User.objects.get(username='lettore')
+        self.assertTrue(utente.check_password('una-password-lunga'))
+
+        response = self.client.post(reverse('pizzeria_app:api_user_login'), {
+            'username': 'lettore', 'password': 'una-password-lunga'})
+        self.assertEqual(response.data, {'token': utente.auth_token.key})
+
+    def test_scritture_riservate_agli_autenticati(self):
+        riga = {'nome': 'Primo', 'cognome': 'Levi'}
+        url = reverse('pizzeria_app:autore-list')
+        self.assertEqual(self.client.post(url, riga).status_code, 401)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.autentica()
+        self.assertEqual(self.client.post(url, riga).status_code, 201)
+
+    def query_token(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q for q in ctx.captured_queries if 'authtoken_token' in q['sql']]
+
+    def test_token_in_cache(self):
+        self.autentica()
+        url = reverse('pizzeria_app:libro-list')
+        # Token mai visto: una sola query per token e utente.
+        self.assertEqual(len(self.query_token(url)[1]), 1)
+        # In cache solo l'impronta della chiave, non la credenziale.
+        chiave = self.client.defaults['HTTP_AUTHORIZATION'].split()[1]
+        self.assertIsNone(cache.get(f'auth:token:{chiave}'))
+        self.assertIsNotNone(cache.get(f'auth:token:{token_digest(chiave)}'))
+        response, query = self.query_token(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(query, [])
+        self.assertEqual(response.wsgi_request.user.username, 'redattore')
+        # Con la sola cache condivisa (altro worker) serve comunque zero query.
+        snapshots.clear()
+        self.assertEqual(self.query_token(url)[1], [])
+
+    def test_invalidazione(self):
+        utente = self.autentica()
+        url = reverse('pizzeria_app:autore-list')
+        self.client.get(url)
+        update_last_login(None, utente)
+        self.assertEqual(self.query_token(url)[1], [])
+
+        utente.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            utente.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        utente.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            utente.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            utente.auth_token.delete()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_lru_limitato(self):
+        lru = SnapshotLRU(max_entries=2, timeout=60)
+        for chiave in 'abc':
+            lru.set(chiave, 1, chiave)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.get('b'), (1, 'b'))
+        scaduto = SnapshotLRU(timeout=-1)
+        scaduto.set('c', 1, 'c')
+        self.assertIsNone(scaduto.get('c'))
+
+    def test_invalidazione_per_utente(self):
+        utente = self.autentica()
+        altro = User.objects.create_user('altro', password='una-password-lunga')
+        url = reverse('pizzeria_app:autore-list')
+        self.client.get(url)
+        altro.first_name = 'Altro'
+        with self.captureOnCommitCallbacks(execute=True):
+            altro.save()
+        self.assertEqual(self.query_token(url)[1], [])
+        utente.first_name = 'Redattore'
+        with self.captureOnCommitCallbacks(execute=True):
+            utente.save()
+        response, query = self.query_token(url)
+        self.assertEqual(len(query), 1)
+        self.assertEqual(response.wsgi_request.user.first_name, 'Redattore')
+
+
+class SignedTokenTests(CatalogoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utente = User.objects.create_user('firmato', password='una-password-lunga')
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('pizzeria_app:autore-list')
+        response = self.client.post(reverse('pizzeria_app:api_token_obtain'), {
+            'username': 'firmato', 'password': 'una-password-lunga'})
+        self.assertEqual(response.status_code, 200)
+        self.coppia = response.data
+
+    def scrivi(self, access):
+        return self.client.post(self.url, {'nome': 'Primo', 'cognome': 'Levi'},
+                                HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_verifica_senza_database(self):
+        self.scrivi(self.coppia['access'])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.scrivi(self.coppia['access'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.wsgi_request.user.pk, self.utente.pk)
+        tabelle = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('auth_user', tabelle)
+        self.assertNotIn('sessionerevocata', tabelle)
+
+    def test_refresh_una_sola_volta(self):
+        url = reverse('pizzeria_app:api_token_refresh')
+        nuova = self.client.post(url, {'refresh': self.coppia['refresh']})
+        self.assertEqual(nuova.status_code, 200)
+        self.assertEqual(self.scrivi(nuova.data['access']).status_code, 201)
+        # Il refresh usato non vale più; l'access token della coppia precedente
+        # resta valido fino alla scadenza e la sessione non viene revocata.
+        self.assertEqual(self.client.post(url, {'refresh': self.coppia['refresh']}).status_code,
+                         401)
+        self.assertEqual(self.scrivi(self.coppia['access']).status_code, 201)
+        self.assertFalse(SessioneRevocata.objects.exists())
+
+        # Il logout chiude la sessione: tutti i suoi access token e il refresh.
+        self.client.post(reverse('pizzeria_app:api_token_logout'),
+                         {'refresh': nuova.data['refresh']})
+        self.assertEqual(self.scrivi(self.coppia['access']).status_code, 401)
+        self.assertEqual(self.scrivi(nuova.data['access']).status_code, 401)
+        self.assertEqual(self.client.post(url, {'refresh': nuova.data['refresh']}).status_code,
+                         401)
+
+    def test_logout_con_un_refresh_vecchio(self):
+        url = reverse('pizzeria_app:api_token_refresh')
+        nuova = self.client.post(url, {'refresh': self.coppia['refresh']}).data
+        self.client.post(reverse('pizzeria_app:api_token_logout'),
+                         {'refresh': self.coppia['refresh']})
+        # La revoca sopravvive agli access token: il refresh più recente della
+        # sessione non deve poterne emettere di nuovi quando scadono.
+        revocata = SessioneRevocata.objects.get()
+        self.assertGreater(revocata.scadenza,
+                           timezone.now() + datetime.timedelta(seconds=refresh_ttl() - 60))
+        dopo = timezone.now() + datetime.timedelta(seconds=access_ttl() + 1)
+        cache.clear()
+        with mock.patch('django.utils.timezone.now', return_value=dopo):
+            self.assertEqual(self.client.post(url, {'refresh': nuova['refresh']}).status_code,
+                             401)
+
+    def test_logout_e_utente_disattivato(self):
+        self.client.post(reverse('pizzeria_app:api_token_logout'),
+                         {'refresh': self.coppia['refresh']})
+        self.assertEqual(self.scrivi(self.coppia['access']).status_code, 401)
+
+        coppia = self.client.post(reverse('pizzeria_app:api_token_obtain'), {
+            'username': 'firmato', 'password': 'una-password-lunga'}).data
+        User.objects.filter(pk=self.utente.pk).update(is_active=False)
+        response = self.client.post(reverse('pizzeria_app:api_token_refresh'),
+                                    {'refresh': coppia['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_scaduto_o_alterato(self):
+        self.assertEqual(self.scrivi(self.coppia['access'] + 'x').status_code, 401)
+        self.assertEqual(self.scrivi(self.coppia['refresh']).status_code, 401)
+        with override_settings(SIGNED_TOKEN_ACCESS_TTL=-1):
+            self.assertEqual(self.scrivi(self.coppia['access']).status_code, 401)
+
+
+@override_settings(AUTH_PBKDF2_ITERATIONS=1000)
+class HashingTests(CatalogoTestCase):
+    def login(self, password='una-password-lunga'):
+        return self.client.post(reverse('pizzeria_app:api_user_login'),
+                                {'username': 'lettore', 'password': password})
+
+    def test_registrazione_con_iterazioni_configurate(self):
+        self.client.post(reverse('pizzeria_app:api_user_register'),
+                         {'username': 'lettore', 'password': 'una-password-lunga'})
+        self.assertTrue(User.objects.get().password.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login('sbagliata').status_code, 400)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'pizzeria_app.hashing.ConfigurablePBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_rehash_al_login(self):
+        utente = User.objects.create(username='lettore',
+                                     password=make_password('una-password-lunga', hasher='md5'))
+        self.assertEqual(self.login().status_code, 200)
+        utente.refresh_from_db()
+        self.assertTrue(utente.password.startswith('pbkdf2_sha256$1000$'))
+        with override_settings(AUTH_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        utente.refresh_from_db()
+        self.assertTrue(utente.password.startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(AUTH_HASH_PER_IP=0)
+    def test_limite_per_indirizzo(self):
+        response = self.client.post(reverse('pizzeria_app:api_user_register'),
+                                    {'username': 'lettore', 'password': 'una-password-lunga'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.login().status_code, 429)
+        self.assertFalse(User.objects.exists())
+
+    @override_settings(AUTH_HASH_PER_IP=1,
+                       REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_limite_per_client_dietro_il_proxy(self):
+        # Stesso REMOTE_ADDR (il proxy), client diversi: non si bloccano a vicenda.
+        per_ip.acquire(BaseThrottle().get_ident(
+            RequestFactory().post('/', HTTP_X_FORWARDED_FOR='10.0.0.1')))
+        self.addCleanup(per_ip.release, '10.0.0.1')
+        url = reverse('pizzeria_app:api_user_login')
+        altro = self.client.post(url, {'username': 'x', 'password': 'y'},
+                                 HTTP_X_FORWARDED_FOR='10.0.0.2')
+        self.assertEqual(altro.status_code, 400)
+        stesso = self.client.post(url, {'username': 'x', 'password': 'y'},
+                                  HTTP_X_FORWARDED_FOR='10.0.0.1')
+        self.assertEqual(stesso.status_code, 429)
+
+    def test_pool_limitato(self):
+        pool = HashingPool(workers=1, backlog=0)
+        sblocca = threading.Event()
+        lavoro = pool.submit(sblocca.wait)
+        with self.assertRaises(PoolBusy):
+            pool.run(make_password, 'x')
+        sblocca.set()
+        lavoro.result()
+        self.assertTrue(check_password('x', pool.run(make_password, 'x')))
+        pool.executor.shutdown()
+
+
+LIMITI_STRETTI = {**settings.REST_FRAMEWORK,
+                  'DEFAULT_THROTTLE_RATES': {'auth': '2/min', 'scritture': '3/min'}}
+
+
+@override_settings(REST_FRAMEWORK=LIMITI_STRETTI)
+class ThrottlingTests(CatalogoTestCase):
+    def throttle(self, adesso):
+        throttle = AuthRateThrottle()
+        throttle.timer = lambda: adesso
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1')
+        return throttle, throttle.allow_request(request, None)
+
+    def test_finestra_scorrevole(self):
+        inizio = 6000.0  # inizio di una finestra di 60 secondi
+        self.assertTrue(self.throttle(inizio + 50)[1])
+        self.assertTrue(self.throttle(inizio + 55)[1])
+        throttle, permesso = self.throttle(inizio + 58)
+        self.assertFalse(permesso)
+        # Nella finestra successiva le due richieste pesano in proporzione.
+        self.assertAlmostEqual(throttle.wait(), 2 + 30)
+        self.assertFalse(self.throttle(inizio + 60 + 29)[1])
+        self.assertTrue(self.throttle(inizio + 60 + 31)[1])
+        self.assertEqual(cache.get('throttle:auth:10.0.0.1:100'), 2)
+
+    def test_login_e_registrazione_limitati(self):
+        url = reverse('pizzeria_app:api_user_login')
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, {'username': 'x', 'password': 'y'}).status_code,
+                             400)
+        response = self.client.post(reverse('pizzeria_app:api_user_register'),
+                                    {'username': 'lettore', 'password': 'una-password-lunga'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_solo_scritture_dei_libri(self):
+        self.autentica()
+        url = reverse('pizzeria_app:libro-bulk')
+        for _ in range(3):
+            self.assertEqual(self.client.post(url, [], content_type='application/json')
+                             .status_code, 201)
+        self.assertEqual(self.client.post(url, [], content_type='application/json').status_code,
+                         429)
+        lista = self.client_class().get(reverse('pizzeria_app:libro-list'))
+        self.assertEqual(lista.status_code, 200)
+
+
+class ImportCatalogueTests(CatalogoTestCase):
+    RIGHE = [
+        ('Il barone rampante', 'Italo', 'Calvino', '1957-01-01', '88-04-66823-7', '280', '11.50'),
+        ('Il nome della rosa', 'Umberto', 'Eco', '1980-01-01', complete_isbn13('978880000001'),
+         '', ''),
+        ('Senza ISBN', 'Umberto', 'Eco', '1980-01-01', '123', '', ''),
+        ('Doppio', 'Umberto', 'Eco', '1981-01-01', complete_isbn13('978880000001'), '', ''),
+        ('Il pendolo di Foucault', 'Umberto', 'Eco', '1988-01-01',
+         complete_isbn13('978880000002'), '509', '14.00'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.calvino = Autore.objects.create(nome='Italo', cognome='Calvino')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'catalogo.csv')
+        with open(self.path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['titolo', 'nome', 'cognome', 'data_pubblicazione', 'isbn',
+                             'numero_pagine', 'prezzo'])
+            writer.writerows(self.RIGHE)
+
+    def importa(self, *args, **options):
+        err = io.StringIO()
+        call_command('import_catalogue', *args, batch_size=2, stdout=io.StringIO(),
+                     stderr=err, **options)
+        return err.getvalue()
+
+    def test_csv(self):
+        errori = self.importa(self.path)
+        self.assertIn('Record 3: isbn', errori)
+        self.assertIn('Record 4: isbn: 9788800000017 già presente', errori)
+        self.assertEqual(Libro.objects.count(), 3)
+        self.assertEqual(Autore.objects.count(), 2)
+        barone = Libro.objects.get(titolo='Il barone rampante')
+        self.assertEqual((barone.autore, barone.isbn, barone.prezzo),
+                         (self.calvino, '9788804668237', Decimal('11.50')))
+        self.assertEqual(StatisticheAutore.objects.get(autore__cognome='Eco').libri, 2)
+        self.assertEqual([libro_id for libro_id, _ in search('pendolo')],
+                         [Libro.objects.get(titolo__startswith='Il pendolo').pk])
+        self.assertFalse(os.path.exists(self.path + '.checkpoint'))
+
+    def test_ripresa_dopo_errore(self):
+        bulk_create = Libro.objects.bulk_create
+        chiamate = itertools.count()
+
+        def fallisce_al_secondo_lotto(*args, **kwargs):
+            if next(chiamate) == 1:
+                raise RuntimeError('connessione persa')
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(Libro.objects, 'bulk_create', fallisce_al_secondo_lotto):
+            with self.assertRaises(RuntimeError):
+                self.importa(self.path)
+        self.assertEqual(Libro.objects.count(), 2)
+        with open(self.path + '.checkpoint') as file:
+            self.assertEqual(json.load(file)['record'], 2)
+        with self.assertRaises(CommandError):
+            self.importa(self.path)
+
+        errori = self.importa(self.path, resume=True)
+        self.assertNotIn('Record 1', errori)
+        self.assertEqual(Libro.objects.count(), 3)
+        self.assertEqual(Autore.objects.filter(cognome='Eco').count(), 1)
+        eco = StatisticheAutore.objects.get(autore__cognome='Eco')
+        self.assertEqual((eco.libri, eco.somma_pagine, eco.somma_prezzi), (2, 509, Decimal('14')))
+
+    def test_invalidazione_solo_dopo_il_commit(self):
+        generazione = get_generations([Libro])[0]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                mock.patch('pizzeria_app.signals.add_created', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.importa(self.path)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_generations([Libro])[0], generazione)
+
+    def test_ndjson(self):
+        path = os.path.join(self.directory.name, 'catalogo.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'titolo': 'Palomar', 'nome': 'Italo', 'cognome': 'Calvino',
+                                   'data_pubblicazione': '1983-01-01',
+                                   'isbn': 9788804668268, 'prezzo': 9.5}) + '\n\n')
+            file.write('{non json\n')
+        errori = self.importa(path)
+        self.assertIn('Record 2: record: JSON non valido', errori)
+        self.assertEqual(Libro.objects.get().prezzo, Decimal('9.50'))
+
+    def test_ndjson_zero_e_prezzi_non_finiti(self):
+        path = os.path.join(self.directory.name, 'catalogo.ndjson')
+        riga = {'nome': 'Italo', 'cognome': 'Calvino', 'data_pubblicazione': '1983-01-01'}
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({**riga, 'titolo': 'Omaggio', 'numero_pagine': 0, 'prezzo': 0,
+                                   'isbn': complete_isbn13('978880000003')}) + '\n')
+            for i, prezzo in enumerate(['NaN', 'Infinity'], start=4):
+                file.write(json.dumps({**riga, 'titolo': prezzo, 'prezzo': prezzo,
+                                       'isbn': complete_isbn13(f'97888000000{i}')}) + '\n')
+            file.write(json.dumps({**riga, 'titolo': 'x' * 201,
+                                   'isbn': complete_isbn13('978880000006')}) + '\n')
+        errori = self.importa(path)
+        omaggio = Libro.objects.get()
+        self.assertEqual((omaggio.numero_pagine, omaggio.prezzo), (0, Decimal('0')))
+        self.assertIn('Record 2: prezzo: prezzo non valido', errori)
+        self.assertIn('Record 3: prezzo: prezzo non valido', errori)
+        self.assertIn('Record 4: titolo: più di 200 caratteri', errori)
+
+
+class MetricsTests(CatalogoTestCase):
+    def campione(self, testo, nome, **etichette):
+        righe = re.findall(rf'^{re.escape(nome)}\{{(.*)\}} (\S+)$', testo, re.MULTILINE)
+        for labels, valore in righe:
+            if dict(re.findall(r'(\w+)="([^"]*)"', labels)) == etichette:
+                return float(valore)
+        return 0.0
+
+    def test_latenza_per_vista(self):
+        vista = {'view': 'pizzeria_app:libro-list', 'method': 'GET'}
+        nome = 'django_http_request_duration_seconds'
+        prima = self.campione(exposition(), f'{nome}_count', **vista)
+        self.client.get(reverse('pizzeria_app:libro-list'))
+        self.client.post(reverse('pizzeria_app:api_user_login'), {'username': 'x', 'password': 'y'})
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        testo = response.content.decode()
+        self.assertIn(f'# TYPE {nome} histogram', testo)
+        self.assertEqual(self.campione(testo, f'{nome}_count', **vista), prima + 1)
+        self.assertEqual(
+            self.campione(testo, f'{nome}_bucket', le='+Inf', **vista), prima + 1)
+        self.assertGreater(self.campione(
+            testo, 'django_http_requests_total', view='pizzeria_app:api_user_login',
+            method='POST', status='400'), 0)
+        self.assertGreater(self.campione(
+            testo, 'django_http_request_queries_total', view='pizzeria_app:libro-list'), 0)
+        self.assertGreater(self.campione(
+            testo, 'django_db_query_duration_seconds_count', alias='default'), 0)
+
+    def test_bucket_cumulativi(self):
+        REQUEST_LATENCY.observe(0.003, view='prova-bucket', method='GET')
+        REQUEST_LATENCY.observe(0.2, view='prova-bucket', method='GET')
+        testo = exposition()
+        bucket = 'django_http_request_duration_seconds_bucket'
+        vista = {'view': 'prova-bucket', 'method': 'GET'}
+        self.assertEqual(self.campione(testo, bucket, le='0.005', **vista), 1)
+        self.assertEqual(self.campione(testo, bucket, le='0.1', **vista), 1)
+        self.assertEqual(self.campione(testo, bucket, le='0.25', **vista), 2)
+        self.assertAlmostEqual(self.campione(
+            testo, 'django_http_request_duration_seconds_sum', **vista), 0.203)
+
+    def test_somma_tra_worker(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            worker = [MmapStore(os.path.join(directory, f'{pid}.db')) for pid in (1, 2)]
+            chiave = json.dumps(['django_http_requests_total', '',
+                                 [['view', 'prova-worker'], ['method', 'GET'], ['status', '200']]])
+            worker[0].add([(chiave, 2)])
+            worker[1].add([(chiave, 3)])
+            # Abbastanza chiavi da far crescere il file oltre la dimensione iniziale.
+            worker[1].add([(f'["riempimento", "", [["n", "{i}"]]]', 1) for i in range(3000)])
+            for store in worker:
+                store.close()
+            self.assertEqual(self.campione(
+                exposition(), 'django_http_requests_total',
+                view='prova-worker', method='GET', status='200'), 5)
+            riaperto = MmapStore(os.path.join(directory, '2.db'))
+            self.assertEqual(len(riaperto.values()), 3001)
+            riaperto.close()
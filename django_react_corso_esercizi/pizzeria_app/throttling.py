@@ -0,0 +1,106 @@
+"""
+Throttling a finestra scorrevole con due contatori per chiave.
+
+``SimpleRateThrottle`` di DRF salva in cache la lista dei timestamp di ogni
+chiave e la riscrive per intero a ogni richiesta: costo e dimensione
+crescono con il limite. ``SlidingWindowThrottle`` tiene invece un intero
+per ciascuna finestra fissa di durata ``duration`` e stima le richieste
+dell'ultima ``duration`` come::
+
+    precedente * (1 - trascorso / duration) + corrente
+
+(approssimazione di Cloudflare: esatta se le richieste della finestra
+precedente erano distribuite uniformemente). Ogni richiesta costa un
+``get_many`` di due chiavi e un ``incr``, sempre O(1). Le richieste
+rifiutate non vengono contate.
+
+I contatori stanno nella cache ``THROTTLE_CACHE`` (alias di ``CACHES``) e
+il limite vale solo fin dove arriva quella cache:
+
+- ``LocMemCache`` (il default di sviluppo) è per processo: con N worker
+  gunicorn ogni client ottiene fino a N volte il limite configurato;
+- ``FileBasedCache`` e ``DatabaseCache`` sono condivise ma il loro ``incr``
+  è una lettura seguita da una scrittura: richieste contemporanee possono
+  perdere incrementi e sforare il limite;
+- Redis e Memcached hanno un ``incr`` atomico e fanno valere il limite tra
+  tutti i worker: è la configurazione di ``settings_production``.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+        self.wait_seconds = None
+
+    def get_rate(self):
+        # Letto a ogni istanza e non all'import, come il resto delle impostazioni.
+        self.THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+        return super().get_rate()
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window, elapsed = divmod(now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        previous_key = f'{self.key}:{int(window) - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        if previous * (1 - elapsed / self.duration) + current + 1 > self.num_requests:
+            self.wait_seconds = self.compute_wait(previous, current, elapsed)
+            return False
+        self.increment(current_key)
+        return True
+
+    def increment(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # La chiave serve anche per tutta la finestra successiva.
+            if not self.cache.add(key, 1, timeout=2 * self.duration):
+                self.cache.incr(key)
+
+    def compute_wait(self, previous, current, elapsed):
+        """Secondi prima che la stima lasci passare una richiesta."""
+        free = self.num_requests - 1
+        if current <= free:
+            # Basta che decada il peso della finestra precedente.
+            return max((1 - (free - current) / previous) * self.duration - elapsed, 0)
+        # Serve la finestra successiva, dove ``current`` diventa la precedente.
+        return self.duration - elapsed + (1 - free / current) * self.duration
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AuthRateThrottle(SlidingWindowThrottle):
+    """Registrazione e login, per indirizzo del client."""
+    scope = 'auth'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class WriteRateThrottle(SlidingWindowThrottle):
+    """Solo i metodi che scrivono, per utente (o indirizzo, se anonimo)."""
+    scope = 'scritture'
+
+    def get_cache_key(self, request, view):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
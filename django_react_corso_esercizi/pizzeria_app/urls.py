@@ -0,0 +1,28 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import async_views, views
+
+app_name = 'pizzeria_app'
+
+router = DefaultRouter()
+router.register(r'autori', views.AutoreViewSet, basename='autore')
+router.register(r'libri', views.LibroViewSet, basename='libro')
+
+urlpatterns = [
+    path('libri/', views.lista_libri, name='lista_libri'),
+    path('libri/aggiungi/', views.aggiungi_libro, name='aggiungi_libro'),
+    path('libri/<int:libro_id>/', views.dettaglio_libro, name='dettaglio_libro'),
+    path('api/async/libri/', async_views.libro_list, name='async-libro-list'),
+    path('api/async/libri/<int:pk>/', async_views.libro_detail, name='async-libro-detail'),
+    path('api/async/autori/', async_views.autore_list, name='async-autore-list'),
+    path('api/async/autori/<int:pk>/', async_views.autore_detail, name='async-autore-detail'),
+    path('api/async/stats/', async_views.catalogo_stats, name='async-stats'),
+    path('api/auth/register/', views.UserCreateAPIView.as_view(), name='api_user_register'),
+    path('api/auth/login/', views.obtain_auth_token, name='api_user_login'),
+    path('api/auth/token/', views.SignedTokenObtainView.as_view(), name='api_token_obtain'),
+    path('api/auth/token/refresh/', views.SignedTokenRefreshView.as_view(),
+         name='api_token_refresh'),
+    path('api/auth/token/logout/', views.SignedTokenLogoutView.as_view(), name='api_token_logout'),
+    path('api/', include(router.urls)),
+]
@@ -1,3 +1,135 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, redirect, render
+from rest_framework import permissions, status, viewsets
+from rest_framework.response import Response
+from rest_framework.authtoken import views as authtoken_views
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.views import APIView
 
-# Create your views here.
+from .actions import (
+    AutoreStatsMixin, CatalogueExportMixin, LibroSearchMixin, SuggestMixin,
+)
+from .bulk import LibroBulkMixin
+from .cache import CachedReadMixin
+from .conditional import (
+    ConditionalGetMixin, condition_from_generations, condition_from_queryset,
+)
+from .fast_serializers import ValuesListMixin
+from .forms import LibroForm
+from .fragments import DETTAGLIO, LISTA, render_page_fragments
+from .hashing import HashingConcurrencyMixin
+from .models import Autore, Libro
+from .pagination import KeysetPagination
+from .serializers import AutoreSerializer, LibroSerializer, UserSerializer
+from .signed_tokens import InvalidToken, issue_pair, logout, refresh
+from .streaming import StreamingListMixin
+from .throttling import AuthRateThrottle, WriteRateThrottle
+
+
+@condition_from_generations(Libro, Autore)
+def lista_libri(request):
+    """Mostra l'elenco dei libri con il loro autore."""
+    libri = list(Libro.objects.per_lista().order_by('titolo'))
+    return render(request, 'pizzeria_app/lista_libri.html', {
+        'libri': libri,
+        'righe': render_page_fragments(LISTA, libri),
+    })
+
+
+@condition_from_queryset(
+    lambda request, libro_id: Libro.objects.filter(pk=libro_id), related=('autore',))
+def dettaglio_libro(request, libro_id):
+    """Mostra i dettagli di un singolo libro."""
+    libro = get_object_or_404(Libro.objects.per_dettaglio(), pk=libro_id)
+    return render(request, 'pizzeria_app/dettaglio_libro.html', {
+        'libro': libro,
+        'frammento': render_page_fragments(DETTAGLIO, [libro]),
+    })
+
+
+def aggiungi_libro(request):
+    """Mostra e gestisce il form per aggiungere un nuovo libro."""
+    if request.method == 'POST':
+        form = LibroForm(request.POST)
+        if form.is_valid():
+            form.save()
+            return redirect('pizzeria_app:lista_libri')
+    else:
+        form = LibroForm()
+    return render(request, 'pizzeria_app/aggiungi_libro.html', {'form': form})
+
+
+class AutoreViewSet(ConditionalGetMixin, CachedReadMixin, ValuesListMixin, StreamingListMixin,
+                     SuggestMixin, AutoreStatsMixin, viewsets.ModelViewSet):
+    queryset = Autore.objects.all().order_by('cognome', 'nome')
+    serializer_class = AutoreSerializer
+    pagination_class = KeysetPagination
+    cache_models = (Autore,)
+    suggest_index = 'autore'
+
+
+class LibroViewSet(ConditionalGetMixin, CachedReadMixin, ValuesListMixin, StreamingListMixin,
+                    CatalogueExportMixin, LibroBulkMixin, LibroSearchMixin, SuggestMixin,
+                    viewsets.ModelViewSet):
+    queryset = Libro.objects.per_api().order_by('titolo')
+    serializer_class = LibroSerializer
+    pagination_class = KeysetPagination
+    cache_models = (Libro, Autore)
+    suggest_index = 'libro'
+    throttle_classes = [WriteRateThrottle]
+
+
+class UserCreateAPIView(HashingConcurrencyMixin, APIView):
+    """Registrazione: crea l'utente (il token lo crea il segnale ``post_save``)."""
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [AuthRateThrottle]
+
+    def post(self, request, format=None):
+        serializer = UserSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ObtainAuthToken(HashingConcurrencyMixin, authtoken_views.ObtainAuthToken):
+    """Login con token di ``authtoken``; la verifica della password passa dal pool."""
+    throttle_classes = [AuthRateThrottle]
+
+
+obtain_auth_token = ObtainAuthToken.as_view()
+
+
+class SignedTokenObtainView(HashingConcurrencyMixin, APIView):
+    """Come ``obtain_auth_token``, ma restituisce una coppia di token firmati."""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_classes = [AuthRateThrottle]
+
+    def post(self, request, format=None):
+        serializer = AuthTokenSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response(issue_pair(serializer.validated_data['user']))
+
+
+class SignedTokenRefreshView(APIView):
+    """``{'refresh': ...}``: nuova coppia; il refresh token usato non vale più."""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request, format=None):
+        try:
+            return Response(refresh(str(request.data.get('refresh', ''))))
+        except InvalidToken as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+class SignedTokenLogoutView(APIView):
+    """``{'refresh': ...}``: revoca la sessione, anche i suoi access token."""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request, format=None):
+        try:
+            logout(str(request.data.get('refresh', '')))
+        except InvalidToken as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,37 @@
+"""
+Precompilazione dei template all'avvio del processo.
+
+Con il loader ``cached`` ogni template viene cercato e compilato una sola
+volta per processo, ma alla prima richiesta che lo usa: dopo un deploy le
+prime pagine di ogni worker pagano ricerca nelle directory e parsing.
+``warm_templates`` li compila subito. Lo chiama ``prefork.preload`` nel
+master di gunicorn, prima del fork, e lo esegue ``manage.py
+warm_templates``; non ``AppConfig.ready``, che girerebbe anche per
+``migrate`` e per ogni altro comando di gestione.
+
+I template padre di ``{% extends %}`` si caricano al rendering, quindi
+``TEMPLATES`` elenca anche ``base.html``.
+"""
+import time
+
+from django.template.loader import get_template
+
+TEMPLATES = (
+    'pizzeria_app/base.html',
+    'pizzeria_app/lista_libri.html',
+    'pizzeria_app/dettaglio_libro.html',
+    'pizzeria_app/aggiungi_libro.html',
+    'pizzeria_app/frammenti/libro_lista.html',
+    'pizzeria_app/frammenti/libro_dettaglio.html',
+    'pizzeria_app/widgets/autore_suggest.html',
+)
+
+
+def warm_templates(names=TEMPLATES):
+    """Compila i template nella cache del loader; ``{nome: secondi}``."""
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        get_template(name)
+        timings[name] = time.perf_counter() - start
+    return timings